@@ -0,0 +1,86 @@
+from unittest import mock
+
+import numpy as np
+import pandas as pd
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.urls import reverse
+
+from . import views
+
+TICKERS = ['AAPL', 'MSFT', 'XOM']
+COVERAGE = {'start': '2010-01-01', 'end': '2021-01-01', 'last': '2020-12-31'}
+
+
+def get_quotes(tickers, start=None, end=None):
+    """Prices and returns in the format of reader.get_quotes"""
+    dates = pd.bdate_range('2020-01-01', periods=30, name='Date')
+    rng = np.random.default_rng(0)
+    prices = pd.DataFrame(100 * np.cumprod(1 + rng.normal(0, 0.01, (len(dates), len(tickers))), axis=0),
+                          index=dates, columns=tickers)
+    return prices, prices.pct_change().iloc[1:]
+
+
+@mock.patch.object(views.store, 'get_version', lambda exchange='US': 'v1')
+@mock.patch.object(views.store, 'get_manifest', lambda exchange='US', store_dir=None: dict.fromkeys(TICKERS, COVERAGE))
+class PricesViewTests(TestCase):
+    url = reverse('api:prices')
+
+    def get(self, tickers, start=None, end=None, **headers):
+        query = {'tickers': ','.join(tickers), **{k: v for k, v in [('start', start), ('end', end)] if v}}
+        with mock.patch.object(views.reader, 'get_quotes', side_effect=get_quotes) as patched:
+            response = self.client.get(self.url, query, **headers)
+        return response, patched
+
+    def test_prices(self):
+        response, patched = self.get(['AAPL', 'MSFT'])
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(list(data['columns']), ['AAPL', 'MSFT'])
+        self.assertEqual(data['index'][0], '2020-01-01')
+        self.assertEqual(patched.call_count, 1)
+
+        response, patched = self.get(['AAPL', 'MSFT'], HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+        patched.assert_not_called()
+
+    def test_invalid_tickers(self):
+        for tickers in (['AAPL', 'AAPL'], [f'T{number}' for number in range(views.MAX_TICKERS + 1)], ['AAPL', 'NEW']):
+            response, patched = self.get(tickers)
+            self.assertEqual(response.status_code, 400)
+            patched.assert_not_called()
+
+    def test_dates_outside_the_store(self):
+        response, patched = self.get(['AAPL', 'MSFT'], start='2012-01-01', end='2020-06-30')
+        self.assertEqual(response.status_code, 200)
+        patched.assert_called_once_with(['AAPL', 'MSFT'], start='2012-01-01', end='2020-06-30')
+        for start, end in [('1990-01-01', '2020-01-01'), ('2012-01-01', '2026-01-01')]:
+            with mock.patch.object(views.reader, 'fetch_many') as fetch_many:
+                response = self.client.get(self.url, {'tickers': 'AAPL,MSFT', 'start': start, 'end': end})
+            self.assertEqual(response.status_code, 400)
+            fetch_many.assert_not_called()
+
+    def test_staff_can_fetch(self):
+        user = get_user_model().objects.create_user('staff', password='secret', is_staff=True)
+        self.client.force_login(user)
+        response, patched = self.get(['AAPL', 'NEW'])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(list(response.json()['columns']), ['AAPL', 'NEW'])
+        response, patched = self.get(['AAPL'], start='1990-01-01')
+        self.assertEqual(response.status_code, 200)
+
+    def test_arrow_without_pyarrow(self):
+        with mock.patch.object(views, 'pa', None):
+            response, patched = self.get(['AAPL'], HTTP_ACCEPT=views.ARROW_CONTENT_TYPE)
+        self.assertEqual(response.status_code, 406)
+        patched.assert_not_called()
+
+    def test_stats(self):
+        with mock.patch.object(views.reader, 'get_mapped_quotes', side_effect=get_quotes):
+            response = self.client.get(reverse('api:stats'), {'tickers': 'AAPL,MSFT', 'risk_free_rate': 'x'})
+            self.assertEqual(response.status_code, 400)
+            response = self.client.get(reverse('api:stats'), {'tickers': 'AAPL,MSFT'})
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(data['index'], ['AAPL', 'MSFT'])
+        self.assertIn('Sharpe Ratio', data['columns'])
@@ -0,0 +1,12 @@
+from django.urls import path
+from .views import PricesView, StatsView, FrontierView, PortfoliosView, BlackLittermanView
+
+app_name = 'api'
+
+urlpatterns = [
+    path('v1/prices/', PricesView.as_view(), name='prices'),
+    path('v1/stats/', StatsView.as_view(), name='stats'),
+    path('v1/frontier/', FrontierView.as_view(), name='frontier'),
+    path('v1/portfolios/', PortfoliosView.as_view(), name='portfolios'),
+    path('v1/blacklitterman/', BlackLittermanView.as_view(), name='blacklitterman'),
+]
@@ -0,0 +1,317 @@
+import hashlib
+import json
+
+import numpy as np
+import pandas as pd
+from django.http import HttpResponse, JsonResponse
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import quote_etag
+from django.views import View
+
+from ..blacklitterman import blackl
+from ..utils import covariance, reader, store, stats, mvo, annualize
+
+try:
+    import pyarrow as pa
+except ImportError:  # without pyarrow only the Arrow format is unavailable
+    pa = None
+
+API_VERSION = 'v1'
+ARROW_CONTENT_TYPE = 'application/vnd.apache.arrow.stream'
+FORMATS = ('json', 'arrow')
+MAX_FRONTIER_POINTS = 200
+MAX_TICKERS = 50
+
+
+def get_default_tickers():
+    with open('./apps/data/tickers.csv', 'r') as f:
+        return f.readline().strip().split(',')
+
+
+def get_format(request):
+    """Response format from ?format=, or from the Accept header when the query string has none"""
+    data_format = request.GET.get('format')
+    if data_format is None:
+        return 'arrow' if ARROW_CONTENT_TYPE in request.headers.get('Accept', '') else 'json'
+    if data_format not in FORMATS:
+        raise ValueError(f"Unknown format {data_format!r}, expected one of {', '.join(FORMATS)}")
+    return data_format
+
+
+def get_tickers(request):
+    """Tickers from ?tickers=, the default tickers when the query string has none
+
+  Parameters
+  ----------
+  request: HttpRequest
+    API request
+
+  Returns
+  -------
+  list
+    Up to MAX_TICKERS distinct tickers
+
+  Raises
+  ------
+  ValueError
+    If the tickers are not distinct, are too many or some are not stored yet. Only staff users can make the
+    server download the quotes of new tickers, anyone else is limited to the stored ones.
+  """
+    value = request.GET.get('tickers')
+    if not value:
+        return get_default_tickers()
+    tickers = [ticker.strip() for ticker in value.split(',') if ticker.strip()]
+    if len(set(tickers)) != len(tickers):
+        raise ValueError('Tickers must be unique')
+    if len(tickers) > MAX_TICKERS:
+        raise ValueError(f'At most {MAX_TICKERS} tickers are allowed')
+    if not request.user.is_staff:
+        manifest = store.get_manifest()
+        unknown = [ticker for ticker in tickers if ticker not in manifest]
+        if unknown:
+            raise ValueError(f"Tickers not in the store: {', '.join(unknown)}")
+    return tickers
+
+
+def get_date(request, name, default):
+    value = request.GET.get(name)
+    if not value:
+        return default
+    try:
+        return pd.Timestamp(value).strftime('%Y-%m-%d')
+    except ValueError:
+        raise ValueError(f'Invalid {name} date {value!r}')
+
+
+def get_number(request, name, default, cast=float, minimum=None, maximum=None):
+    value = request.GET.get(name)
+    if value is None:
+        return default
+    try:
+        number = cast(value)
+    except ValueError:
+        raise ValueError(f'Invalid {name} {value!r}')
+    if (minimum is not None and number < minimum) or (maximum is not None and number > maximum):
+        raise ValueError(f'{name} must be between {minimum} and {maximum}')
+    return number
+
+
+def get_etag(*values):
+    """Hash of the API version and of everything a response depends on"""
+    payload = json.dumps([API_VERSION, *values], sort_keys=True, default=str)
+    return hashlib.blake2b(payload.encode(), digest_size=16).hexdigest()
+
+
+def _get_labels(index):
+    if isinstance(index, (pd.PeriodIndex, pd.DatetimeIndex)):
+        return index.strftime('%Y-%m-%d').tolist()
+    return index.tolist()
+
+
+def frame_to_dict(frame):
+    """Columnar JSON representation of a DataFrame
+
+  Parameters
+  ----------
+  frame: pd.DataFrame
+    Frame to serialize
+
+  Returns
+  -------
+  dict
+    {'index': [labels], 'columns': {column: [values]}}, missing values are None
+  """
+    columns = {}
+    for column in frame.columns:
+        values = frame[column].to_numpy()
+        if values.dtype.kind == 'f':
+            values = np.where(np.isnan(values), None, values)
+        columns[str(column)] = values.tolist()
+    return {'index': _get_labels(frame.index), 'columns': columns}
+
+
+def frame_to_arrow(frame):
+    """Arrow IPC stream of a DataFrame, the index is sent as the first column"""
+    frame = frame.copy()
+    if isinstance(frame.index, pd.PeriodIndex):
+        frame.index = frame.index.to_timestamp()
+    frame.columns = [str(column) for column in frame.columns]
+    table = pa.Table.from_pandas(frame.reset_index(), preserve_index=False)
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+class FrameView(View):
+    """Serve a DataFrame as columnar JSON or as an Arrow IPC stream, with conditional GET
+
+    Subclasses parse the query string in get_params and compute the frame in get_frame.
+    The ETag depends only on the params and on the version of the stored quotes, so a request
+    with a matching If-None-Match is answered with 304 before anything is computed.
+    """
+    exchanges = ('US',)
+
+    def get_params(self, request):
+        """Parse the query string
+
+    Parameters
+    ----------
+    request: HttpRequest
+      API request
+
+    Returns
+    -------
+    dict
+      Keyword arguments of get_frame, JSON serializable since they are part of the ETag
+
+    Raises
+    ------
+    ValueError
+      If a parameter is invalid, the request is answered with 400
+    """
+        return {}
+
+    def get_version(self):
+        return [store.get_version(exchange) for exchange in self.exchanges]
+
+    def get_frame(self, **params):
+        """Compute the served frame, every subclass implements it
+
+    Parameters
+    ----------
+    params: dict
+      Parameters returned by get_params
+
+    Returns
+    -------
+    pd.DataFrame
+      Frame with a string, date or integer index and numeric columns
+
+    Raises
+    ------
+    reader.QuoteFetchError
+      If quotes could not be downloaded, the request is answered with 502
+    """
+        raise NotImplementedError(f'{type(self).__name__} must implement get_frame')
+
+    def get(self, request):
+        try:
+            data_format = get_format(request)
+            params = self.get_params(request)
+        except ValueError as error:
+            return JsonResponse({'error': str(error)}, status=400)
+        if data_format == 'arrow' and pa is None:
+            return JsonResponse({'error': 'Arrow format is not available, pyarrow is not installed'}, status=406)
+        # the version is read before computing, a write made meanwhile only changes the ETag of the next request
+        etag = quote_etag(get_etag(request.path, data_format, params, self.get_version()))
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            try:
+                frame = self.get_frame(**params)
+            except reader.QuoteFetchError as error:
+                return JsonResponse({'error': str(error), 'failures': error.failures}, status=502)
+            if data_format == 'arrow':
+                response = HttpResponse(frame_to_arrow(frame), content_type=ARROW_CONTENT_TYPE)
+            else:
+                response = JsonResponse(frame_to_dict(frame))
+        response['ETag'] = etag
+        # clients keep the response but revalidate it on every use
+        patch_cache_control(response, no_cache=True)
+        patch_vary_headers(response, ['Accept'])
+        return response
+
+
+class PricesView(FrameView):
+    """Daily close prices, one column per ticker"""
+
+    def get_params(self, request):
+        """Tickers and dates of the quotes, only staff users can request quotes that are not stored yet"""
+        params = {
+            'tickers': get_tickers(request),
+            'start': get_date(request, 'start', reader.START_DATE),
+            'end': get_date(request, 'end', reader.END_DATE),
+        }
+        if not request.user.is_staff:
+            missing = store.get_missing_ranges(params['tickers'], params['start'], params['end'])
+            if missing:
+                raise ValueError(f"Dates outside the stored quotes of {', '.join(missing)}")
+        return params
+
+    def get_frame(self, tickers, start, end):
+        return reader.get_quotes(tickers, start=start, end=end)[0]
+
+
+class StatsView(PricesView):
+    """Statistics of daily returns, one row per ticker"""
+
+    def get_params(self, request):
+        params = super().get_params(request)
+        params['risk_free_rate'] = get_number(request, 'risk_free_rate', 0.03)
+        return params
+
+    def get_frame(self, tickers, start, end, risk_free_rate):
+        portfolio_pct = reader.get_mapped_quotes(tickers, start=start, end=end)[1]
+        summary = stats.get_portfolio_stat_summary(portfolio_pct, risk_free_rate)
+        summary.index.name = 'Ticker'
+        return summary
+
+
+def _get_moments(tickers, start, end):
+    portfolio_pct = reader.get_mapped_quotes(tickers, start=start, end=end)[1]
+    portfolio_pct_ann = annualize.get_annualized_returns(portfolio_pct, 255)
+    covariance_matrix = covariance.get_covariance(tickers, start=start, end=end)
+    return portfolio_pct_ann[tickers].to_numpy(), covariance_matrix.loc[tickers, tickers].to_numpy()
+
+
+class FrontierView(PricesView):
+    """Points of the long only efficient frontier: returns, volatility and weights of every ticker"""
+
+    def get_params(self, request):
+        params = super().get_params(request)
+        params['points'] = get_number(request, 'points', 20, cast=int, minimum=2, maximum=MAX_FRONTIER_POINTS)
+        return params
+
+    def get_frame(self, tickers, start, end, points):
+        expected_returns, covariance_matrix = _get_moments(tickers, start, end)
+        weights = np.array(mvo.get_optimal_weights(points, expected_returns, covariance_matrix))
+        frame = pd.DataFrame(weights, columns=tickers)
+        frame.insert(0, 'Returns', weights @ expected_returns)
+        frame.insert(1, 'Volatility', np.sqrt(np.einsum('ij,jk,ik->i', weights, covariance_matrix, weights)))
+        frame.index.name = 'Point'
+        return frame
+
+
+class PortfoliosView(PricesView):
+    """Weights of the global minimum volatility and of the max Sharpe ratio portfolios"""
+
+    def get_params(self, request):
+        params = super().get_params(request)
+        params['risk_free_rate'] = get_number(request, 'risk_free_rate', 0.02)
+        return params
+
+    def get_frame(self, tickers, start, end, risk_free_rate):
+        expected_returns, covariance_matrix = _get_moments(tickers, start, end)
+        frame = pd.DataFrame({
+            'GMV': mvo.get_gmv_portfolio(covariance_matrix),
+            'Max Sharpe': mvo.maximize_sharpe_ratio(risk_free_rate, expected_returns, covariance_matrix),
+        }, index=pd.Index(tickers, name='Ticker'))
+        return frame
+
+
+class BlackLittermanView(FrameView):
+    """Market implied prior, views, posterior returns and portfolio weights of the Black-Litterman model"""
+
+    def get_version(self):
+        return blackl.get_data_version()
+
+    def get_frame(self):
+        result = blackl.get_black_litterman()
+        frame = pd.DataFrame({
+            'Prior': result.market_prior,
+            'Posterior': result.ret_bl,
+            'View': pd.Series(result.viewdict, dtype=np.float64),
+            'Weight': pd.Series(result.weights, dtype=np.float64),
+        }).reindex(result.tickers)
+        frame.index.name = 'Ticker'
+        return frame
@@ -1,9 +1,14 @@
 import numpy as np
 import pandas as pd
 import matplotlib.pyplot as plt
-from .pypfopt import black_litterman, risk_models
+from collections import namedtuple
+from .pypfopt import black_litterman
 from .pypfopt import BlackLittermanModel, Plotting
-from ..utils import reader
+from .pypfopt import EfficientFrontier, objective_functions
+from ..utils import reader, store
+from ..utils import covariance, profiling
+from ..utils.cache import LRUCache
+from ..utils.chart import cached_chart
 import base64
 from io import BytesIO
 import seaborn as sns
@@ -12,14 +17,7 @@ import seaborn as sns
 # tickers = ["SBER","GAZP","LKOH","GMKN","VTBR","ROSN","NVTK","NLMK","TATN","CHMF","HYDR"]
 tickers = ['ADBE','AMZN','BAC','COST','CSCO','INTC','JPM','MSFT','PG','XOM']
 
-prices = reader.get_quotes(tickers)[0]
-pct = reader.get_quotes(tickers)[1]
-
-# print('Prices\n', prices)
-# print('Percent Changes\n', pct)
-
-market_prices = reader.get_ind('GSPC')[0]
-# print('Index\n', market_prices.tail())
+market_index = 'GSPC'
 
 mcaps = {
     'ADBE': 79504,
@@ -35,22 +33,6 @@ mcaps = {
 }
 # print('Market Caps\n', mcaps)
 
-# ## Constructing the prior
-
-
-S = risk_models.CovarianceShrinkage(prices).ledoit_wolf()
-delta = black_litterman.market_implied_risk_aversion(market_prices)
-# print('Market Risk Aversion\n', delta)
-
-# Plotting.plot_covariance(S) #shrinked cov matrix
-
-market_prior = black_litterman.market_implied_prior_returns(mcaps, delta, S)
-# print('Market Implied Returns\n', market_prior)
-
-
-# market_prior.plot.barh(figsize=(10, 5)) #risk adjusted returns
-
-
 # ## Views
 # In the BL method, views are specified via the matrix P (picking matrix) and the vector Q. Q contains the magnitude of each view, while P maps the views to the assets they belong to.
 # If you are providing **absolute views** (i.e a return estimate for each asset), you don't have to worry about P and Q, you can just pass your views as a dictionary.
@@ -80,8 +62,6 @@ viewdict = {
     'PG': 0.3,
     'XOM': -0.2
 }
-# bl = BlackLittermanModel(S, pi=market_prior, absolute_views=viewdict)
-
 
 # Black-Litterman also allows for relative views, e.g you think asset A will outperform asset B by 10%. If you'd like to incorporate these, you will have to build P and Q yourself. An explanation for this is given in the [docs](https://pyportfolioopt.readthedocs.io/en/latest/BlackLitterman.html#views).
 # ## View confidences
@@ -112,8 +92,6 @@ confidences = [
     0.4,
 ]
 
-bl = BlackLittermanModel(S, pi=market_prior, absolute_views=viewdict, omega="idzorek", view_confidences=confidences)
-
 # fig, ax = plt.subplots(figsize=(7,7))
 # im = ax.imshow(bl.omega)
 #
@@ -168,42 +146,74 @@ bl = BlackLittermanModel(S, pi=market_prior, absolute_views=viewdict, omega="idz
 
 
 
-# Posterior estimate of returns
-ret_bl = bl.bl_returns()
-# print('Return Estimates\n', ret_bl)
-
-
-# We can visualise how this compares to the prior and our views:
-
-
-rets_df = pd.DataFrame([market_prior, ret_bl, pd.Series(viewdict)], index=["Априори", "Апостериори", "Мнение"]).T
-# print('Returns DF\n', rets_df)
-
-# rets_df.plot.bar(figsize=(12,8)) # BL returns estimation
-# plt.show()
-
-# Notice that the posterior is always between the prior and the views. This supports the fact that the BL method is essentially a Bayesian weighted-average of the prior and views, where the weight is determined by the confidence.
-# A similar but less intuitive procedure can be used to produce the posterior covariance estimate:
-
-
-S_bl = bl.bl_cov()
-# Plotting.plot_covariance(S_bl)
-
-
-# ## Portfolio allocation
-#
-# Now that we have constructed our Black-Litterman posterior estimate, we can proceed to use any of the optimisers discussed in previous recipes.
-
-from .pypfopt import EfficientFrontier, objective_functions
-
-ef = EfficientFrontier(ret_bl, S_bl)
-ef.add_objective(objective_functions.L2_reg)
-ef.max_sharpe()
-weights = ef.clean_weights()
-# print('New weights\n', weights)
-
-# pd.Series(weights).plot.pie(figsize=(10,10), normalize=True)
-# plt.show()
+# Black-Litterman results, keyed by the inputs and the versions of the price store
+BlackLittermanResult = namedtuple('BlackLittermanResult', [
+    'tickers', 'viewdict', 'S', 'market_prior', 'bl', 'ret_bl', 'S_bl', 'rets_df', 'weights'
+])
+results_cache = LRUCache(64 * 1024 ** 2, name='blacklitterman')
+
+
+def get_black_litterman(tickers=tickers, mcaps=mcaps, viewdict=viewdict, confidences=confidences):
+    """Compute the Black-Litterman posterior and the max Sharpe portfolio on demand
+
+  Parameters
+  ----------
+  tickers: list, optional
+    List of tickers
+  mcaps: dict, optional
+    {ticker: market capitalization}
+  viewdict: dict, optional
+    {ticker: absolute view on the return}
+  confidences: list, optional
+    Idzorek confidences of the views, in the order of viewdict
+
+  Returns
+  -------
+  BlackLittermanResult
+    Prior, posterior, model and portfolio weights
+
+  Notes
+  -----
+    Results are cached until the stored quotes of the portfolio or of the index change,
+    so repeated page loads do no market data work. Cached results are shared and must not be modified.
+  """
+    inputs = (tuple(tickers), tuple(sorted(mcaps.items())), tuple(viewdict.items()), tuple(confidences))
+    result = results_cache.get(inputs + get_data_version())
+    if result is None:
+        result = _compute_black_litterman(list(tickers), dict(mcaps), dict(viewdict), list(confidences))
+        # loading the quotes may have filled the store, so the result is cached under the new version
+        results_cache.set(inputs + get_data_version(), result)
+    return result
+
+
+def get_data_version():
+    """Versions of the stored quotes of the tickers and of the market index"""
+    return store.get_version('US'), store.get_version('INDX')
+
+
+@profiling.timed('blacklitterman.compute')
+def _compute_black_litterman(tickers, mcaps, viewdict, confidences):
+    market_prices = reader.get_ind(market_index)[0]
+
+    # ## Constructing the prior
+    S = covariance.get_covariance(tickers, 'ledoit_wolf', frequency=252)
+    delta = black_litterman.market_implied_risk_aversion(market_prices)
+    market_prior = black_litterman.market_implied_prior_returns(mcaps, delta, S)
+
+    bl = BlackLittermanModel(S, pi=market_prior, absolute_views=viewdict, omega="idzorek", view_confidences=confidences)
+
+    # ## Posterior estimates
+    # Notice that the posterior is always between the prior and the views. This supports the fact that the BL method is essentially a Bayesian weighted-average of the prior and views, where the weight is determined by the confidence.
+    ret_bl = bl.bl_returns()
+    rets_df = pd.DataFrame([market_prior, ret_bl, pd.Series(viewdict)], index=["Априори", "Апостериори", "Мнение"]).T
+    S_bl = bl.bl_cov()
+
+    # ## Portfolio allocation
+    ef = EfficientFrontier(ret_bl, S_bl)
+    ef.add_objective(objective_functions.L2_reg)
+    ef.max_sharpe()
+    weights = ef.clean_weights()
+    return BlackLittermanResult(tickers, viewdict, S, market_prior, bl, ret_bl, S_bl, rets_df, weights)
 
 # from pypfopt import DiscreteAllocation
 #
@@ -212,6 +222,7 @@ weights = ef.clean_weights()
 # print(f"Leftover: ${leftover:.2f}")
 # print('Allocations\n', alloc)
 
+@profiling.timed('chart.get_graph')
 def get_graph():
     buffer = BytesIO()
     plt.savefig(buffer, format='png')
@@ -222,46 +233,51 @@ def get_graph():
     buffer.close()
     return graph
 
-def get_chart1(): #view uncertainty
+@cached_chart(key=lambda result: (result.bl.omega, result.tickers, result.bl.tickers))
+def get_chart1(result): #view uncertainty
     plt.switch_backend('AGG')
     fig, ax = plt.subplots(figsize=(8,6))
-    df = pd.DataFrame(data=bl.omega[0:,0:], columns=tickers)
+    df = pd.DataFrame(data=result.bl.omega[0:,0:], columns=result.tickers)
     chart1 = sns.heatmap(df, cmap="Reds", annot=False)
-    ax.set_yticklabels(bl.tickers, rotation=0)
+    ax.set_yticklabels(result.bl.tickers, rotation=0)
     chart1 = get_graph()
     return chart1
 
-def get_chart2(): #risk adjusted returns
+@cached_chart(key=lambda result: result.market_prior)
+def get_chart2(result): #risk adjusted returns
     plt.switch_backend('AGG')
-    chart2 = market_prior.plot.bar(figsize=(8, 6))
+    chart2 = result.market_prior.plot.bar(figsize=(8, 6))
     chart2 = get_graph()
     return chart2
 
-def get_chart3(): #shrink cov matrix
+@cached_chart(key=lambda result: result.S)
+def get_chart3(result): #shrink cov matrix
     plt.switch_backend('AGG')
     fig, ax = plt.subplots(figsize=(8,6))
-    chart3 = sns.heatmap(S, cmap="Reds", annot=False)
+    chart3 = sns.heatmap(result.S, cmap="Reds", annot=False)
     chart3 = get_graph()
     return chart3
 
-def get_chart4(): #exp returns views
+@cached_chart(key=lambda result: result.viewdict)
+def get_chart4(result): #exp returns views
     plt.switch_backend('AGG')
-    names = list(viewdict.keys())
-    values = list(viewdict.values())
+    names = list(result.viewdict.keys())
+    values = list(result.viewdict.values())
     fig, ax = plt.subplots(figsize=(8, 6))
-    chart4 = plt.bar(range(len(viewdict)),values,tick_label=names)
+    chart4 = plt.bar(range(len(result.viewdict)),values,tick_label=names)
     chart4 = get_graph()
     return chart4
 
-def get_chart5(): #exp returns views
+@cached_chart(key=lambda result: result.rets_df)
+def get_chart5(result): #exp returns views
     plt.switch_backend('AGG')
-    chart5 = rets_df.plot.bar(figsize=(12, 6))
+    chart5 = result.rets_df.plot.bar(figsize=(12, 6))
     chart5 = get_graph()
     return chart5
 
-def get_weights():
+def get_weights(result):
     # df = pd.DataFrame.from_dict(weights.items(), columns=['Ticker', 'Weight'])
-    df = pd.Series(weights, name='Weights')
+    df = pd.Series(result.weights, name='Weights')
     df.index.name = 'Ticker'
     df.reset_index()
     print(df)
@@ -2,12 +2,13 @@ from .black_litterman import (
     market_implied_prior_returns,
     market_implied_risk_aversion,
     BlackLittermanModel,
+    black_litterman_batch,
 )
 from .cla import CLA
 from .discrete_allocation import get_latest_prices, DiscreteAllocation
 from .efficient_frontier import EfficientFrontier
 from .hierarchical_portfolio import HRPOpt
-from .risk_models import CovarianceShrinkage
+from .risk_models import CovarianceShrinkage, FactorCovariance, factor_cov
 from .plotting import Plotting
 
 
@@ -17,11 +18,14 @@ __all__ = [
     "market_implied_prior_returns",
     "market_implied_risk_aversion",
     "BlackLittermanModel",
+    "black_litterman_batch",
     "CLA",
     "get_latest_prices",
     "DiscreteAllocation",
     "EfficientFrontier",
     "HRPOpt",
     "CovarianceShrinkage",
+    "FactorCovariance",
+    "factor_cov",
     "Plotting",
 ]
@@ -15,6 +15,7 @@ import cvxpy as cp
 import scipy.optimize as sco
 from . import objective_functions
 from . import exceptions
+from . import risk_models
 
 
 class BaseOptimizer:
@@ -108,6 +109,13 @@ class BaseConvexOptimizer(BaseOptimizer):
     is stored as self._w. Interacting directly with these variables is highly
     discouraged.
 
+    The compiled ``cvxpy`` problem is kept after the first solve. Inputs that are
+    ``cp.Parameter`` objects (finite weight bounds, expected returns, target return,
+    target variance, risk aversion, risk-free rate) can be changed with
+    ``update_parameter_value()`` and the problem is re-solved from the previous
+    solution without being canonicalised again. Changing the objective or the
+    constraints rebuilds the problem.
+
     Instance variables:
 
     - ``n_assets`` - int
@@ -121,6 +129,8 @@ class BaseConvexOptimizer(BaseOptimizer):
     - ``convex_objective()`` solves for a generic convex objective with linear constraints
     - ``nonconvex_objective()`` solves for a generic nonconvex objective using the scipy backend.
       This is prone to getting stuck in local minima and is generally *not* recommended.
+    - ``is_parameter_defined()`` checks whether a named parameter is part of the problem
+    - ``update_parameter_value()`` changes the value of a named parameter
     - ``set_weights()`` creates self.weights (np.ndarray) from a weights dict
     - ``clean_weights()`` rounds the weights and clips near-zeros.
     - ``save_weights_to_file()`` saves the weights to csv, json, or txt.
@@ -142,8 +152,20 @@ class BaseConvexOptimizer(BaseOptimizer):
         self._constraints = []
         self._lower_bounds = None
         self._upper_bounds = None
+        self._bound_constraints = None
+        self._bound_parameters = None
+        # Parameters whose values are mirrored in a numpy attribute, {parameter name: attribute name}
+        self._parameter_attributes = {
+            "lower_bounds": "_lower_bounds",
+            "upper_bounds": "_upper_bounds",
+        }
         self._map_bounds_to_constraints(weight_bounds)
 
+        # Compiled problem, rebuilt only when the objective or the constraints change
+        self._opt = None
+        self._opt_objective_id = None
+        self._opt_constraint_ids = None
+
     def _map_bounds_to_constraints(self, test_bounds):
         """
         Process input bounds into a form acceptable by cvxpy and add to the constraints list.
@@ -159,7 +181,7 @@ class BaseConvexOptimizer(BaseOptimizer):
         if len(test_bounds) == self.n_assets and not isinstance(
             test_bounds[0], (float, int)
         ):
-            bounds = np.array(test_bounds, dtype=np.float)
+            bounds = np.array(test_bounds, dtype=float)
             self._lower_bounds = np.nan_to_num(bounds[:, 0], nan=-np.inf)
             self._upper_bounds = np.nan_to_num(bounds[:, 1], nan=np.inf)
         else:
@@ -181,8 +203,93 @@ class BaseConvexOptimizer(BaseOptimizer):
                 self._lower_bounds = np.nan_to_num(lower, nan=-1)
                 self._upper_bounds = np.nan_to_num(upper, nan=1)
 
-        self._constraints.append(self._w >= self._lower_bounds)
-        self._constraints.append(self._w <= self._upper_bounds)
+        if (
+            self._bound_parameters is not None
+            and all(isinstance(bound, cp.Parameter) for bound in self._bound_parameters)
+            and np.all(np.isfinite(self._lower_bounds))
+            and np.all(np.isfinite(self._upper_bounds))
+        ):
+            # Only the values change, so a compiled problem can be reused
+            self._bound_parameters[0].value = self._lower_bounds
+            self._bound_parameters[1].value = self._upper_bounds
+            return
+
+        lower = _make_parameter("lower_bounds", self._lower_bounds)
+        upper = _make_parameter("upper_bounds", self._upper_bounds)
+        new_constraints = [self._w >= lower, self._w <= upper]
+        if self._bound_constraints is None:
+            self._constraints.extend(new_constraints)
+        else:
+            # Replace the previous bound constraints in place
+            for old_constraint, new_constraint in zip(
+                self._bound_constraints, new_constraints
+            ):
+                for i, constraint in enumerate(self._constraints):
+                    if constraint is old_constraint:
+                        self._constraints[i] = new_constraint
+        self._bound_constraints = new_constraints
+        self._bound_parameters = [lower, upper]
+
+    def _get_parameters(self):
+        """
+        Helper method to collect the parameters of the current objective and constraints.
+
+        :raises exceptions.InstantiationError: if two different parameters share a name
+        :return: parameters by name
+        :rtype: dict
+        """
+        expressions = list(self._constraints)
+        if self._objective is not None:
+            expressions.append(self._objective)
+        parameters = {}
+        for expression in expressions:
+            for parameter in expression.parameters():
+                name = parameter.name()
+                if name in parameters and parameters[name] is not parameter:
+                    raise exceptions.InstantiationError(
+                        "Parameter name {} defined multiple times".format(name)
+                    )
+                parameters[name] = parameter
+        return parameters
+
+    def is_parameter_defined(self, parameter_name):
+        """
+        Check whether a parameter is part of the objective or the constraints.
+
+        :param parameter_name: name of the parameter, e.g "target_return"
+        :type parameter_name: str
+        :return: True if the parameter is defined
+        :rtype: bool
+        """
+        return parameter_name in self._get_parameters()
+
+    def update_parameter_value(self, parameter_name, new_value):
+        """
+        Change the value of a parameter. The next solve reuses the compiled problem
+        and starts from the previous solution. Example::
+
+            ef.efficient_return(0.1)
+            ef.update_parameter_value("target_return", 0.12)
+            ef.efficient_return(0.12)  # equivalent to the line above followed by a solve
+
+        :param parameter_name: name of the parameter, e.g "target_return"
+        :type parameter_name: str
+        :param new_value: new value of the parameter
+        :type new_value: float or np.ndarray
+        :raises exceptions.InstantiationError: if the parameter is not defined
+        """
+        parameters = self._get_parameters()
+        if parameter_name not in parameters:
+            raise exceptions.InstantiationError(
+                "Parameter {} has not been defined".format(parameter_name)
+            )
+        parameters[parameter_name].value = new_value
+        if parameter_name in self._parameter_attributes:
+            setattr(
+                self,
+                self._parameter_attributes[parameter_name],
+                np.array(parameters[parameter_name].value, dtype=float),
+            )
 
     def _solve_cvxpy_opt_problem(self):
         """
@@ -191,12 +298,32 @@ class BaseConvexOptimizer(BaseOptimizer):
 
         :raises exceptions.OptimizationError: if problem is not solvable by cvxpy
         """
+        constraint_ids = [constraint.id for constraint in self._constraints]
         try:
-            opt = cp.Problem(cp.Minimize(self._objective), self._constraints)
-            opt.solve()
+            if (
+                self._opt is None
+                or self._objective.id != self._opt_objective_id
+                or constraint_ids != self._opt_constraint_ids
+            ):
+                self._opt = cp.Problem(cp.Minimize(self._objective), self._constraints)
+                self._opt_objective_id = self._objective.id
+                self._opt_constraint_ids = constraint_ids
+                self._opt.solve(warm_start=True)
+            elif (
+                self._opt.solver_stats is not None
+                and self._opt.solver_stats.solver_name == cp.OSQP
+            ):
+                # cvxpy only polishes a warm-started OSQP solve when the matrices change,
+                # an unpolished solution misses the constraints by the solver tolerance
+                # (~1e-5). When polishing fails, the problem is solved from scratch.
+                self._opt.solve(warm_start=True, solver=cp.OSQP, polish=True)
+                if self._opt.solver_stats.extra_stats.info.status_polish != 1:
+                    self._opt.solve(warm_start=False, solver=cp.OSQP)
+            else:
+                self._opt.solve(warm_start=True)
         except (TypeError, cp.DCPError):
             raise exceptions.OptimizationError
-        if opt.status != "optimal":
+        if self._opt.status != "optimal":
             raise exceptions.OptimizationError
         self.weights = self._w.value.round(16) + 0.0  # +0.0 removes signed zero
 
@@ -379,6 +506,25 @@ class BaseConvexOptimizer(BaseOptimizer):
         return dict(zip(self.tickers, self.weights))
 
 
+def _make_parameter(name, value, **kwargs):
+    """
+    Helper function to wrap an input in a ``cp.Parameter`` so that it can be changed
+    without recompiling the problem. cvxpy parameters must be finite, so inputs with
+    infinite or missing values are returned unchanged and act as constants.
+
+    :param name: name of the parameter
+    :type name: str
+    :param value: value of the parameter
+    :type value: float or np.ndarray
+    :return: parameter or the value itself
+    :rtype: cp.Parameter or float or np.ndarray
+    """
+    if not np.all(np.isfinite(value)):
+        return value
+    shape = np.shape(value)
+    return cp.Parameter(shape, name=name, value=value, **kwargs)
+
+
 def portfolio_performance(
     weights, expected_returns, cov_matrix, verbose=False, risk_free_rate=0.02
 ):
@@ -390,7 +536,7 @@ def portfolio_performance(
                              optimising for volatility only (but not recommended).
     :type expected_returns: np.ndarray or pd.Series
     :param cov_matrix: covariance of returns for each asset
-    :type cov_matrix: np.array or pd.DataFrame
+    :type cov_matrix: np.array, pd.DataFrame or risk_models.FactorCovariance
     :param weights: weights or assets
     :type weights: list, np.array or dict, optional
     :param verbose: whether performance should be printed, defaults to False
@@ -406,6 +552,8 @@ def portfolio_performance(
             tickers = list(expected_returns.index)
         elif isinstance(cov_matrix, pd.DataFrame):
             tickers = list(cov_matrix.columns)
+        elif isinstance(cov_matrix, risk_models.FactorCovariance):
+            tickers = cov_matrix.tickers
         else:
             tickers = list(range(len(expected_returns)))
         new_weights = np.zeros(len(tickers))
@@ -5,12 +5,21 @@ views. In addition, two utility functions are defined, which calculate:
 
 - market-implied prior estimate of returns
 - market-implied risk-aversion parameter
+
+``black_litterman_batch`` computes the posteriors of many view scenarios that share the
+same prior and covariance in one pass.
+
+The covariance matrix can be a ``risk_models.FactorCovariance``: the prior, the view
+uncertainties, the posterior returns and the weights are then computed from the factored
+form. Only the posterior covariance, which is dense, materialises an NxN matrix.
 """
 
 import warnings
 import numpy as np
 import pandas as pd
-from . import base_optimizer
+import scipy.linalg
+import scipy.sparse
+from . import base_optimizer, risk_models
 
 
 def market_implied_prior_returns(
@@ -30,7 +39,7 @@ def market_implied_prior_returns(
     :param risk_aversion: risk aversion parameter
     :type risk_aversion: positive float
     :param cov_matrix: covariance matrix of asset returns
-    :type cov_matrix: pd.DataFrame or np.ndarray
+    :type cov_matrix: pd.DataFrame, np.ndarray or risk_models.FactorCovariance
     :param risk_free_rate: risk-free rate of borrowing/lending, defaults to 0.02.
                            You should use the appropriate time period, corresponding
                            to the covariance matrix.
@@ -76,6 +85,33 @@ def market_implied_risk_aversion(market_prices, frequency=252, risk_free_rate=0.
     return (r - risk_free_rate) / var
 
 
+def _view_variances(cov_matrix, P):
+    """
+    Variances of the view portfolios, diag(P Sigma P^T), as one batched quadratic form
+    rather than one product per view. P may be a scipy sparse matrix, the cost is then
+    proportional to its number of non-zero entries times N.
+
+    :param cov_matrix: NxN covariance matrix of returns
+    :type cov_matrix: np.ndarray or risk_models.FactorCovariance
+    :param P: KxN picking matrix
+    :type P: np.ndarray or scipy.sparse matrix
+    :return: K view variances
+    :rtype: np.ndarray
+    """
+    if isinstance(cov_matrix, risk_models.FactorCovariance):
+        # ||B^T p||^2 + sum d_i p_i^2 for every view portfolio p
+        P_loadings = np.asarray(P @ cov_matrix.loadings)
+        P_squared = P.multiply(P) if scipy.sparse.issparse(P) else P ** 2
+        specific = np.asarray(P_squared @ cov_matrix.specific_variances).reshape(-1)
+        return np.einsum("kf,kf->k", P_loadings, P_loadings) + specific
+    cov_matrix = np.asarray(cov_matrix)
+    if scipy.sparse.issparse(P):
+        P = scipy.sparse.csr_matrix(P)
+        return np.asarray(P.multiply(P @ cov_matrix).sum(axis=1)).reshape(-1)
+    P = np.asarray(P)
+    return np.einsum("kn,kn->k", P @ cov_matrix, P)
+
+
 class BlackLittermanModel(base_optimizer.BaseOptimizer):
 
     """
@@ -93,7 +129,7 @@ class BlackLittermanModel(base_optimizer.BaseOptimizer):
         - ``n_assets`` - int
         - ``tickers`` - str list
         - ``Q`` - np.ndarray
-        - ``P`` - np.ndarray
+        - ``P`` - np.ndarray or scipy.sparse matrix
         - ``pi`` - np.ndarray
         - ``omega`` - np.ndarray
         - ``tau`` - float
@@ -132,8 +168,9 @@ class BlackLittermanModel(base_optimizer.BaseOptimizer):
         **kwargs
     ):
         """
-        :param cov_matrix: NxN covariance matrix of returns
-        :type cov_matrix: pd.DataFrame or np.ndarray
+        :param cov_matrix: NxN covariance matrix of returns. A factor model is used
+                           in its factored form.
+        :type cov_matrix: pd.DataFrame, np.ndarray or risk_models.FactorCovariance
         :param pi: Nx1 prior estimate of returns, defaults to None.
                    If pi="market", calculate a market-implied prior (requires market_caps
                    to be passed).
@@ -145,7 +182,7 @@ class BlackLittermanModel(base_optimizer.BaseOptimizer):
         :param Q: Kx1 views vector, defaults to None
         :type Q: np.ndarray or pd.DataFrame, optional
         :param P: KxN picking matrix, defaults to None
-        :type P: np.ndarray or pd.DataFrame, optional
+        :type P: np.ndarray, pd.DataFrame or scipy.sparse matrix, optional
         :param omega: KxK view uncertainty matrix (diagonal), defaults to None
                       Can instead pass "idzorek" to use Idzorek's method (requires
                       you to pass view_confidences). If omega="default" or None,
@@ -170,6 +207,9 @@ class BlackLittermanModel(base_optimizer.BaseOptimizer):
         if isinstance(cov_matrix, np.ndarray):
             self.cov_matrix = cov_matrix
             super().__init__(len(cov_matrix), list(range(len(cov_matrix))))
+        elif isinstance(cov_matrix, risk_models.FactorCovariance):
+            self.cov_matrix = cov_matrix
+            super().__init__(len(cov_matrix), cov_matrix.tickers)
         else:
             self.cov_matrix = cov_matrix.values
             super().__init__(len(cov_matrix), cov_matrix.columns)
@@ -190,6 +230,7 @@ class BlackLittermanModel(base_optimizer.BaseOptimizer):
         # Private intermediaries
         self._tau_sigma_P = None
         self._A = None
+        self._A_factor = None
 
         self.posterior_rets = None
         self.posterior_cov = None
@@ -212,13 +253,12 @@ class BlackLittermanModel(base_optimizer.BaseOptimizer):
         # Q is easy to construct
         Q = views.values.reshape(-1, 1)
         # P maps views to the universe.
+        positions = pd.Index(self.tickers).get_indexer(views.index)
+        if (positions < 0).any():
+            #  Could make this smarter by just skipping
+            raise ValueError("Providing a view on an asset not in the universe")
         P = np.zeros((len(Q), self.n_assets))
-        for i, view_ticker in enumerate(views.keys()):
-            try:
-                P[i, list(self.tickers).index(view_ticker)] = 1
-            except ValueError:
-                #  Could make this smarter by just skipping
-                raise ValueError("Providing a view on an asset not in the universe")
+        P[np.arange(len(Q)), positions] = 1
         return Q, P
 
     def _set_Q_P(self, Q, P):
@@ -233,12 +273,15 @@ class BlackLittermanModel(base_optimizer.BaseOptimizer):
             self.P = P.values
         elif isinstance(P, np.ndarray):
             self.P = P
+        elif scipy.sparse.issparse(P):
+            # views usually pick a few assets, sparse products scale with the picks
+            self.P = scipy.sparse.csr_matrix(P)
         elif len(self.Q) == self.n_assets:
             # If a view on every asset is provided, P defaults
             # to the identity matrix.
             self.P = np.eye(self.n_assets)
         else:
-            raise TypeError("P must be an array or dataframe")
+            raise TypeError("P must be an array, sparse matrix or dataframe")
 
     def _set_pi(self, pi, **kwargs):
         if pi is None:
@@ -256,8 +299,10 @@ class BlackLittermanModel(base_optimizer.BaseOptimizer):
             market_caps = kwargs.get("market_caps")
             risk_free_rate = kwargs.get("risk_free_rate", 0)
 
-            self.pi = market_implied_prior_returns(
-                market_caps, self.risk_aversion, self.cov_matrix, risk_free_rate
+            self.pi = np.asarray(
+                market_implied_prior_returns(
+                    market_caps, self.risk_aversion, self.cov_matrix, risk_free_rate
+                )
             ).reshape(-1, 1)
         elif pi == "equal":
             self.pi = np.ones((self.n_assets, 1)) / self.n_assets
@@ -338,7 +383,7 @@ class BlackLittermanModel(base_optimizer.BaseOptimizer):
         :return: KxK diagonal uncertainty matrix
         :rtype: np.ndarray
         """
-        return np.diag(np.diag(tau * P @ cov_matrix @ P.T))
+        return np.diag(tau * _view_variances(cov_matrix, P))
 
     @staticmethod
     def idzorek_method(view_confidences, cov_matrix, pi, Q, P, tau, risk_aversion=1):
@@ -353,24 +398,16 @@ class BlackLittermanModel(base_optimizer.BaseOptimizer):
         :return: KxK diagonal uncertainty matrix
         :rtype: np.ndarray
         """
-        view_omegas = []
-        for view_idx in range(len(Q)):
-            conf = view_confidences[view_idx]
-
-            if conf < 0 or conf > 1:
-                raise ValueError("View confidences must be between 0 and 1")
-
-            # Special handler to avoid dividing by zero.
-            # If zero conf, return very big number as uncertainty
-            if conf == 0:
-                view_omegas.append(1e6)
-                continue
+        conf = np.asarray(view_confidences, dtype=float).reshape(-1)
+        if ((conf < 0) | (conf > 1)).any():
+            raise ValueError("View confidences must be between 0 and 1")
 
-            P_view = P[view_idx].reshape(1, -1)
+        with np.errstate(divide="ignore", invalid="ignore"):
             alpha = (1 - conf) / conf  # formula (44)
-            omega = tau * alpha * P_view @ cov_matrix @ P_view.T  # formula (41)
-            view_omegas.append(omega.item())
-
+            view_omegas = tau * alpha * _view_variances(cov_matrix, P)  # formula (41)
+        # Special handler to avoid dividing by zero.
+        # If zero conf, return very big number as uncertainty
+        view_omegas[conf == 0] = 1e6
         return np.diag(view_omegas)
 
     def bl_returns(self):
@@ -382,15 +419,24 @@ class BlackLittermanModel(base_optimizer.BaseOptimizer):
         :rtype: pd.Series
         """
 
+        # Solve the linear system Ax = b to avoid inversion
+        b = self.Q - self.P @ self.pi
+        x = self._solve_A(b)
+        post_rets = self.pi + self._tau_sigma_P @ x
+        return pd.Series(post_rets.flatten(), index=self.tickers)
+
+    def _solve_A(self, b):
+        """
+        Solve Ax = b with A = P tau Sigma P^T + omega. A is factorised once and the
+        factorisation is shared by ``bl_returns()`` and ``bl_cov()``.
+        """
         if self._tau_sigma_P is None:
             self._tau_sigma_P = self.tau * self.cov_matrix @ self.P.T
-
-        # Solve the linear system Ax = b to avoid inversion
         if self._A is None:
             self._A = (self.P @ self._tau_sigma_P) + self.omega
-        b = self.Q - self.P @ self.pi
-        post_rets = self.pi + self._tau_sigma_P @ np.linalg.solve(self._A, b)
-        return pd.Series(post_rets.flatten(), index=self.tickers)
+        if self._A_factor is None:
+            self._A_factor = scipy.linalg.lu_factor(self._A)
+        return scipy.linalg.lu_solve(self._A_factor, b)
 
     def bl_cov(self):
         """
@@ -399,17 +445,19 @@ class BlackLittermanModel(base_optimizer.BaseOptimizer):
         It is assumed that omega is diagonal. If this is not the case,
         please manually set omega_inv.
 
+        The posterior covariance is dense, so a factor model is materialised here.
+
         :return: posterior covariance matrix
         :rtype: pd.DataFrame
         """
         if self._tau_sigma_P is None:
             self._tau_sigma_P = self.tau * self.cov_matrix @ self.P.T
-        if self._A is None:
-            self._A = (self.P @ self._tau_sigma_P) + self.omega
-
+        cov_matrix = self.cov_matrix
+        if isinstance(cov_matrix, risk_models.FactorCovariance):
+            cov_matrix = cov_matrix.to_dense().values
         b = self._tau_sigma_P.T
-        M = self.tau * self.cov_matrix - self._tau_sigma_P @ np.linalg.solve(self._A, b)
-        posterior_cov = self.cov_matrix + M
+        M = self.tau * cov_matrix - self._tau_sigma_P @ self._solve_A(b)
+        posterior_cov = cov_matrix + M
         return pd.DataFrame(posterior_cov, index=self.tickers, columns=self.tickers)
 
     def bl_weights(self, risk_aversion=None):
@@ -432,9 +480,12 @@ class BlackLittermanModel(base_optimizer.BaseOptimizer):
             risk_aversion = self.risk_aversion
 
         self.posterior_rets = self.bl_returns()
-        A = risk_aversion * self.cov_matrix
-        b = self.posterior_rets
-        raw_weights = np.linalg.solve(A, b)
+        if isinstance(self.cov_matrix, risk_models.FactorCovariance):
+            raw_weights = self.cov_matrix.solve(self.posterior_rets) / risk_aversion
+        else:
+            A = risk_aversion * self.cov_matrix
+            b = self.posterior_rets
+            raw_weights = np.linalg.solve(A, b)
         self.weights = raw_weights / raw_weights.sum()
         return dict(zip(self.tickers, self.weights))
 
@@ -469,3 +520,130 @@ class BlackLittermanModel(base_optimizer.BaseOptimizer):
             verbose,
             risk_free_rate,
         )
+
+
+def black_litterman_batch(
+    cov_matrix,
+    pi,
+    P,
+    Q,
+    omega=None,
+    view_confidences=None,
+    tau=0.05,
+    risk_aversion=1,
+    compute_cov=True,
+    compute_weights=False,
+):
+    """
+    Compute the Black-Litterman posteriors of S view scenarios that share the same prior
+    and covariance matrix, equivalent to S ``BlackLittermanModel`` instances.
+
+    Every scenario has K views, scenarios with fewer views are padded with zero rows of
+    P and Q, which do not change the posterior. All scenarios are solved together with
+    stacked arrays: the KxK systems of the views are solved as one batch, Sigma P^T is
+    one matrix product for all scenarios and the weights of all scenarios are solved
+    with a single Cholesky factorisation of the covariance matrix (the Woodbury
+    identity of a factor model).
+
+    :param cov_matrix: NxN covariance matrix of returns
+    :type cov_matrix: pd.DataFrame, np.ndarray or risk_models.FactorCovariance
+    :param pi: Nx1 prior estimate of returns
+    :type pi: np.ndarray, pd.Series
+    :param P: SxKxN picking matrices
+    :type P: np.ndarray
+    :param Q: SxK views vectors
+    :type Q: np.ndarray
+    :param omega: SxKxK view uncertainty matrices, "idzorek" (requires view_confidences)
+                  or "default"/None for uncertainties proportional to the variance
+    :type omega: np.ndarray or str, optional
+    :param view_confidences: SxK percentage view confidences (between 0 and 1)
+    :type view_confidences: np.ndarray, optional
+    :param tau: the weight-on-views scalar (default is 0.05)
+    :type tau: float, optional
+    :param risk_aversion: risk aversion parameter of the weights, defaults to 1
+    :type risk_aversion: positive float, optional
+    :param compute_cov: whether to compute the SxNxN posterior covariance matrices.
+                        They are dense, so a factor model is materialised once for
+                        them, pass False to keep it in factored form.
+    :type compute_cov: bool, optional
+    :param compute_weights: whether to compute the weights implied by posterior returns,
+                            as ``BlackLittermanModel.bl_weights()``
+    :type compute_weights: bool, optional
+    :raises ValueError: if the dimensions or the confidences are not valid
+    :return: SxN posterior returns, SxNxN posterior covariances (or None) and
+             SxN weights (or None)
+    :rtype: (np.ndarray, np.ndarray, np.ndarray)
+    """
+    if not isinstance(cov_matrix, risk_models.FactorCovariance):
+        cov_matrix = np.asarray(cov_matrix, dtype=float)
+    pi = np.asarray(pi, dtype=float).reshape(-1)
+    P = np.asarray(P, dtype=float)
+    Q = np.asarray(Q, dtype=float)
+    N = len(pi)
+    if P.ndim != 3 or P.shape[2] != N or Q.shape != P.shape[:2]:
+        raise ValueError("P must have dimensions SxKxN and Q dimensions SxK")
+    if cov_matrix.shape != (N, N):
+        raise ValueError("cov_matrix must have shape NxN")
+    if tau <= 0 or tau > 1:
+        raise ValueError("tau should be between 0 and 1")
+    is_padding = ~P.any(axis=2)
+
+    # SxKxN, Sigma is symmetric so this is (Sigma P^T)^T
+    P_sigma = (cov_matrix @ P.reshape(-1, N).T).T.reshape(P.shape)
+    view_variances = P_sigma @ P.transpose(0, 2, 1)  # SxKxK
+    if isinstance(omega, np.ndarray):
+        if omega.shape != view_variances.shape:
+            raise ValueError("omega must have dimensions SxKxK")
+        omega = omega.astype(float)
+    elif omega == "idzorek":
+        if view_confidences is None:
+            raise ValueError(
+                "To use Idzorek's method, please supply a matrix of percentage "
+                "confidence levels for each view."
+            )
+        view_confidences = np.asarray(view_confidences, dtype=float)
+        if view_confidences.shape != Q.shape:
+            raise ValueError("view_confidences must have dimensions SxK")
+        if ((view_confidences < 0) | (view_confidences > 1)).any():
+            raise ValueError("View confidences must be between 0 and 1")
+        diagonal = np.einsum("skk->sk", view_variances)
+        with np.errstate(divide="ignore"):
+            alpha = (1 - view_confidences) / view_confidences
+        # zero confidence is a very big uncertainty, as in idzorek_method
+        omega_diagonal = np.where(view_confidences == 0, 1e6, tau * alpha * diagonal)
+        omega = np.einsum("sk,kl->skl", omega_diagonal, np.eye(Q.shape[1]))
+    elif omega is None or omega == "default":
+        diagonal = np.einsum("skk->sk", view_variances)
+        omega = np.einsum("sk,kl->skl", tau * diagonal, np.eye(Q.shape[1]))
+    else:
+        raise TypeError("omega must be an SxKxK array or a string")
+    # padding views get a unit uncertainty, so that their rows of A are not singular
+    scenarios, views = np.nonzero(is_padding)
+    omega[scenarios, views, views] = 1
+
+    A = tau * view_variances + omega
+    # solved together: A^-1 (Q - P pi) and A^-1 P Sigma, one batched factorisation of A
+    rhs = np.concatenate([(Q - P @ pi)[:, :, np.newaxis], P_sigma], axis=2)
+    solved = np.linalg.solve(A, rhs)
+    posterior_rets = pi + tau * np.einsum("skn,sk->sn", P_sigma, solved[:, :, 0])
+
+    posterior_cov = None
+    if compute_cov:
+        dense_cov = cov_matrix
+        if isinstance(cov_matrix, risk_models.FactorCovariance):
+            dense_cov = cov_matrix.to_dense().values
+        posterior_cov = (1 + tau) * dense_cov - tau ** 2 * (
+            P_sigma.transpose(0, 2, 1) @ solved[:, :, 1:]
+        )
+
+    weights = None
+    if compute_weights:
+        if risk_aversion <= 0:
+            raise ValueError("risk_aversion should be a positive float")
+        if isinstance(cov_matrix, risk_models.FactorCovariance):
+            raw_weights = cov_matrix.solve(posterior_rets.T).T / risk_aversion
+        else:
+            factor = scipy.linalg.cho_factor(risk_aversion * cov_matrix)
+            raw_weights = scipy.linalg.cho_solve(factor, posterior_rets.T).T
+        weights = raw_weights / raw_weights.sum(axis=1, keepdims=True)
+    return posterior_rets, posterior_cov, weights
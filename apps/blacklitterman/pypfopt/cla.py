@@ -121,74 +121,113 @@ class CLA(base_optimizer.BaseOptimizer):
         b = np.sort(a, order="mu")
         # 3) First free weight
         i, w = b.shape[0], np.copy(self.lB)
-        while sum(w) < 1:
+        while w.sum() < 1:
             i -= 1
             w[b[i][0]] = self.uB[b[i][0]]
-        w[b[i][0]] += 1 - sum(w)
+        w[b[i][0]] += 1 - w.sum()
         return [b[i][0]], w
 
-    def _compute_bi(self, c, bi):
-        if c > 0:
-            bi = bi[1][0]
-        if c < 0:
-            bi = bi[0][0]
-        return bi
-
-    def _compute_w(self, covarF_inv, covarFB, meanF, wB):
+    def _compute_w(self, covarF_inv, meanF, terms):
         # 1) compute gamma
-        onesF = np.ones(meanF.shape)
-        g1 = np.dot(np.dot(onesF.T, covarF_inv), meanF)
-        g2 = np.dot(np.dot(onesF.T, covarF_inv), onesF)
-        if wB is None:
-            g, w1 = float(-self.ls[-1] * g1 / g2 + 1 / g2), 0
-        else:
-            onesB = np.ones(wB.shape)
-            g3 = np.dot(onesB.T, wB)
-            g4 = np.dot(covarF_inv, covarFB)
-            w1 = np.dot(g4, wB)
-            g4 = np.dot(onesF.T, w1)
-            g = float(-self.ls[-1] * g1 / g2 + (1 - g3 + g4) / g2)
+        u, _, g2, _, _, l1, w1 = terms
+        g1 = u @ meanF
+        g = float(-self.ls[-1] * g1 / g2 + (1 - l1 + w1.sum()) / g2)
         # 2) compute weights
-        w2 = np.dot(covarF_inv, onesF)
-        w3 = np.dot(covarF_inv, meanF)
-        return -w1 + g * w2 + self.ls[-1] * w3, g
-
-    def _compute_lambda(self, covarF_inv, covarFB, meanF, wB, i, bi):
-        # 1) C
-        onesF = np.ones(meanF.shape)
-        c1 = np.dot(np.dot(onesF.T, covarF_inv), onesF)
-        c2 = np.dot(covarF_inv, meanF)
-        c3 = np.dot(np.dot(onesF.T, covarF_inv), meanF)
-        c4 = np.dot(covarF_inv, onesF)
-        c = -c1 * c2[i] + c3 * c4[i]
-        if c == 0:
-            return None, None
-        # 2) bi
-        if type(bi) == list:
-            bi = self._compute_bi(c, bi)
-        # 3) Lambda
-        if wB is None:
-            # All free assets
-            return float((c4[i] - c1 * bi) / c), bi
-        else:
-            onesB = np.ones(wB.shape)
-            l1 = np.dot(onesB.T, wB)
-            l2 = np.dot(covarF_inv, covarFB)
-            l3 = np.dot(l2, wB)
-            l2 = np.dot(onesF.T, l3)
-            return float(((1 - l1 + l2) * c4[i] - c1 * (bi + l3[i])) / c), bi
-
-    def _get_matrices(self, f):
-        # Slice covarF,covarFB,covarB,meanF,meanB,wF,wB
-        covarF = self._reduce_matrix(self.cov_matrix, f, f)
-        meanF = self._reduce_matrix(self.mean, f, [0])
-        b = self._get_b(f)
-        covarFB = self._reduce_matrix(self.cov_matrix, f, b)
-        wB = self._reduce_matrix(self.w[-1], b, [0])
-        return covarF, covarFB, meanF, wB
+        return -w1 + g * u + self.ls[-1] * (covarF_inv @ meanF), g
+
+    def _get_terms(self, covarF_inv, f, w):
+        """
+        Helper method computing the quantities shared by all the candidate lambdas
+        of one iteration, given the inverse of the free-set covariance.
+
+        :return: covarF_inv.ones, covarF_inv.meanF, ones.covarF_inv.ones,
+                 ones.covarF_inv.meanF, covar.wB for every asset, sum of wB,
+                 covarF_inv.covarFB.wB
+        :rtype: tuple
+        """
+        meanF = self.expected_returns[f]
+        u = covarF_inv.sum(axis=1)
+        v = covarF_inv @ meanF
+        wB = w[:, 0].copy()
+        wB[f] = 0
+        q = self.cov_matrix @ wB
+        return u, v, u.sum(), u @ meanF, q, wB.sum(), covarF_inv @ q[f]
+
+    def _compute_lambdas_in(self, f, terms):
+        """
+        Compute the lambda at which each free weight would hit one of its bounds.
+
+        :return: lambdas (-inf where undefined) and the bound each weight would hit
+        :rtype: (np.ndarray, np.ndarray)
+        """
+        u, v, c1, c3, q, l1, l3 = terms
+        c = -c1 * v + c3 * u
+        bi = np.where(c > 0, self.uB[f, 0], self.lB[f, 0])
+        l2 = l3.sum()
+        with np.errstate(divide="ignore", invalid="ignore"):
+            l = ((1 - l1 + l2) * u - c1 * (bi + l3)) / c
+        l[(c == 0) | ~np.isfinite(l)] = -np.inf
+        return l, bi
+
+    def _compute_lambdas_out(self, covarF_inv_covar, f, b, terms):
+        """
+        Compute the lambda at which each bounded weight would become free.
+
+        The inverse of the covariance of the free set extended by one bounded asset is
+        a bordered update of ``covarF_inv``, so only the terms that involve the new
+        asset are computed, for all the bounded assets at once.
+
+        :return: lambdas, -inf where undefined
+        :rtype: np.ndarray
+        """
+        u, v, c1, c3, q, l1, l3 = terms
+        wi = self.w[-1][b, 0]
+        covarFi = self.cov_matrix[np.ix_(f, b)]
+        a = covarF_inv_covar[:, b]  # covarF_inv.covarFi
+        # Schur complement of covarF in the bordered matrix
+        sAs = np.einsum("ij,ij->j", covarFi, a)
+        schur = self.cov_matrix[b, b] - sAs
+        su = a.sum(axis=0)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            # last row of the extended inverse times ones and mean
+            u_last = (1 - su) / schur
+            v_last = (self.expected_returns[b] - a.T @ self.expected_returns[f]) / schur
+            c1_ = c1 + (1 - su) * u_last
+            c3_ = c3 + (1 - su) * v_last
+            c = -c1_ * v_last + c3_ * u_last
+            # covar.wB once the asset has left the bounded set
+            a_s = a.T @ q[f] - wi * sAs
+            s_last = q[b] - self.cov_matrix[b, b] * wi
+            l2 = l3.sum() - wi * su - u_last * a_s + u_last * s_last
+            l3_last = (s_last - a_s) / schur
+            l = ((1 - (l1 - wi) + l2) * u_last - c1_ * (wi + l3_last)) / c
+        l[(c == 0) | ~np.isfinite(l)] = -np.inf
+        return l
+
+    def _add_to_free_set(self, covarF_inv, covarF_inv_covar, f, i):
+        # Bordered update of covarF_inv and covarF_inv.covar[f] after appending asset i
+        a = covarF_inv_covar[:, i]
+        schur = self.cov_matrix[i, i] - self.cov_matrix[f, i] @ a
+        k = len(f)
+        inv = np.empty((k + 1, k + 1))
+        inv[:k, :k] = covarF_inv + np.outer(a, a) / schur
+        inv[:k, k] = inv[k, :k] = -a / schur
+        inv[k, k] = 1 / schur
+        row = (self.cov_matrix[i] - self.cov_matrix[f, i] @ covarF_inv_covar) / schur
+        return inv, np.vstack([covarF_inv_covar - np.outer(a, row), row])
+
+    @staticmethod
+    def _remove_from_free_set(covarF_inv, covarF_inv_covar, j):
+        # Update of covarF_inv and covarF_inv.covar[f] after removing free asset j
+        keep = np.arange(covarF_inv.shape[0]) != j
+        column = covarF_inv[keep, j] / covarF_inv[j, j]
+        return (
+            covarF_inv[np.ix_(keep, keep)] - np.outer(column, covarF_inv[j, keep]),
+            covarF_inv_covar[keep] - np.outer(column, covarF_inv_covar[j]),
+        )
 
     def _get_b(self, f):
-        return self._diff_lists(list(range(self.mean.shape[0])), f)
+        return sorted(self._diff_lists(list(range(self.mean.shape[0])), f))
 
     @staticmethod
     def _diff_lists(list1, list2):
@@ -199,66 +238,39 @@ class CLA(base_optimizer.BaseOptimizer):
         # Reduce a matrix to the provided list of rows and columns
         if len(listX) == 0 or len(listY) == 0:
             return
-        matrix_ = matrix[:, listY[0] : listY[0] + 1]
-        for i in listY[1:]:
-            a = matrix[:, i : i + 1]
-            matrix_ = np.append(matrix_, a, 1)
-        matrix__ = matrix_[listX[0] : listX[0] + 1, :]
-        for i in listX[1:]:
-            a = matrix_[i : i + 1, :]
-            matrix__ = np.append(matrix__, a, 0)
-        return matrix__
+        return matrix[np.ix_(listX, listY)]
 
     def _purge_num_err(self, tol):
         # Purge violations of inequality constraints (associated with ill-conditioned cov matrix)
-        i = 0
-        while True:
-            flag = False
-            if i == len(self.w):
-                break
-            if abs(sum(self.w[i]) - 1) > tol:
-                flag = True
-            else:
-                for j in range(self.w[i].shape[0]):
-                    if (
-                        self.w[i][j] - self.lB[j] < -tol
-                        or self.w[i][j] - self.uB[j] > tol
-                    ):
-                        flag = True
-                        break
-            if flag is True:
-                del self.w[i]
-                del self.ls[i]
-                del self.g[i]
-                del self.f[i]
-            else:
-                i += 1
+        keep = [
+            abs(w.sum() - 1) <= tol
+            and not (w - self.lB < -tol).any()
+            and not (w - self.uB > tol).any()
+            for w in self.w
+        ]
+        self._keep_turning_points(keep)
 
     def _purge_excess(self):
-        # Remove violations of the convex hull
-        i, repeat = 0, False
-        while True:
-            if repeat is False:
-                i += 1
-            if i == len(self.w) - 1:
-                break
-            w = self.w[i]
-            mu = np.dot(w.T, self.mean)[0, 0]
-            j, repeat = i + 1, False
-            while True:
-                if j == len(self.w):
-                    break
-                w = self.w[j]
-                mu_ = np.dot(w.T, self.mean)[0, 0]
-                if mu < mu_:
-                    del self.w[i]
-                    del self.ls[i]
-                    del self.g[i]
-                    del self.f[i]
-                    repeat = True
-                    break
-                else:
-                    j += 1
+        # Remove violations of the convex hull: a turning point is dropped
+        # if any later one has a higher return (the first and last are kept)
+        mu = np.array([np.dot(w.T, self.mean)[0, 0] for w in self.w])
+        later_max = np.maximum.accumulate(mu[::-1])[::-1]
+        keep = [True] + list(mu[1:-1] >= later_max[2:]) + [True]
+        self._keep_turning_points(keep)
+
+    def _purge_repeated(self, tol):
+        # Remove a turning point equal to the previous one, e.g. the first one when
+        # it is the starting solution, or when two weights hit a bound at the same lambda
+        keep = [True] + [
+            np.abs(w1 - w0).max() > tol for w0, w1 in zip(self.w, self.w[1:])
+        ]
+        self._keep_turning_points(keep)
+
+    def _keep_turning_points(self, keep):
+        self.w = [x for x, k in zip(self.w, keep) if k]
+        self.ls = [x for x, k in zip(self.ls, keep) if k]
+        self.g = [x for x, k in zip(self.g, keep) if k]
+        self.f = [x for x, k in zip(self.f, keep) if k]
 
     def _golden_section(self, obj, a, b, **kargs):
         # Golden section method. Maximum if kargs['minimum']==False is passed
@@ -294,11 +306,12 @@ class CLA(base_optimizer.BaseOptimizer):
         else:
             return x2, sign * f2
 
-    def _eval_sr(self, a, w0, w1):
-        # Evaluate SR of the portfolio within the convex combination
-        w = a * w0 + (1 - a) * w1
-        b = np.dot(w.T, self.mean)[0, 0]
-        c = np.dot(np.dot(w.T, self.cov_matrix), w)[0, 0] ** 0.5
+    @staticmethod
+    def _eval_sr(a, mu0, mu1, var0, cov01, var1):
+        # Evaluate SR of the portfolio within the convex combination,
+        # from the returns and (co)variances of the two end points
+        b = a * mu0 + (1 - a) * mu1
+        c = (a**2 * var0 + 2 * a * (1 - a) * cov01 + (1 - a) ** 2 * var1) ** 0.5
         return b / c
 
     def _solve(self):
@@ -308,60 +321,60 @@ class CLA(base_optimizer.BaseOptimizer):
         self.ls.append(None)
         self.g.append(None)
         self.f.append(f[:])
+        # The inverse of covarF (and its product with the rows of the free assets) is
+        # updated as assets enter and leave the free set instead of being recomputed
+        covarF_inv = np.linalg.inv(self._reduce_matrix(self.cov_matrix, f, f))
+        covarF_inv_covar = covarF_inv @ self.cov_matrix[f]
+        i_bounded = None  # asset bound at the previous turning point
         while True:
+            terms = self._get_terms(covarF_inv, f, w)
             # 1) case a): Bound one free weight
             l_in = None
             if len(f) > 1:
-                covarF, covarFB, meanF, wB = self._get_matrices(f)
-                covarF_inv = np.linalg.inv(covarF)
-                j = 0
-                for i in f:
-                    l, bi = self._compute_lambda(
-                        covarF_inv, covarFB, meanF, wB, j, [self.lB[i], self.uB[i]]
-                    )
-                    if CLA._infnone(l) > CLA._infnone(l_in):
-                        l_in, i_in, bi_in = l, i, bi
-                    j += 1
+                l, bi = self._compute_lambdas_in(f, terms)
+                j = int(np.argmax(l))
+                if l[j] > -np.inf:
+                    l_in, i_in, bi_in = float(l[j]), f[j], bi[j]
             # 2) case b): Free one bounded weight
             l_out = None
             if len(f) < self.mean.shape[0]:
                 b = self._get_b(f)
-                for i in b:
-                    covarF, covarFB, meanF, wB = self._get_matrices(f + [i])
-                    covarF_inv = np.linalg.inv(covarF)
-                    l, bi = self._compute_lambda(
-                        covarF_inv,
-                        covarFB,
-                        meanF,
-                        wB,
-                        meanF.shape[0] - 1,
-                        self.w[-1][i],
-                    )
-                    if (self.ls[-1] is None or l < self.ls[-1]) and l > CLA._infnone(
-                        l_out
-                    ):
-                        l_out, i_out = l, i
+                l = self._compute_lambdas_out(covarF_inv_covar, f, b, terms)
+                if self.ls[-1] is not None:
+                    l[l >= self.ls[-1]] = -np.inf
+                if i_bounded is not None:
+                    # its lambda equals the current one, rounding must not free it again
+                    l[b.index(i_bounded)] = -np.inf
+                j = int(np.argmax(l))
+                if l[j] > -np.inf:
+                    l_out, i_out = float(l[j]), b[j]
             if (l_in is None or l_in < 0) and (l_out is None or l_out < 0):
                 # 3) compute minimum variance solution
                 self.ls.append(0)
-                covarF, covarFB, meanF, wB = self._get_matrices(f)
-                covarF_inv = np.linalg.inv(covarF)
-                meanF = np.zeros(meanF.shape)
+                meanF = np.zeros(len(f))
             else:
                 # 4) decide lambda
                 if CLA._infnone(l_in) > CLA._infnone(l_out):
                     self.ls.append(l_in)
+                    i_bounded = i_in
+                    covarF_inv, covarF_inv_covar = self._remove_from_free_set(
+                        covarF_inv, covarF_inv_covar, f.index(i_in)
+                    )
                     f.remove(i_in)
                     w[i_in] = bi_in  # set value at the correct boundary
                 else:
                     self.ls.append(l_out)
+                    i_bounded = None
+                    covarF_inv, covarF_inv_covar = self._add_to_free_set(
+                        covarF_inv, covarF_inv_covar, f, i_out
+                    )
                     f.append(i_out)
-                covarF, covarFB, meanF, wB = self._get_matrices(f)
-                covarF_inv = np.linalg.inv(covarF)
+                meanF = self.expected_returns[f]
+                # the weight that was just bound is taken at its bound
+                terms = self._get_terms(covarF_inv, f, w)
             # 5) compute solution vector
-            wF, g = self._compute_w(covarF_inv, covarFB, meanF, wB)
-            for i in range(len(f)):
-                w[f[i]] = wF[i]
+            wF, g = self._compute_w(covarF_inv, meanF, terms)
+            w[f, 0] = wF
             self.w.append(np.copy(w))  # store solution
             self.g.append(g)
             self.f.append(f[:])
@@ -370,6 +383,7 @@ class CLA(base_optimizer.BaseOptimizer):
         # 6) Purge turning points
         self._purge_num_err(10e-10)
         self._purge_excess()
+        self._purge_repeated(10e-10)
 
     def max_sharpe(self):
         """
@@ -382,10 +396,18 @@ class CLA(base_optimizer.BaseOptimizer):
             self._solve()
         # 1) Compute the local max SR portfolio between any two neighbor turning points
         w_sr, sr = [], []
+        W = np.hstack(self.w)
+        mu = W.T @ self.expected_returns
+        covarW = self.cov_matrix @ W
+        var = np.einsum("ij,ij->j", W, covarW)
         for i in range(len(self.w) - 1):
             w0 = np.copy(self.w[i])
             w1 = np.copy(self.w[i + 1])
-            kargs = {"minimum": False, "args": (w0, w1)}
+            cov01 = W[:, i] @ covarW[:, i + 1]
+            kargs = {
+                "minimum": False,
+                "args": (mu[i], mu[i + 1], var[i], cov01, var[i + 1]),
+            }
             a, b = self._golden_section(self._eval_sr, 0, 1, **kargs)
             w_sr.append(a * w0 + (1 - a) * w1)
             sr.append(b)
@@ -8,7 +8,7 @@ import numpy as np
 import pandas as pd
 import cvxpy as cp
 
-from . import objective_functions, base_optimizer
+from . import objective_functions, base_optimizer, exceptions, risk_models
 
 
 class EfficientFrontier(base_optimizer.BaseConvexOptimizer):
@@ -17,7 +17,14 @@ class EfficientFrontier(base_optimizer.BaseConvexOptimizer):
     An EfficientFrontier object (inheriting from BaseConvexOptimizer) contains multiple
     optimisation methods that can be called (corresponding to different objective
     functions) with various parameters. Note: a new EfficientFrontier object should
-    be instantiated if you want to make any change to objectives/constraints/bounds/parameters.
+    be instantiated if you want to make any change to objectives/constraints.
+
+    Calling the same optimisation method again with a different target return, target
+    volatility, risk aversion or risk-free rate only updates the corresponding
+    ``cp.Parameter`` and re-solves the compiled problem, which makes frontier sweeps cheap::
+
+        ef = EfficientFrontier(mu, S)
+        frontier = [ef.efficient_return(r) for r in target_returns]
 
     Instance variables:
 
@@ -26,7 +33,7 @@ class EfficientFrontier(base_optimizer.BaseConvexOptimizer):
         - ``n_assets`` - int
         - ``tickers`` - str list
         - ``bounds`` - float tuple OR (float tuple) list
-        - ``cov_matrix`` - np.ndarray
+        - ``cov_matrix`` - np.ndarray or risk_models.FactorCovariance
         - ``expected_returns`` - np.ndarray
 
 
@@ -60,7 +67,9 @@ class EfficientFrontier(base_optimizer.BaseConvexOptimizer):
         :type expected_returns: pd.Series, list, np.ndarray
         :param cov_matrix: covariance of returns for each asset. This **must** be
                            positive semidefinite, otherwise optimisation will fail.
-        :type cov_matrix: pd.DataFrame or np.array
+                           A factor model is used in its factored form, which keeps
+                           large universes tractable.
+        :type cov_matrix: pd.DataFrame, np.array or risk_models.FactorCovariance
         :param weight_bounds: minimum and maximum weight of each asset OR single min/max pair
                               if all identical, defaults to (0, 1). Must be changed to (-1, 1)
                               for portfolios with shorting.
@@ -69,7 +78,7 @@ class EfficientFrontier(base_optimizer.BaseConvexOptimizer):
                       non-negligible weights
         :type gamma: float, optional
         :raises TypeError: if ``expected_returns`` is not a series, list or array
-        :raises TypeError: if ``cov_matrix`` is not a dataframe or array
+        :raises TypeError: if ``cov_matrix`` is not a dataframe, array or factor model
         """
         # Inputs
         self.cov_matrix = EfficientFrontier._validate_cov_matrix(cov_matrix)
@@ -82,6 +91,8 @@ class EfficientFrontier(base_optimizer.BaseConvexOptimizer):
             tickers = list(expected_returns.index)
         elif isinstance(cov_matrix, pd.DataFrame):
             tickers = list(cov_matrix.columns)
+        elif isinstance(cov_matrix, risk_models.FactorCovariance):
+            tickers = cov_matrix.tickers
         else:  # use integer labels
             tickers = list(range(len(expected_returns)))
 
@@ -91,6 +102,17 @@ class EfficientFrontier(base_optimizer.BaseConvexOptimizer):
 
         super().__init__(len(tickers), tickers, weight_bounds)
 
+        # Expected returns enter the problem as a parameter, see update_parameter_value()
+        self._expected_returns_parameter = None
+        if self.expected_returns is not None:
+            self._expected_returns_parameter = base_optimizer._make_parameter(
+                "expected_returns", self.expected_returns
+            )
+            self._parameter_attributes["expected_returns"] = "expected_returns"
+        self._market_neutral = None
+        self._max_sharpe_scale = None
+        self._cov_factor = None
+
     @staticmethod
     def _validate_expected_returns(expected_returns):
         if expected_returns is None:
@@ -113,7 +135,7 @@ class EfficientFrontier(base_optimizer.BaseConvexOptimizer):
             raise ValueError("cov_matrix must be provided")
         elif isinstance(cov_matrix, pd.DataFrame):
             return cov_matrix.values
-        elif isinstance(cov_matrix, np.ndarray):
+        elif isinstance(cov_matrix, (np.ndarray, risk_models.FactorCovariance)):
             return cov_matrix
         else:
             raise TypeError("cov_matrix is not a series, list or array")
@@ -130,9 +152,54 @@ class EfficientFrontier(base_optimizer.BaseConvexOptimizer):
                 RuntimeWarning,
             )
             self._map_bounds_to_constraints((-1, 1))
-            # Delete original constraints
-            del self._constraints[0]
-            del self._constraints[0]
+
+    def _make_portfolio_variance(self):
+        """
+        Helper method to build the portfolio variance as the sum of squares of the
+        factorised covariance matrix. With vector parameters in the problem (expected
+        returns, bounds) cvxpy would otherwise compile ``cp.quad_form`` into a parameter
+        tensor that grows with the cube of the number of assets. A factor model is
+        already factorised and is used as is.
+
+        :return: portfolio variance
+        :rtype: cp.Expression
+        """
+        if isinstance(self.cov_matrix, risk_models.FactorCovariance):
+            return objective_functions.portfolio_variance(self._w, self.cov_matrix)
+        if self._cov_factor is None:
+            eigenvalues, eigenvectors = np.linalg.eigh(self.cov_matrix)
+            if eigenvalues.min() < -1e-8 * max(1.0, eigenvalues.max()):
+                # not positive semidefinite, let cvxpy report it
+                return cp.quad_form(self._w, self.cov_matrix)
+            self._cov_factor = np.sqrt(np.clip(eigenvalues, 0, None))[:, None] * eigenvectors.T
+        return cp.sum_squares(self._cov_factor @ self._w)
+
+    def _make_weight_sum_constraint(self, market_neutral):
+        """
+        Helper method to add the constraint that weights sum to 1 (default), or to 0 for
+        a market neutral portfolio.
+
+        :param market_neutral: whether the portfolio should be market neutral
+        :type market_neutral: bool
+        """
+        if market_neutral:
+            self._market_neutral_bounds_check()
+            self._constraints.append(cp.sum(self._w) == 0)
+        else:
+            self._constraints.append(cp.sum(self._w) == 1)
+        self._market_neutral = market_neutral
+
+    def _validate_market_neutral(self, market_neutral):
+        """
+        Helper method to make sure a parameterised problem is re-solved with the same
+        weight sum constraint.
+
+        :raises exceptions.InstantiationError: if ``market_neutral`` has changed
+        """
+        if self._market_neutral != market_neutral:
+            raise exceptions.InstantiationError(
+                "A new instance must be created when changing market_neutral"
+            )
 
     def min_volatility(self):
         """
@@ -141,13 +208,11 @@ class EfficientFrontier(base_optimizer.BaseConvexOptimizer):
         :return: asset weights for the volatility-minimising portfolio
         :rtype: dict
         """
-        self._objective = objective_functions.portfolio_variance(
-            self._w, self.cov_matrix
-        )
+        self._objective = self._make_portfolio_variance()
         for obj in self._additional_objectives:
             self._objective += obj
 
-        self._constraints.append(cp.sum(self._w) == 1)
+        self._make_weight_sum_constraint(False)
 
         self._solve_cvxpy_opt_problem()
         return dict(zip(self.tickers, self.weights))
@@ -171,48 +236,55 @@ class EfficientFrontier(base_optimizer.BaseConvexOptimizer):
         if not isinstance(risk_free_rate, (int, float)):
             raise ValueError("risk_free_rate should be numeric")
 
-        # max_sharpe requires us to make a variable transformation.
-        # Here we treat w as the transformed variable.
-        self._objective = cp.quad_form(self._w, self.cov_matrix)
-        k = cp.Variable()
-
-        # Note: objectives are not scaled by k. Hence there are subtle differences
-        # between how these objectives work for max_sharpe vs min_volatility
-        if len(self._additional_objectives) > 0:
-            warnings.warn(
-                "max_sharpe transforms the optimisation problem so additional objectives may not work as expected."
-            )
-        for obj in self._additional_objectives:
-            self._objective += obj
-
-        new_constraints = []
-        # Must rebuild the constraints
-        for constr in self._constraints:
-            if isinstance(constr, cp.constraints.nonpos.Inequality):
-                # Either the first or second item is the expression
-                if isinstance(
-                    constr.args[0], cp.expressions.constants.constant.Constant
-                ):
-                    new_constraints.append(constr.args[1] >= constr.args[0] * k)
-                else:
-                    new_constraints.append(constr.args[0] <= constr.args[1] * k)
-            elif isinstance(constr, cp.constraints.zero.Equality):
-                new_constraints.append(constr.args[0] == constr.args[1] * k)
-            else:
-                raise TypeError(
-                    "Please check that your constraints are in a suitable format"
+        if self.is_parameter_defined("risk_free_rate"):
+            self.update_parameter_value("risk_free_rate", risk_free_rate)
+        else:
+            # max_sharpe requires us to make a variable transformation.
+            # Here we treat w as the transformed variable.
+            self._objective = self._make_portfolio_variance()
+            k = cp.Variable()
+
+            # Note: objectives are not scaled by k. Hence there are subtle differences
+            # between how these objectives work for max_sharpe vs min_volatility
+            if len(self._additional_objectives) > 0:
+                warnings.warn(
+                    "max_sharpe transforms the optimisation problem so additional objectives may not work as expected."
                 )
+            for obj in self._additional_objectives:
+                self._objective += obj
+
+            new_constraints = []
+            # Must rebuild the constraints
+            for constr in self._constraints:
+                if isinstance(constr, cp.constraints.nonpos.Inequality):
+                    # Either the first or second item is the expression,
+                    # the other one is a constant or a parameter such as the bounds
+                    if constr.args[0].is_constant():
+                        new_constraints.append(constr.args[1] >= constr.args[0] * k)
+                    else:
+                        new_constraints.append(constr.args[0] <= constr.args[1] * k)
+                elif isinstance(constr, cp.constraints.zero.Equality):
+                    new_constraints.append(constr.args[0] == constr.args[1] * k)
+                else:
+                    raise TypeError(
+                        "Please check that your constraints are in a suitable format"
+                    )
 
-        # Transformed max_sharpe convex problem:
-        self._constraints = [
-            (self.expected_returns - risk_free_rate).T * self._w == 1,
-            cp.sum(self._w) == k,
-            k >= 0,
-        ] + new_constraints
+            # Transformed max_sharpe convex problem:
+            risk_free_rate_parameter = cp.Parameter(
+                name="risk_free_rate", value=risk_free_rate
+            )
+            self._constraints = [
+                (self._expected_returns_parameter - risk_free_rate_parameter) @ self._w
+                == 1,
+                cp.sum(self._w) == k,
+                k >= 0,
+            ] + new_constraints
+            self._max_sharpe_scale = k
 
         self._solve_cvxpy_opt_problem()
         # Inverse-transform
-        self.weights = (self._w.value / k.value).round(16) + 0.0
+        self.weights = (self._w.value / self._max_sharpe_scale.value).round(16) + 0.0
         return dict(zip(self.tickers, self.weights))
 
     def max_quadratic_utility(self, risk_aversion=1, market_neutral=False):
@@ -235,17 +307,21 @@ class EfficientFrontier(base_optimizer.BaseConvexOptimizer):
         if risk_aversion <= 0:
             raise ValueError("risk aversion coefficient must be greater than zero")
 
-        self._objective = objective_functions.quadratic_utility(
-            self._w, self.expected_returns, self.cov_matrix, risk_aversion=risk_aversion
-        )
-        for obj in self._additional_objectives:
-            self._objective += obj
-
-        if market_neutral:
-            self._market_neutral_bounds_check()
-            self._constraints.append(cp.sum(self._w) == 0)
+        if self.is_parameter_defined("risk_aversion"):
+            self._validate_market_neutral(market_neutral)
+            self.update_parameter_value("risk_aversion", risk_aversion)
         else:
-            self._constraints.append(cp.sum(self._w) == 1)
+            risk_aversion_parameter = cp.Parameter(
+                name="risk_aversion", value=risk_aversion, nonneg=True
+            )
+            # Same as objective_functions.quadratic_utility with the factorised variance
+            self._objective = objective_functions.portfolio_return(
+                self._w, self._expected_returns_parameter
+            ) + 0.5 * risk_aversion_parameter * self._make_portfolio_variance()
+            for obj in self._additional_objectives:
+                self._objective += obj
+
+            self._make_weight_sum_constraint(market_neutral)
 
         self._solve_cvxpy_opt_problem()
         return dict(zip(self.tickers, self.weights))
@@ -268,23 +344,26 @@ class EfficientFrontier(base_optimizer.BaseConvexOptimizer):
         if not isinstance(target_volatility, float) or target_volatility < 0:
             raise ValueError("target_volatility should be a positive float")
 
-        self._objective = objective_functions.portfolio_return(
-            self._w, self.expected_returns
-        )
-        variance = objective_functions.portfolio_variance(self._w, self.cov_matrix)
+        if self.is_parameter_defined("target_variance"):
+            self._validate_market_neutral(market_neutral)
+            self.update_parameter_value("target_variance", target_volatility ** 2)
+        else:
+            self._objective = objective_functions.portfolio_return(
+                self._w, self._expected_returns_parameter
+            )
+            variance = self._make_portfolio_variance()
 
-        for obj in self._additional_objectives:
-            self._objective += obj
+            for obj in self._additional_objectives:
+                self._objective += obj
 
-        self._constraints.append(variance <= target_volatility ** 2)
+            target_variance = cp.Parameter(
+                name="target_variance", value=target_volatility ** 2, nonneg=True
+            )
+            self._constraints.append(variance <= target_variance)
 
-        # The equality constraint is either "weights sum to 1" (default), or
-        # "weights sum to 0" (market neutral).
-        if market_neutral:
-            self._market_neutral_bounds_check()
-            self._constraints.append(cp.sum(self._w) == 0)
-        else:
-            self._constraints.append(cp.sum(self._w) == 1)
+            # The equality constraint is either "weights sum to 1" (default), or
+            # "weights sum to 0" (market neutral).
+            self._make_weight_sum_constraint(market_neutral)
 
         self._solve_cvxpy_opt_problem()
         return dict(zip(self.tickers, self.weights))
@@ -310,28 +389,26 @@ class EfficientFrontier(base_optimizer.BaseConvexOptimizer):
                 "target_return must be lower than the largest expected return"
             )
 
-        self._objective = objective_functions.portfolio_variance(
-            self._w, self.cov_matrix
-        )
-        ret = objective_functions.portfolio_return(
-            self._w, self.expected_returns, negative=False
-        )
-
-        self.objective = cp.quad_form(self._w, self.cov_matrix)
-        ret = self.expected_returns.T @ self._w
+        if self.is_parameter_defined("target_return"):
+            self._validate_market_neutral(market_neutral)
+            self.update_parameter_value("target_return", target_return)
+        else:
+            self._objective = self._make_portfolio_variance()
+            ret = objective_functions.portfolio_return(
+                self._w, self._expected_returns_parameter, negative=False
+            )
 
-        for obj in self._additional_objectives:
-            self._objective += obj
+            for obj in self._additional_objectives:
+                self._objective += obj
 
-        self._constraints.append(ret >= target_return)
+            target_return_parameter = cp.Parameter(
+                name="target_return", value=target_return
+            )
+            self._constraints.append(ret >= target_return_parameter)
 
-        # The equality constraint is either "weights sum to 1" (default), or
-        # "weights sum to 0" (market neutral).
-        if market_neutral:
-            self._market_neutral_bounds_check()
-            self._constraints.append(cp.sum(self._w) == 0)
-        else:
-            self._constraints.append(cp.sum(self._w) == 1)
+            # The equality constraint is either "weights sum to 1" (default), or
+            # "weights sum to 0" (market neutral).
+            self._make_weight_sum_constraint(market_neutral)
 
         self._solve_cvxpy_opt_problem()
 
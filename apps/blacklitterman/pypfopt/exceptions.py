@@ -2,6 +2,7 @@
 The ``exceptions`` module houses custom exceptions. Currently implemented:
 
 - OptimizationError
+- InstantiationError
 """
 import traceback
 
@@ -22,3 +23,11 @@ class OptimizationError(Exception):
         super().__init__(*args, **kwargs)
 
         traceback.print_exc()
+
+
+class InstantiationError(Exception):
+    """
+    Errors related to the instantiation of pypfopt objects, e.g updating a parameter
+    that has not been defined, or re-solving a parameterised problem with options
+    that would change its structure.
+    """
@@ -10,8 +10,9 @@ The format of the data input is the same as that in :ref:`expected-returns`.
 - general risk matrix function, allowing you to run any risk model from one function.
 - sample covariance
 - semicovariance
-- exponentially weighted covariance
+- exponentially weighted covariance, with incremental updates
 - minimum covariance determinant
+- statistical (PCA) factor model, kept in low-rank-plus-diagonal form
 - shrunk covariance matrices:
 
     - manual shrinkage
@@ -25,8 +26,13 @@ The format of the data input is the same as that in :ref:`expected-returns`.
 import warnings
 import numpy as np
 import pandas as pd
+import scipy.linalg
+import scipy.sparse
 from .expected_returns import returns_from_prices
 
+# Smallest specific variance of factor_cov, as a fraction of the asset variance
+_SPECIFIC_VARIANCE_FLOOR = 1e-4
+
 
 def _is_positive_semidefinite(matrix):
     """
@@ -116,6 +122,7 @@ def risk_matrix(prices, method="sample_cov", **kwargs):
         - ``ledoit_wolf_single_factor``
         - ``ledoit_wolf_constant_correlation``
         - ``oracle_approximating``
+        - ``factor_cov`` (returns a :class:`FactorCovariance`, not a dataframe)
 
     :type method: str, optional
     :raises NotImplementedError: if the supplied method is not recognised
@@ -142,6 +149,8 @@ def risk_matrix(prices, method="sample_cov", **kwargs):
         )
     elif method == "oracle_approximating":
         return CovarianceShrinkage(prices, **kwargs).oracle_approximating()
+    elif method == "factor_cov":
+        return factor_cov(prices, **kwargs)
     else:
         raise NotImplementedError("Risk model {} not implemented".format(method))
 
@@ -210,24 +219,22 @@ def semicovariance(
     )
 
 
-def _pair_exp_cov(X, Y, span=180):
+def _exp_weights(n, span):
     """
-    Calculate the exponential covariance between two timeseries of returns.
-
-    :param X: first time series of returns
-    :type X: pd.Series
-    :param Y: second time series of returns
-    :type Y: pd.Series
-    :param span: the span of the exponential weighting function, defaults to 180
-    :type span: int, optional
-    :return: the exponential covariance between X and Y
-    :rtype: float
+    Calculate the weights that an adjusted exponentially weighted mean with the given
+    span puts on the last ``n`` observations, before normalisation.
+
+    :param n: number of observations
+    :type n: int
+    :param span: the span of the exponential weighting function
+    :type span: int
+    :return: weights, oldest observation first, the most recent weight is 1
+    :rtype: np.ndarray
     """
-    covariation = (X - X.mean()) * (Y - Y.mean())
-    # Exponentially weight the covariation and take the mean
     if span < 10:
         warnings.warn("it is recommended to use a higher span, e.g 30 days")
-    return covariation.ewm(span=span).mean()[-1]
+    decay = 1 - 2 / (span + 1)
+    return decay ** np.arange(n - 1, -1, -1, dtype=float)
 
 
 def exp_cov(prices, returns_data=False, span=180, frequency=252, **kwargs):
@@ -235,6 +242,10 @@ def exp_cov(prices, returns_data=False, span=180, frequency=252, **kwargs):
     Estimate the exponentially-weighted covariance matrix, which gives
     greater weight to more recent data.
 
+    The covariance of every pair is the exponentially weighted mean of the products of
+    the demeaned returns, over the dates on which both assets have a return. The whole
+    matrix is computed as one weighted matrix product.
+
     :param prices: adjusted closing prices of the asset, each row is a date
                    and each column is a ticker/id.
     :type prices: pd.DataFrame
@@ -256,20 +267,152 @@ def exp_cov(prices, returns_data=False, span=180, frequency=252, **kwargs):
         returns = prices
     else:
         returns = returns_from_prices(prices)
-    N = len(assets)
-
-    # Loop over matrix, filling entries with the pairwise exp cov
-    S = np.zeros((N, N))
-    for i in range(N):
-        for j in range(i, N):
-            S[i, j] = S[j, i] = _pair_exp_cov(
-                returns.iloc[:, i], returns.iloc[:, j], span
-            )
+
+    X = returns.to_numpy(dtype=float)
+    observed = ~np.isnan(X)
+    weights = _exp_weights(len(X), span)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        # Each asset is demeaned with its own mean, missing returns drop out of the sums
+        means = np.where(observed, X, 0).sum(axis=0) / observed.sum(axis=0)
+        demeaned = np.where(observed, X - means, 0)
+        S = (demeaned * weights[:, None]).T @ demeaned
+        if observed.all():
+            S /= weights.sum()
+        else:
+            # Pairwise normalisation by the weights of the dates both assets are observed
+            mask = observed.astype(float)
+            S /= (mask * weights[:, None]).T @ mask
     cov = pd.DataFrame(S * frequency, columns=assets, index=assets)
 
     return fix_nonpositive_semidefinite(cov, kwargs.get("fix_method", "spectral"))
 
 
+class ExponentialCovariance:
+    """
+    Maintain the exponentially-weighted covariance matrix of :func:`exp_cov` as new
+    data arrives. Folding in a new day costs O(N^2) instead of recomputing the
+    whole history.
+
+    The estimate is kept as decayed sums of the raw return products, so that
+    demeaning by the mean of the full history (as :func:`exp_cov` does) can be
+    applied when the matrix is read. The result equals :func:`exp_cov` on the
+    whole history, up to rounding.
+
+    Instance variables:
+
+    - ``assets`` - pd.Index (tickers)
+    - ``span`` - int
+    - ``frequency`` - int
+    - ``returns_data`` - bool
+    - ``n_observations`` - int (number of folded in dates)
+
+    Public methods:
+
+    - ``update()`` folds in new prices or returns
+    - ``cov_matrix()`` returns the annualised covariance matrix
+    """
+
+    def __init__(self, prices, returns_data=False, span=180, frequency=252):
+        """
+        :param prices: adjusted closing prices of the asset, each row is a date
+                       and each column is a ticker/id.
+        :type prices: pd.DataFrame
+        :param returns_data: if true, the first argument (and the data passed to
+                             ``update()``) is returns instead of prices.
+        :type returns_data: bool, defaults to False.
+        :param span: the span of the exponential weighting function, defaults to 180
+        :type span: int, optional
+        :param frequency: number of time periods in a year, defaults to 252
+        :type frequency: int, optional
+        """
+        if not isinstance(prices, pd.DataFrame):
+            warnings.warn("data is not in a dataframe", RuntimeWarning)
+            prices = pd.DataFrame(prices)
+        self.assets = prices.columns
+        self.span = span
+        self.frequency = frequency
+        self.returns_data = returns_data
+        self.n_observations = 0
+
+        N = len(self.assets)
+        self._last_prices = None
+        self._sums = np.zeros(N)  # unweighted sums and counts give the full history mean
+        self._counts = np.zeros(N)
+        self._products = np.zeros((N, N))  # decayed sums of x_i * x_j
+        self._cross_sums = np.zeros((N, N))  # decayed sums of x_i over dates both are observed
+        self._weights = np.zeros((N, N))  # decayed sums of weights of dates both are observed
+        self.update(prices)
+
+    def _to_returns(self, prices):
+        if self.returns_data:
+            return prices
+        if self._last_prices is not None:
+            # Start from the last known prices so the first new return is not lost
+            prices = pd.concat([self._last_prices.to_frame().T, prices])
+            returns = prices.pct_change().iloc[1:].dropna(how="all")
+        else:
+            returns = returns_from_prices(prices)
+        self._last_prices = prices.ffill().iloc[-1]
+        return returns
+
+    def update(self, prices):
+        """
+        Fold in the data of new dates, which must come after the dates already seen.
+
+        :param prices: new adjusted closing prices (or returns if ``returns_data``)
+                       with the same columns as the initial data.
+        :type prices: pd.DataFrame
+        :raises ValueError: if the columns differ from the initial data
+        :return: self
+        :rtype: ExponentialCovariance
+        """
+        if not isinstance(prices, pd.DataFrame):
+            prices = pd.DataFrame(prices, columns=self.assets)
+        if not prices.columns.equals(self.assets):
+            raise ValueError("new data must have the same columns as the initial data")
+        X = self._to_returns(prices).to_numpy(dtype=float)
+        if len(X) == 0:
+            return self
+
+        observed = ~np.isnan(X)
+        mask = observed.astype(float)
+        X = np.where(observed, X, 0)
+        weights = _exp_weights(len(X), self.span)
+        decay = weights[0] * (1 - 2 / (self.span + 1))
+        weighted = X * weights[:, None]
+
+        self._sums += X.sum(axis=0)
+        self._counts += observed.sum(axis=0)
+        self._products = decay * self._products + weighted.T @ X
+        self._cross_sums = decay * self._cross_sums + weighted.T @ mask
+        self._weights = decay * self._weights + (mask * weights[:, None]).T @ mask
+        self.n_observations += len(X)
+        return self
+
+    def cov_matrix(self, fix_method="spectral"):
+        """
+        Calculate the annualised exponentially-weighted covariance matrix of all
+        the data seen so far.
+
+        :param fix_method: method for fixing a non-positive semidefinite matrix,
+                           defaults to "spectral"
+        :type fix_method: str, optional
+        :return: annualised estimate of exponential covariance matrix
+        :rtype: pd.DataFrame
+        """
+        with np.errstate(divide="ignore", invalid="ignore"):
+            means = self._sums / self._counts
+            # sum w (x_i - m_i)(x_j - m_j) expanded over the stored sums
+            S = (
+                self._products
+                - self._cross_sums * means[None, :]
+                - self._cross_sums.T * means[:, None]
+                + self._weights * np.outer(means, means)
+            ) / self._weights
+        cov = pd.DataFrame(S * self.frequency, columns=self.assets, index=self.assets)
+        return fix_nonpositive_semidefinite(cov, fix_method)
+
+
 def min_cov_determinant(
     prices, returns_data=False, frequency=252, random_state=None, **kwargs
 ):
@@ -312,6 +455,231 @@ def min_cov_determinant(
     return fix_nonpositive_semidefinite(cov, kwargs.get("fix_method", "spectral"))
 
 
+class FactorCovariance:
+    r"""
+    Covariance matrix of a factor risk model kept in factored form, i.e
+
+    .. math::
+
+        \Sigma = B B^T + D
+
+    where :math:`B` is the NxK matrix of factor loadings (scaled by the factor
+    volatilities) and :math:`D` the diagonal matrix of specific variances. Storage and
+    products with the matrix are O(NK), so large universes never need the dense NxN
+    matrix. ``EfficientFrontier``, the objective functions and ``BlackLittermanModel``
+    accept it in place of a dense covariance matrix and compute the portfolio variance
+    as :math:`\|B^T w\|^2 + \sum_i d_i w_i^2`.
+
+    Instance variables:
+
+    - ``loadings`` - np.ndarray (NxK)
+    - ``specific_variances`` - np.ndarray (N)
+    - ``tickers`` - str list
+    - ``shape`` - int tuple (N, N)
+
+    Public methods:
+
+    - ``dot()`` multiplies the covariance matrix with a vector or matrix, also ``@``
+    - ``diagonal()`` returns the variances of the assets
+    - ``portfolio_variance()`` returns :math:`w^T \Sigma w`
+    - ``solve()`` solves :math:`\Sigma x = b` with the Woodbury identity
+    - ``to_dense()`` materialises the NxN matrix, for small universes and plots
+    """
+
+    # numpy defers to __rmatmul__ instead of treating the model as a scalar
+    __array_ufunc__ = None
+
+    def __init__(self, loadings, specific_variances, tickers=None):
+        """
+        :param loadings: NxK factor loadings, scaled by the factor volatilities
+        :type loadings: np.ndarray or pd.DataFrame
+        :param specific_variances: N specific (idiosyncratic) variances
+        :type specific_variances: np.ndarray or pd.Series
+        :param tickers: asset labels, defaults to the index of ``loadings`` if it is
+                        a dataframe, else to integers
+        :type tickers: list, optional
+        :raises ValueError: if the dimensions do not match or a variance is negative
+        """
+        if tickers is None and isinstance(loadings, pd.DataFrame):
+            tickers = list(loadings.index)
+        self.loadings = np.asarray(loadings, dtype=float)
+        self.specific_variances = np.asarray(specific_variances, dtype=float).ravel()
+        N = len(self.specific_variances)
+        if self.loadings.ndim != 2 or self.loadings.shape[0] != N:
+            raise ValueError("loadings must have dimensions NxK")
+        if np.any(self.specific_variances < 0):
+            raise ValueError("specific variances must be non-negative")
+        self.tickers = list(range(N)) if tickers is None else list(tickers)
+        if len(self.tickers) != N:
+            raise ValueError("there must be one ticker per asset")
+        self.shape = (N, N)
+
+    def __len__(self):
+        return self.shape[0]
+
+    def __matmul__(self, other):
+        if scipy.sparse.issparse(other):
+            other = other.toarray()
+        other = np.asarray(other, dtype=float)
+        specific_variances = self.specific_variances
+        if other.ndim > 1:
+            specific_variances = specific_variances[:, None]
+        return self.loadings @ (self.loadings.T @ other) + specific_variances * other
+
+    def __rmatmul__(self, other):
+        # Sigma is symmetric, so X Sigma = (Sigma X^T)^T
+        if scipy.sparse.issparse(other):
+            other = other.toarray()
+        return (self @ np.asarray(other, dtype=float).T).T
+
+    def __mul__(self, scalar):
+        if not np.isscalar(scalar) or scalar < 0:
+            return NotImplemented
+        return FactorCovariance(
+            self.loadings * np.sqrt(scalar),
+            self.specific_variances * scalar,
+            self.tickers,
+        )
+
+    __rmul__ = __mul__
+
+    def dot(self, other):
+        """
+        Multiply the covariance matrix with a vector or matrix, as ``pd.DataFrame.dot``.
+
+        :param other: N vector or NxM matrix
+        :type other: pd.Series, pd.DataFrame or np.ndarray
+        :raises ValueError: if the labels of ``other`` are not the tickers
+        :return: the product, labelled by the tickers if ``other`` is labelled
+        :rtype: pd.Series, pd.DataFrame or np.ndarray
+        """
+        if isinstance(other, (pd.Series, pd.DataFrame)):
+            if set(other.index) != set(self.tickers):
+                raise ValueError("matrices are not aligned")
+            product = self @ other.loc[self.tickers].to_numpy(dtype=float)
+            if isinstance(other, pd.Series):
+                return pd.Series(product, index=self.tickers, name=other.name)
+            return pd.DataFrame(product, index=self.tickers, columns=other.columns)
+        return self @ other
+
+    def diagonal(self):
+        """
+        :return: variance of each asset
+        :rtype: np.ndarray
+        """
+        common_variances = np.einsum("nk,nk->n", self.loadings, self.loadings)
+        return common_variances + self.specific_variances
+
+    def portfolio_variance(self, w):
+        r"""
+        :param w: asset weights in the portfolio
+        :type w: np.ndarray
+        :return: portfolio variance :math:`\|B^T w\|^2 + \sum_i d_i w_i^2`
+        :rtype: float
+        """
+        w = np.asarray(w, dtype=float)
+        common_variance = np.sum((self.loadings.T @ w) ** 2)
+        return float(common_variance + self.specific_variances @ w ** 2)
+
+    def solve(self, b):
+        r"""
+        Solve :math:`\Sigma x = b` with the Woodbury identity, which only factorises a
+        KxK matrix:
+
+        .. math::
+
+            \Sigma^{-1} = D^{-1} - D^{-1} B (I + B^T D^{-1} B)^{-1} B^T D^{-1}
+
+        :param b: N vector or NxM matrix
+        :type b: np.ndarray
+        :raises np.linalg.LinAlgError: if a specific variance is zero
+        :return: solution of the same shape as ``b``
+        :rtype: np.ndarray
+        """
+        if np.any(self.specific_variances <= 0):
+            raise np.linalg.LinAlgError(
+                "specific variances must be positive to solve with the factor model"
+            )
+        b = np.asarray(b, dtype=float)
+        d_inv = 1 / self.specific_variances
+        if b.ndim > 1:
+            d_inv = d_inv[:, None]
+        scaled_loadings = self.loadings / self.specific_variances[:, None]
+        capacitance = np.eye(self.loadings.shape[1]) + self.loadings.T @ scaled_loadings
+        factor = scipy.linalg.cho_factor(capacitance)
+        return d_inv * b - scaled_loadings @ scipy.linalg.cho_solve(
+            factor, scaled_loadings.T @ b
+        )
+
+    def to_dense(self):
+        """
+        Materialise the NxN covariance matrix. Only use this for small universes.
+
+        :return: covariance matrix
+        :rtype: pd.DataFrame
+        """
+        dense = self.loadings @ self.loadings.T
+        dense[np.diag_indices_from(dense)] += self.specific_variances
+        return pd.DataFrame(dense, index=self.tickers, columns=self.tickers)
+
+
+def factor_cov(prices, returns_data=False, n_factors=10, frequency=252, **kwargs):
+    """
+    Estimate a statistical factor risk model: the first ``n_factors`` principal
+    components of the returns are the factors and the rest of each asset's sample
+    variance is its specific variance. The result is kept in factored form, see
+    :class:`FactorCovariance`, and the principal components come from a thin SVD of
+    the TxN returns, so the dense NxN matrix is never built.
+
+    Missing returns are replaced by the mean of the asset. Specific variances are
+    floored at a small fraction of the asset variance, which keeps the matrix
+    positive definite.
+
+    :param prices: adjusted closing prices of the asset, each row is a date
+                   and each column is a ticker/id.
+    :type prices: pd.DataFrame
+    :param returns_data: if true, the first argument is returns instead of prices.
+    :type returns_data: bool, defaults to False.
+    :param n_factors: number of statistical factors, defaults to 10. Capped at the
+                      number of assets and of dates minus one.
+    :type n_factors: int, optional
+    :param frequency: number of time periods in a year, defaults to 252 (the number
+                      of trading days in a year)
+    :type frequency: int, optional
+    :raises ValueError: if ``n_factors`` is not positive or there are fewer than two
+                        dates of returns
+    :return: annualised factor covariance model
+    :rtype: FactorCovariance
+    """
+    if not isinstance(prices, pd.DataFrame):
+        warnings.warn("data is not in a dataframe", RuntimeWarning)
+        prices = pd.DataFrame(prices)
+    if n_factors < 1:
+        raise ValueError("n_factors should be a positive integer")
+    if returns_data:
+        returns = prices
+    else:
+        returns = returns_from_prices(prices)
+    X = returns.to_numpy(dtype=float)
+    T, N = X.shape
+    if T < 2:
+        raise ValueError("at least two dates of returns are needed")
+
+    X = np.nan_to_num(X - np.nanmean(X, axis=0))
+    _, singular_values, components = np.linalg.svd(X, full_matrices=False)
+    n_factors = min(n_factors, N, T - 1)
+    # Sample covariance = V S^2 V^T / (T - 1), keep the first components
+    loadings = components[:n_factors].T * (singular_values[:n_factors] / np.sqrt(T - 1))
+    variances = returns.var().to_numpy(dtype=float)
+    common_variances = np.einsum("nk,nk->n", loadings, loadings)
+    specific_variances = np.maximum(
+        variances - common_variances, _SPECIFIC_VARIANCE_FLOOR * variances
+    )
+    return FactorCovariance(
+        loadings * np.sqrt(frequency), specific_variances * frequency, returns.columns
+    )
+
+
 def cov_to_corr(cov_matrix):
     """
     Convert a covariance matrix to a correlation matrix.
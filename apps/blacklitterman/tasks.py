@@ -0,0 +1,22 @@
+from ..jobs.tasks import task
+from .blackl import get_black_litterman, get_chart1, get_chart2, get_chart3, get_chart4, get_chart5, get_data_version
+
+
+def validate_model(params):
+    """The model of the page has no params"""
+    if params:
+        raise ValueError('the model takes no params')
+    return {}
+
+
+@task('blacklitterman.model', version=get_data_version, validate=validate_model)
+def get_model():
+    result = get_black_litterman()
+    return {
+        'views_uncertain': get_chart1(result),
+        'risk_rets': get_chart2(result),
+        'cov_mat': get_chart3(result),
+        'views': get_chart4(result),
+        'rets': get_chart5(result),
+        'weights': {ticker: float(weight) for ticker, weight in result.weights.items()},
+    }
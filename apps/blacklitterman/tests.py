@@ -1,3 +1,293 @@
-from django.test import TestCase
+from unittest import mock
 
-# Create your tests here.
+import cvxpy as cp
+import numpy as np
+import pandas as pd
+import scipy.sparse
+from django.test import SimpleTestCase
+
+from .pypfopt import (
+    CLA, BlackLittermanModel, EfficientFrontier, black_litterman_batch, expected_returns, objective_functions,
+    risk_models,
+)
+
+
+class ReusedProblemTests(SimpleTestCase):
+    """Re-solving the kept cvxpy problem with new parameter values gives the weights of a new problem"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        prices = pd.read_csv('./apps/data/stocks.csv', index_col=0, parse_dates=True).dropna(axis=1)
+        cls.mu = expected_returns.mean_historical_return(prices)
+        cls.S = risk_models.sample_cov(prices)
+
+    def assert_same_as_new_problem(self, method, arguments):
+        ef = EfficientFrontier(self.mu, self.S)
+        for argument in arguments:
+            getattr(ef, method)(argument)
+            new = EfficientFrontier(self.mu, self.S)
+            getattr(new, method)(argument)
+            np.testing.assert_allclose(ef.weights, new.weights, rtol=0, atol=1e-9, err_msg=f'{method}({argument})')
+
+    def test_efficient_return(self):
+        self.assert_same_as_new_problem('efficient_return', [0.15, 0.2, 0.25, 0.3, 0.35, 0.22])
+        ef = EfficientFrontier(self.mu, self.S)
+        for target_return in [0.15, 0.3]:
+            ef.efficient_return(target_return)
+            self.assertGreaterEqual(ef.portfolio_performance()[0], target_return - 1e-12)
+
+    def test_efficient_risk(self):
+        self.assert_same_as_new_problem('efficient_risk', [0.25, 0.3, 0.35, 0.28])
+
+    def test_max_quadratic_utility(self):
+        self.assert_same_as_new_problem('max_quadratic_utility', [1, 2, 5, 0.5])
+
+    def test_max_sharpe(self):
+        self.assert_same_as_new_problem('max_sharpe', [0.02, 0.0, 0.05])
+
+
+def get_returns(tickers, gaps=0.):
+    """Daily returns of stocks.csv, tickers listed later start with missing returns, gaps adds random ones"""
+    prices = pd.read_csv('./apps/data/stocks.csv', index_col=0, parse_dates=True)[tickers]
+    returns = prices.pct_change().iloc[1:]
+    return returns.mask(np.random.default_rng(0).random(returns.shape) < gaps)
+
+
+class ExponentialCovarianceTests(SimpleTestCase):
+    tickers = ['AAPL', 'ABBV', 'BRK', 'FB', 'KO', 'MSFT', 'PYPL', 'TSLA']
+
+    def get_pairwise_exp_cov(self, returns, span):
+        # the previous implementation, one pandas ewm per pair of assets
+        matrix = np.zeros((returns.shape[1], returns.shape[1]))
+        for i in range(returns.shape[1]):
+            for j in range(i, returns.shape[1]):
+                x, y = returns.iloc[:, i], returns.iloc[:, j]
+                matrix[i, j] = matrix[j, i] = ((x - x.mean()) * (y - y.mean())).ewm(span=span).mean().iloc[-1]
+        return pd.DataFrame(matrix * 252, index=returns.columns, columns=returns.columns)
+
+    def test_exp_cov(self):
+        for gaps in (0., 0.05):
+            returns = get_returns(self.tickers, gaps)
+            expected = risk_models.fix_nonpositive_semidefinite(self.get_pairwise_exp_cov(returns, 60))
+            result = risk_models.exp_cov(returns, returns_data=True, span=60)
+            pd.testing.assert_frame_equal(result, expected, check_exact=False, rtol=1e-10, atol=1e-14)
+
+    def test_chunked_updates(self):
+        returns = get_returns(self.tickers, 0.05)
+        prices = (1 + returns.fillna(0)).cumprod().mask(returns.isna())
+        for data, returns_data in ((returns, True), (prices, False)):
+            expected = risk_models.exp_cov(data, returns_data=returns_data, span=60)
+            estimator = risk_models.ExponentialCovariance(data.iloc[:500], returns_data=returns_data, span=60)
+            for start in range(500, len(data), 333):
+                estimator.update(data.iloc[start:start + 333])
+            pd.testing.assert_frame_equal(estimator.cov_matrix(), expected, check_exact=False, rtol=1e-10,
+                                          atol=1e-14)
+            self.assertEqual(estimator.n_observations, len(returns) - (0 if returns_data else 1))
+
+
+class CLATests(SimpleTestCase):
+    """The turning points, and the portfolios built from them, are the solutions of the same problems with cvxpy"""
+    weight_bounds = [(0, 1), (0, 0.1), (-1, 1)]
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        prices = pd.read_csv('./apps/data/stocks.csv', index_col=0, parse_dates=True)
+        cls.mu = expected_returns.mean_historical_return(prices)
+        cls.S = risk_models.sample_cov(prices)
+
+    def solve(self, weight_bounds, objective, constraints=lambda weights: []):
+        weights = cp.Variable(len(self.mu))
+        problem = cp.Problem(cp.Minimize(objective(weights)), [cp.sum(weights) == 1, weights >= weight_bounds[0],
+                                                               weights <= weight_bounds[1], *constraints(weights)])
+        problem.solve(solver=cp.OSQP, eps_abs=1e-12, eps_rel=1e-12, max_iter=200000, polish=True)
+        return weights.value
+
+    def test_turning_points(self):
+        for weight_bounds in self.weight_bounds:
+            cla = CLA(self.mu, self.S, weight_bounds)
+            cla._solve()
+            # the turning point of lambda minimizes w.S.w / 2 - lambda * mu.w
+            for w, l in zip(cla.w[1:], cla.ls[1:]):
+                expected = self.solve(weight_bounds,
+                                      lambda x: 0.5 * cp.quad_form(x, self.S.to_numpy()) - l * self.mu.to_numpy() @ x)
+                np.testing.assert_allclose(w[:, 0], expected, rtol=0, atol=1e-5, err_msg=f'{weight_bounds} lambda {l}')
+            # no turning point is repeated
+            self.assertTrue(all(np.abs(w1 - w0).max() > 1e-9 for w0, w1 in zip(cla.w, cla.w[1:])))
+            self.assertEqual(len(set(cla.ls[1:])), len(cla.ls) - 1)
+
+    def test_min_volatility(self):
+        for weight_bounds in self.weight_bounds:
+            weights = pd.Series(CLA(self.mu, self.S, weight_bounds).min_volatility())
+            expected = self.solve(weight_bounds, lambda x: cp.quad_form(x, self.S.to_numpy()))
+            np.testing.assert_allclose(weights, expected, rtol=0, atol=1e-6, err_msg=str(weight_bounds))
+
+    def test_max_sharpe(self):
+        for weight_bounds in self.weight_bounds:
+            weights = pd.Series(CLA(self.mu, self.S, weight_bounds).max_sharpe())
+            # the maximum Sharpe ratio without a risk-free rate, as a minimum variance with y = w / (mu.w)
+            y, k = cp.Variable(len(self.mu)), cp.Variable()
+            problem = cp.Problem(cp.Minimize(cp.quad_form(y, self.S.to_numpy())),
+                                 [self.mu.to_numpy() @ y == 1, cp.sum(y) == k, k >= 0,
+                                  y >= weight_bounds[0] * k, y <= weight_bounds[1] * k])
+            problem.solve(solver=cp.OSQP, eps_abs=1e-12, eps_rel=1e-12, max_iter=200000, polish=True)
+            np.testing.assert_allclose(weights, y.value / k.value, rtol=0, atol=1e-5, err_msg=str(weight_bounds))
+            sharpe_ratio = weights @ self.mu / np.sqrt(weights @ self.S @ weights)
+            self.assertAlmostEqual(sharpe_ratio, 1 / np.sqrt(problem.value), places=8)
+
+    def test_efficient_frontier(self):
+        for weight_bounds in self.weight_bounds:
+            mu, sigma, weights = CLA(self.mu, self.S, weight_bounds).efficient_frontier(points=300)
+            self.assertGreater(len(mu), 100)
+            # inside the frontier, a return at its ends is feasible only up to rounding
+            for target_return, volatility in list(zip(mu, sigma))[10::20]:
+                expected = self.solve(weight_bounds, lambda x: cp.quad_form(x, self.S.to_numpy()),
+                                      lambda x: [self.mu.to_numpy() @ x == target_return])
+                self.assertAlmostEqual(volatility, np.sqrt(expected @ self.S @ expected), places=7,
+                                       msg=f'{weight_bounds} return {target_return}')
+
+
+class BlackLittermanBatchTests(SimpleTestCase):
+    """Every scenario of a batch has the posterior of its own BlackLittermanModel"""
+    tickers = ['AAPL', 'BRK', 'JNJ', 'KO', 'MSFT', 'PG', 'XOM']
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        prices = pd.read_csv('./apps/data/stocks.csv', index_col=0, parse_dates=True)[cls.tickers]
+        cls.S = risk_models.sample_cov(prices)
+        cls.pi = expected_returns.mean_historical_return(prices)
+        # three scenarios of up to three views, the second and third are padded with zero rows
+        cls.P = np.zeros((3, 3, len(cls.tickers)))
+        cls.P[0, 0, 0] = cls.P[0, 1, 4] = cls.P[0, 2, 2] = cls.P[1, 1, 3] = cls.P[2, 0, 6] = 1
+        cls.P[0, 1, 3] = cls.P[1, 0, 5] = -1
+        cls.P[1, 0, 1] = 1
+        cls.Q = np.array([[0.2, 0.05, 0.1], [0.03, 0.08, 0], [-0.05, 0, 0]])
+        cls.view_confidences = np.array([[0.5, 0.2, 0.9], [0., 1., 0.5], [0.7, 0.5, 0.5]])
+        cls.views = [3, 2, 1]
+
+    def assert_same_as_models(self, cov_matrix, **kwargs):
+        posterior_rets, posterior_cov, weights = black_litterman_batch(
+            cov_matrix, self.pi, self.P, self.Q, risk_aversion=2, compute_weights=True, **kwargs
+        )
+        for s, k in enumerate(self.views):
+            options = {key: value[s, :k] for key, value in kwargs.items() if isinstance(value, np.ndarray)}
+            if 'omega' in options:
+                options['omega'] = options['omega'][:, :k]
+            bl = BlackLittermanModel(cov_matrix, pi=self.pi, P=self.P[s, :k], Q=self.Q[s, :k], risk_aversion=2,
+                                     **{**kwargs, **options})
+            message = f'scenario {s} {kwargs}'
+            np.testing.assert_allclose(posterior_rets[s], bl.bl_returns(), rtol=1e-10, err_msg=message)
+            np.testing.assert_allclose(posterior_cov[s], bl.bl_cov(), rtol=1e-10, err_msg=message)
+            np.testing.assert_allclose(weights[s], list(bl.bl_weights().values()), rtol=1e-8, err_msg=message)
+
+    def test_omega(self):
+        omega = np.einsum('sk,kl->skl', self.view_confidences / 10, np.eye(3))
+        for kwargs in ({}, {'omega': 'default'}, {'omega': omega},
+                       {'omega': 'idzorek', 'view_confidences': self.view_confidences}):
+            self.assert_same_as_models(self.S, **kwargs)
+
+    def test_factor_covariance(self):
+        prices = pd.read_csv('./apps/data/stocks.csv', index_col=0, parse_dates=True)[self.tickers]
+        cov_matrix = risk_models.factor_cov(prices, n_factors=3)
+        self.assert_same_as_models(cov_matrix)
+        self.assert_same_as_models(cov_matrix, omega='idzorek', view_confidences=self.view_confidences)
+        # without the covariances the factor model is not materialised
+        with mock.patch.object(risk_models.FactorCovariance, 'to_dense') as to_dense:
+            black_litterman_batch(cov_matrix, self.pi, self.P, self.Q, compute_cov=False, compute_weights=True)
+        to_dense.assert_not_called()
+
+
+class ViewVarianceTests(SimpleTestCase):
+    """Omega from the batched view variances, with dense or sparse picking matrices, as the previous loop"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        prices = pd.read_csv('./apps/data/stocks.csv', index_col=0, parse_dates=True)[BlackLittermanBatchTests.tickers]
+        cls.S = risk_models.sample_cov(prices)
+        cls.F = risk_models.factor_cov(prices, n_factors=3)
+        cls.pi = expected_returns.mean_historical_return(prices)
+        cls.P = np.array([[1, 0, 0, 0, 0, 0, 0], [0, 0, 0, 1, -1, 0, 0], [0.5, 0, 0.5, 0, 0, -1, 0],
+                          [0, 0, 0, 0, 0, 0, 1], [0, 1, 0, 0, 0, 0, -1]], dtype=float)
+        cls.Q = np.array([0.2, 0.05, 0.01, -0.03, 0.1])
+        cls.view_confidences = np.array([0.5, 0., 1., 0.25, 0.8])
+
+    def get_idzorek_omega(self, cov_matrix, tau=0.05):
+        # the previous implementation, one quadratic form per view
+        view_omegas = []
+        for P_view, conf in zip(self.P, self.view_confidences):
+            if conf == 0:
+                view_omegas.append(1e6)
+                continue
+            P_view = P_view.reshape(1, -1)
+            view_omegas.append((tau * (1 - conf) / conf * P_view @ cov_matrix @ P_view.T).item())
+        return np.diag(view_omegas)
+
+    def test_omega(self):
+        for cov_matrix in (self.S, self.F):
+            dense = cov_matrix.to_dense() if isinstance(cov_matrix, risk_models.FactorCovariance) else cov_matrix
+            dense = dense.to_numpy()
+            for P in (self.P, scipy.sparse.csr_matrix(self.P), scipy.sparse.coo_matrix(self.P)):
+                message = f'{type(cov_matrix).__name__} {type(P).__name__}'
+                np.testing.assert_allclose(BlackLittermanModel.default_omega(cov_matrix, P, 0.05),
+                                           np.diag(np.diag(0.05 * self.P @ dense @ self.P.T)), rtol=1e-12,
+                                           err_msg=message)
+                np.testing.assert_allclose(
+                    BlackLittermanModel.idzorek_method(self.view_confidences, cov_matrix, self.pi, self.Q, P, 0.05),
+                    self.get_idzorek_omega(dense), rtol=1e-12, err_msg=message,
+                )
+
+    def test_sparse_picking_matrix(self):
+        for cov_matrix in (self.S, self.F):
+            for kwargs in ({}, {'omega': 'idzorek', 'view_confidences': self.view_confidences}):
+                expected = BlackLittermanModel(cov_matrix, pi=self.pi, P=self.P, Q=self.Q, **kwargs)
+                bl = BlackLittermanModel(cov_matrix, pi=self.pi, P=scipy.sparse.csr_matrix(self.P), Q=self.Q, **kwargs)
+                message = f'{type(cov_matrix).__name__} {kwargs}'
+                np.testing.assert_allclose(bl.omega, expected.omega, rtol=1e-12, err_msg=message)
+                pd.testing.assert_series_equal(bl.bl_returns(), expected.bl_returns(), rtol=1e-12)
+                pd.testing.assert_frame_equal(bl.bl_cov(), expected.bl_cov(), rtol=1e-12)
+                np.testing.assert_allclose(list(bl.bl_weights().values()), list(expected.bl_weights().values()),
+                                           rtol=1e-10, err_msg=message)
+
+
+class FactorCovarianceTests(SimpleTestCase):
+    """The factored products and solves, and the optimizers fed a factor model, as with its dense matrix"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        prices = pd.read_csv('./apps/data/stocks.csv', index_col=0, parse_dates=True)
+        cls.mu = expected_returns.mean_historical_return(prices)
+        cls.F = risk_models.factor_cov(prices, n_factors=5)
+        cls.S = cls.F.to_dense()
+
+    def test_products(self):
+        rng = np.random.default_rng(0)
+        S = self.S.to_numpy()
+        b, B = rng.normal(size=len(self.mu)), rng.normal(size=(len(self.mu), 3))
+        w = rng.dirichlet(np.ones(len(self.mu)))
+        np.testing.assert_allclose(self.F.solve(b), np.linalg.solve(S, b), rtol=1e-8)
+        np.testing.assert_allclose(self.F.solve(B), np.linalg.solve(S, B), rtol=1e-8)
+        np.testing.assert_allclose(self.F @ B, S @ B, rtol=1e-12)
+        np.testing.assert_allclose(b @ self.F, b @ S, rtol=1e-12)
+        np.testing.assert_allclose(self.F.diagonal(), np.diag(S), rtol=1e-12)
+        self.assertAlmostEqual(self.F.portfolio_variance(w), w @ S @ w, places=14)
+        self.assertAlmostEqual(objective_functions.portfolio_variance(w, self.F), w @ S @ w, places=14)
+        weights = cp.Variable(len(w))
+        weights.value = w
+        self.assertAlmostEqual(objective_functions._quad_form(weights, self.F).value, w @ S @ w, places=14)
+
+    def test_efficient_frontier(self):
+        for method, argument in [('min_volatility', None), ('max_sharpe', 0.02), ('efficient_return', 0.3),
+                                 ('efficient_risk', 0.25), ('max_quadratic_utility', 2)]:
+            weights = []
+            for cov_matrix in (self.F, self.S):
+                ef = EfficientFrontier(self.mu, cov_matrix)
+                # the factor model is used in factored form
+                with mock.patch.object(risk_models.FactorCovariance, 'to_dense') as to_dense:
+                    getattr(ef, method)(*([] if argument is None else [argument]))
+                to_dense.assert_not_called()
+                weights.append(pd.Series(ef.weights, index=self.mu.index))
+            pd.testing.assert_series_equal(weights[0], weights[1], check_exact=False, rtol=0, atol=1e-5)
@@ -1,5 +1,6 @@
 from django.views.generic import TemplateView
 from .blackl import *
+from ..jobs.models import Job
 
 from ..utils import reader, stats, mvo, annualize, risk
 import numpy as np, numpy.random
@@ -21,10 +22,9 @@ class BlackHomeView(TemplateView):
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        context['views_uncertain'] = get_chart1()
-        context['risk_rets'] = get_chart2()
-        context['cov_mat'] = get_chart3()
-        context['views'] = get_chart4()
-        context['rets'] = get_chart5()
-        context['weights'] = get_weights()
+        # the model is computed by a worker (python manage.py run_jobs), the page polls the job until it is done
+        job = Job.objects.submit('blacklitterman.model')
+        context['job'] = job
+        if job.status == Job.Status.DONE:
+            context.update(job.result)
         return context
@@ -0,0 +1,10 @@
+from django.contrib import admin
+
+from .models import Job
+
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'kind', 'status', 'worker', 'created_at', 'started_at', 'finished_at')
+    list_filter = ('status', 'kind')
+    readonly_fields = ('key', 'result', 'error')
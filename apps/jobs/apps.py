@@ -0,0 +1,8 @@
+from django.apps import AppConfig
+
+
+class JobsConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    # imported as apps.jobs by the views, so the models are registered under one module path
+    name = 'apps.jobs'
+    label = 'jobs'
@@ -0,0 +1,27 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from apps.jobs.models import Job
+from apps.jobs.worker import run_pool
+
+
+class Command(BaseCommand):
+    help = 'Run queued jobs in a pool of local worker processes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=settings.JOBS_WORKERS, help='Number of worker processes')
+        parser.add_argument('--poll-interval', type=float, default=settings.JOBS_POLL_INTERVAL,
+                            help='Seconds to wait before looking for new jobs when the queue is empty')
+        parser.add_argument('--burst', action='store_true', help='Exit when the queue is empty')
+        parser.add_argument('--stale-after', type=float, default=settings.JOBS_STALE_AFTER,
+                            help='Queue again the jobs that have been running for longer (seconds)')
+        parser.add_argument('--keep-finished', type=float, default=settings.JOBS_KEEP_FINISHED,
+                            help='Delete the jobs that finished earlier (seconds)')
+
+    def handle(self, *args, **options):
+        purged = Job.objects.purge(options['keep_finished'])
+        if purged:
+            self.stdout.write(f'Deleted {purged} finished jobs')
+        self.stdout.write(f"Starting {options['workers']} workers")
+        run_pool(options['workers'], options['poll_interval'], options['burst'], options['stale_after'])
+        self.stdout.write(self.style.SUCCESS('Workers stopped'))
@@ -0,0 +1,216 @@
+import hashlib
+import json
+import logging
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import models
+from django.db.models import Q
+from django.utils import timezone
+
+from .tasks import get_task, get_version
+
+logger = logging.getLogger(__name__)
+
+
+def get_job_key(kind, params, version=None):
+    """Fingerprint of a job, jobs with the same key compute the same result
+
+  Parameters
+  ----------
+  kind: str
+    Task name
+  params: dict
+    Keyword arguments of the task
+  version: object, optional, default=None
+    Version of the data the task reads, see tasks.get_version(), a new version makes a new job
+
+  Returns
+  -------
+  str
+    Hex digest
+  """
+    payload = json.dumps([kind, params, version], sort_keys=True, cls=DjangoJSONEncoder)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+class JobQuerySet(models.QuerySet):
+
+    def submit(self, kind, params=None):
+        """Queue a job unless the same job is already queued, running or done
+
+    Parameters
+    ----------
+    kind: str
+      Task name
+    params: dict, optional, default=None
+      Keyword arguments of the task, must be JSON serializable
+
+    Returns
+    -------
+    Job
+      New or existing job, already finished when settings.JOBS_EAGER is set
+
+    Raises
+    ------
+    UnknownTaskError
+      If no task is registered under kind
+
+    Notes
+    -----
+      The job key is made of the task, the params and the version of the data read now. A task may write
+      the data it reads, e.g. fetch missing quotes into the store, so a finished job is also found under
+      the version its run left behind and a page reloaded after the job is done shows its result.
+    """
+        get_task(kind)
+        params = params or {}
+        key = get_job_key(kind, params, get_version(kind))
+        # a failed job is submitted again, so a page retries a failed computation on reload
+        job = (
+            self.filter(Q(key=key) | Q(result_key=key))
+            .exclude(status=Job.Status.FAILED).order_by('-created_at').first()
+        )
+        if job is None:
+            # results are kept for JOBS_KEEP_FINISHED, expired ones are deleted whenever a job is created
+            self.purge(getattr(settings, 'JOBS_KEEP_FINISHED', 7 * 24 * 3600))
+            job = self.create(kind=kind, params=params, key=key)
+            if getattr(settings, 'JOBS_EAGER', False):
+                job.run()
+        return job
+
+    def claim(self, worker):
+        """Take the oldest queued job for a worker
+
+    Parameters
+    ----------
+    worker: str
+      Name of the worker
+
+    Returns
+    -------
+    Job or None
+      Claimed job marked as running, None if the queue is empty
+
+    Notes
+    -----
+      The claim is a conditional update, so only one of many concurrent workers gets a job,
+      on any database backend.
+    """
+        while True:
+            pk = self.filter(status=Job.Status.QUEUED).order_by('created_at', 'pk').values_list('pk', flat=True).first()
+            if pk is None:
+                return None
+            claimed = self.filter(pk=pk, status=Job.Status.QUEUED).update(
+                status=Job.Status.RUNNING, worker=worker, started_at=timezone.now(),
+            )
+            if claimed:
+                return self.get(pk=pk)
+
+    def purge(self, seconds):
+        """Delete the jobs that finished long ago, with their results
+
+    Parameters
+    ----------
+    seconds: float
+      Time since the end of a job after which it is deleted
+
+    Returns
+    -------
+    int
+      Number of deleted jobs
+    """
+        finished_before = timezone.now() - timedelta(seconds=seconds)
+        return self.filter(
+            status__in=[Job.Status.DONE, Job.Status.FAILED], finished_at__lt=finished_before,
+        ).delete()[0]
+
+    def requeue_stale(self, seconds):
+        """Queue again the jobs that have been running for too long, e.g. after a worker was killed
+
+    Parameters
+    ----------
+    seconds: float
+      Running time after which a job is considered lost
+
+    Returns
+    -------
+    int
+      Number of queued jobs
+    """
+        started_before = timezone.now() - timedelta(seconds=seconds)
+        return self.filter(status=Job.Status.RUNNING, started_at__lt=started_before).update(
+            status=Job.Status.QUEUED, worker='', started_at=None,
+        )
+
+
+class Job(models.Model):
+
+    class Status(models.TextChoices):
+        QUEUED = 'queued', 'Queued'
+        RUNNING = 'running', 'Running'
+        DONE = 'done', 'Done'
+        FAILED = 'failed', 'Failed'
+
+    kind = models.CharField(max_length=100)
+    params = models.JSONField(default=dict, encoder=DjangoJSONEncoder)
+    key = models.CharField(max_length=64, db_index=True)
+    # key with the version of the data after the run, set when the job is done
+    result_key = models.CharField(max_length=64, db_index=True, blank=True)
+    status = models.CharField(max_length=10, choices=Status.choices, default=Status.QUEUED)
+    result = models.JSONField(null=True, blank=True, encoder=DjangoJSONEncoder)
+    error = models.TextField(blank=True)
+    worker = models.CharField(max_length=100, blank=True)
+    created_at = models.DateTimeField(default=timezone.now)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    objects = JobQuerySet.as_manager()
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [models.Index(fields=['status', 'created_at'])]
+
+    def __str__(self):
+        return f'{self.kind} #{self.pk} ({self.status})'
+
+    @property
+    def is_finished(self):
+        return self.status in (self.Status.DONE, self.Status.FAILED)
+
+    @property
+    def age(self):
+        """Seconds since the job was submitted"""
+        return (timezone.now() - self.created_at).total_seconds()
+
+    def run(self):
+        """Execute the task of the job in the current process and store the result or the error"""
+        if self.started_at is None:
+            self.started_at = timezone.now()
+        try:
+            result = get_task(self.kind)(**self.params)
+        except Exception:
+            logger.exception('Job %s failed', self)
+            self.status = self.Status.FAILED
+            self.error = traceback.format_exc()
+        else:
+            self.status = self.Status.DONE
+            self.result = result
+            self.result_key = get_job_key(self.kind, self.params, get_version(self.kind))
+        self.finished_at = timezone.now()
+        self.save(update_fields=['status', 'result', 'result_key', 'error', 'started_at', 'finished_at'])
+
+    def to_dict(self, with_result=False):
+        data = {
+            'id': self.pk,
+            'kind': self.kind,
+            'status': self.status,
+            'error': self.error,
+            'created_at': self.created_at,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at,
+        }
+        if with_result:
+            data['result'] = self.result
+        return data
@@ -0,0 +1,139 @@
+from importlib import import_module
+
+from django.conf import settings
+
+registry = {}
+_versions = {}  # task name -> function returning the version of the data the task reads
+_validators = {}  # task name -> function cleaning the params of jobs submitted over HTTP
+_discovered = False
+
+
+class UnknownTaskError(LookupError):
+    """Raised when a job refers to a task that is not registered"""
+
+
+class TaskNotAllowedError(Exception):
+    """Raised when a task cannot be submitted over HTTP"""
+
+
+def task(name, version=None, validate=None):
+    """Register a function as a job task
+
+  Parameters
+  ----------
+  name: str
+    Name jobs refer to the task by, e.g. 'markowitz.frontier'
+  version: callable, optional, default=None
+    Function with no arguments returning the version of the data the task reads, e.g. store.get_version,
+    a new version makes a new job
+  validate: callable, optional, default=None
+    Function params -> cleaned params raising ValueError for invalid params. Only tasks with one can be
+    submitted over HTTP, see clean_params()
+
+  Returns
+  -------
+  callable
+    Decorator that registers the function and returns it unchanged
+
+  Notes
+  -----
+    The task is called with the job params as keyword arguments and must return JSON serializable data.
+  """
+    def decorator(function):
+        registry[name] = function
+        _versions[name] = version
+        _validators[name] = validate
+        return function
+    return decorator
+
+
+def autodiscover():
+    """Import the modules listed in settings.JOBS_TASK_MODULES so that their tasks are registered"""
+    global _discovered
+    for module in getattr(settings, 'JOBS_TASK_MODULES', []):
+        import_module(module)
+    _discovered = True
+
+
+def get_task(name):
+    """Find a registered task
+
+  Parameters
+  ----------
+  name: str
+    Task name
+
+  Returns
+  -------
+  callable
+    Task function
+
+  Raises
+  ------
+  UnknownTaskError
+    If no task is registered under the name
+  """
+    if name not in registry and not _discovered:
+        autodiscover()
+    try:
+        return registry[name]
+    except KeyError:
+        raise UnknownTaskError(name) from None
+
+
+def get_version(name):
+    """Current version of the data a task reads
+
+  Parameters
+  ----------
+  name: str
+    Task name
+
+  Returns
+  -------
+  object
+    Value of the version function of the task, None if it has none
+
+  Raises
+  ------
+  UnknownTaskError
+    If no task is registered under the name
+  """
+    get_task(name)
+    version = _versions.get(name)
+    return None if version is None else version()
+
+
+def clean_params(name, params):
+    """Validate the params of a job submitted over HTTP
+
+  Parameters
+  ----------
+  name: str
+    Task name
+  params: object
+    Params as sent by the client
+
+  Returns
+  -------
+  dict
+    Cleaned params
+
+  Raises
+  ------
+  UnknownTaskError
+    If no task is registered under the name
+  TaskNotAllowedError
+    If the task has no validate function
+  ValueError
+    If the params are invalid
+  """
+    get_task(name)
+    validate = _validators.get(name)
+    if validate is None:
+        raise TaskNotAllowedError(name)
+    if params is None:
+        params = {}
+    if not isinstance(params, dict):
+        raise ValueError('params must be an object')
+    return validate(params)
@@ -0,0 +1,150 @@
+import json
+import os
+import tempfile
+from datetime import timedelta
+from unittest import mock
+
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from . import worker
+from .models import Job
+from .tasks import task
+
+data = {'version': 1}
+
+
+def validate_add(params):
+    if set(params) != {'a', 'b'} or not all(isinstance(value, int) for value in params.values()):
+        raise ValueError('expected two integers a and b')
+    return params
+
+
+@task('tests.add', version=lambda: data['version'], validate=validate_add)
+def add(a, b):
+    return a + b
+
+
+@task('tests.fetch', version=lambda: data['version'])
+def fetch():
+    # like the tasks that download missing quotes into the store they read
+    data['version'] += 1
+    return data['version']
+
+
+@task('tests.fail')
+def fail():
+    raise RuntimeError('failed')
+
+
+class SubmitTests(TestCase):
+    def setUp(self):
+        data['version'] = 1
+
+    def test_same_job_is_reused(self):
+        job = Job.objects.submit('tests.add', {'a': 1, 'b': 2})
+        self.assertEqual(job.status, Job.Status.QUEUED)
+        self.assertEqual(Job.objects.submit('tests.add', {'b': 2, 'a': 1}), job)
+        self.assertNotEqual(Job.objects.submit('tests.add', {'a': 1, 'b': 3}), job)
+        data['version'] = 2
+        self.assertNotEqual(Job.objects.submit('tests.add', {'a': 1, 'b': 2}), job)
+
+    def test_claim_and_run(self):
+        job = Job.objects.submit('tests.add', {'a': 1, 'b': 2})
+        claimed = Job.objects.claim('worker')
+        self.assertEqual(claimed, job)
+        self.assertEqual(claimed.status, Job.Status.RUNNING)
+        self.assertIsNone(Job.objects.claim('other worker'))
+        claimed.run()
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.result), (Job.Status.DONE, 3))
+
+    @override_settings(JOBS_EAGER=True)
+    def test_job_changing_its_data_is_reused(self):
+        job = Job.objects.submit('tests.fetch')
+        self.assertEqual((job.status, job.result), (Job.Status.DONE, 2))
+        # the page reloaded after the job sees the version the job left behind
+        self.assertEqual(Job.objects.submit('tests.fetch'), job)
+        self.assertEqual(Job.objects.count(), 1)
+        data['version'] = 5
+        self.assertNotEqual(Job.objects.submit('tests.fetch'), job)
+
+    @override_settings(JOBS_EAGER=True)
+    def test_failed_job_is_submitted_again(self):
+        with mock.patch('apps.jobs.models.logger'):
+            job = Job.objects.submit('tests.fail')
+            self.assertEqual(job.status, Job.Status.FAILED)
+            self.assertIn('RuntimeError: failed', job.error)
+            self.assertNotEqual(Job.objects.submit('tests.fail'), job)
+
+    def test_purge(self):
+        old = Job.objects.create(kind='tests.add', params={'a': 1, 'b': 1}, key='old', status=Job.Status.DONE,
+                                 finished_at=timezone.now() - timedelta(days=8))
+        recent = Job.objects.create(kind='tests.add', params={'a': 1, 'b': 2}, key='recent', status=Job.Status.DONE,
+                                    finished_at=timezone.now() - timedelta(days=1))
+        queued = Job.objects.create(kind='tests.add', params={'a': 1, 'b': 3}, key='queued',
+                                    created_at=timezone.now() - timedelta(days=8))
+        with self.settings(JOBS_KEEP_FINISHED=7 * 24 * 3600):
+            Job.objects.submit('tests.add', {'a': 2, 'b': 2})
+        self.assertFalse(Job.objects.filter(pk=old.pk).exists())
+        self.assertEqual(Job.objects.filter(pk__in=[recent.pk, queued.pk]).count(), 2)
+        self.assertEqual(Job.objects.purge(0), 1)
+
+
+class SubmitViewTests(TestCase):
+    def setUp(self):
+        # like a client outside a browser, without a CSRF cookie or token
+        self.client = Client(enforce_csrf_checks=True)
+
+    def post(self, body):
+        return self.client.post(reverse('jobs:submit'), json.dumps(body), content_type='application/json')
+
+    def test_submit(self):
+        response = self.post({'kind': 'tests.add', 'params': {'a': 1, 'b': 2}})
+        self.assertEqual(response.status_code, 202)
+        job = Job.objects.get()
+        self.assertEqual(job.params, {'a': 1, 'b': 2})
+        self.assertEqual(response.json()['url'], reverse('jobs:detail', args=[job.pk]))
+        response = self.client.get(reverse('jobs:detail', args=[job.pk]))
+        self.assertEqual(response.json()['status'], 'queued')
+
+    def test_invalid_jobs(self):
+        self.assertEqual(self.post({'kind': 'tests.add', 'params': {'a': 1}}).status_code, 400)
+        self.assertEqual(self.post({'kind': 'tests.add', 'params': [1, 2]}).status_code, 400)
+        self.assertEqual(self.post({'kind': 'tests.unknown'}).status_code, 400)
+        self.assertEqual(self.post({'params': {}}).status_code, 400)
+        # tasks without a validate function are not submitted over HTTP
+        self.assertEqual(self.post({'kind': 'tests.fetch'}).status_code, 403)
+        self.assertFalse(Job.objects.exists())
+
+
+def work_and_crash_once(path, index, stop, poll_interval, burst):
+    # stands for worker.work in the forked workers: the first start of worker 0 crashes
+    with open(path, 'a') as f:
+        f.write(f'{index}\n')
+    with open(path) as f:
+        if index == 0 and f.read().split().count('0') == 1:
+            os._exit(1)
+
+
+class PoolTests(TestCase):
+    def test_pool(self):
+        stale = Job.objects.create(kind='tests.add', params={'a': 1, 'b': 1}, key='stale', status=Job.Status.RUNNING,
+                                   worker='killed', started_at=timezone.now() - timedelta(hours=2))
+        running = Job.objects.create(kind='tests.add', params={'a': 1, 'b': 2}, key='running',
+                                     status=Job.Status.RUNNING, worker='alive', started_at=timezone.now())
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'starts')
+            with mock.patch.object(worker, 'work', lambda *args: work_and_crash_once(path, *args)), \
+                    mock.patch.object(worker, 'logger') as logger:
+                worker.run_pool(2, poll_interval=0.05, burst=True, stale_after=3600)
+            with open(path) as f:
+                starts = f.read().split()
+        # the crashed worker was replaced, those that exited with the queue empty were not
+        self.assertEqual(sorted(starts), ['0', '0', '1'])
+        self.assertEqual(logger.warning.call_count, 2)
+        stale.refresh_from_db()
+        running.refresh_from_db()
+        self.assertEqual((stale.status, stale.worker), (Job.Status.QUEUED, ''))
+        self.assertEqual(running.status, Job.Status.RUNNING)
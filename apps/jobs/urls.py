@@ -0,0 +1,9 @@
+from django.urls import path
+from .views import JobDetailView, JobSubmitView
+
+app_name = 'jobs'
+
+urlpatterns = [
+    path('', JobSubmitView.as_view(), name='submit'),
+    path('<int:pk>/', JobDetailView.as_view(), name='detail'),
+]
@@ -0,0 +1,46 @@
+import json
+
+from django.http import JsonResponse
+from django.shortcuts import get_object_or_404
+from django.urls import reverse
+from django.utils.decorators import method_decorator
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
+
+from .models import Job
+from .tasks import TaskNotAllowedError, UnknownTaskError, clean_params
+
+
+class JobDetailView(View):
+    """Status of a job, with its result if the query string has ?result=1"""
+
+    def get(self, request, pk):
+        job = get_object_or_404(Job, pk=pk)
+        with_result = request.GET.get('result') == '1' and job.status == Job.Status.DONE
+        return JsonResponse(job.to_dict(with_result=with_result))
+
+
+@method_decorator(csrf_exempt, name='dispatch')
+class JobSubmitView(View):
+    """Queue a job from a JSON body {"kind": task name, "params": {...}}
+
+    Only tasks registered with a validate function can be submitted, with the params it accepts.
+    The endpoint is open to anonymous JSON clients and does not act on behalf of a session,
+    so it takes no CSRF token.
+    """
+
+    def post(self, request):
+        try:
+            body = json.loads(request.body or '{}')
+            kind = body['kind']
+            params = clean_params(kind, body.get('params'))
+        except (ValueError, KeyError, TypeError) as error:
+            return JsonResponse({'error': f'Invalid job: {error}'}, status=400)
+        except UnknownTaskError as error:
+            return JsonResponse({'error': f'Unknown task: {error}'}, status=400)
+        except TaskNotAllowedError as error:
+            return JsonResponse({'error': f'Task cannot be submitted: {error}'}, status=403)
+        job = Job.objects.submit(kind, params)
+        data = job.to_dict()
+        data['url'] = reverse('jobs:detail', args=[job.pk])
+        return JsonResponse(data, status=200 if job.is_finished else 202)
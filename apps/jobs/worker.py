@@ -0,0 +1,121 @@
+import logging
+import multiprocessing
+import os
+import signal
+import socket
+import time
+
+import django
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+# seconds between two looks for stale jobs, at most
+STALE_CHECK_INTERVAL = 60.0
+
+
+def work(index, stop, poll_interval=1.0, burst=False):
+    """Run jobs in the current process until stopped
+
+  Parameters
+  ----------
+  index: int
+    Number of the worker in its pool
+  stop: multiprocessing.Event
+    Set to stop the worker after the job it is running
+  poll_interval: float, optional, default=1.0
+    Seconds to wait before looking for new jobs when the queue is empty
+  burst: bool, optional, default=False
+    Exit when the queue is empty instead of waiting for new jobs
+  """
+    django.setup()  # a no-op in forked workers, needed with the spawn start method
+    from .models import Job
+    from .tasks import autodiscover
+
+    # the pool handles interrupts, a running job is finished rather than left half done
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    autodiscover()
+    name = f'{socket.gethostname()}:{os.getpid()}:{index}'
+    logger.info('Worker %s started', name)
+    try:
+        while not stop.is_set():
+            job = Job.objects.claim(name)
+            if job is None:
+                if burst:
+                    break
+                stop.wait(poll_interval)
+                continue
+            logger.info('Worker %s runs %s', name, job)
+            job.run()
+    finally:
+        connections.close_all()
+    logger.info('Worker %s stopped', name)
+
+
+def run_pool(workers=2, poll_interval=1.0, burst=False, stale_after=None):
+    """Run jobs in a pool of worker processes until interrupted
+
+  Parameters
+  ----------
+  workers: int, optional, default=2
+    Number of worker processes
+  poll_interval: float, optional, default=1.0
+    Seconds a worker waits before looking for new jobs when the queue is empty
+  burst: bool, optional, default=False
+    Exit when the queue is empty instead of waiting for new jobs
+  stale_after: float, optional
+    Queue again the jobs that have been running for longer (seconds), checked every
+    STALE_CHECK_INTERVAL seconds at most. None leaves them running
+
+  Notes
+  -----
+    SIGINT and SIGTERM stop the pool, workers finish their running jobs first.
+    A worker that exits before the pool is stopped, e.g. killed, is replaced. In burst mode,
+    a worker that exits normally because the queue is empty is not.
+  """
+    from .models import Job
+
+    methods = multiprocessing.get_all_start_methods()
+    context = multiprocessing.get_context('fork' if 'fork' in methods else 'spawn')
+    stop = context.Event()
+
+    def start(index):
+        # database connections must not be shared with the forked workers
+        connections.close_all()
+        process = context.Process(target=work, args=(index, stop, poll_interval, burst), name=f'jobs-worker-{index}')
+        process.start()
+        return process
+
+    processes = [start(index) for index in range(workers)]
+
+    def handle_signal(signum, frame):
+        logger.info('Stopping workers')
+        stop.set()
+
+    previous_handlers = {signum: signal.signal(signum, handle_signal) for signum in (signal.SIGINT, signal.SIGTERM)}
+    next_stale_check = time.monotonic()
+    try:
+        while not stop.is_set():
+            if stale_after is not None and time.monotonic() >= next_stale_check:
+                requeued = Job.objects.requeue_stale(stale_after)
+                if requeued:
+                    logger.warning('Queued %s stale jobs again', requeued)
+                next_stale_check = time.monotonic() + min(stale_after, STALE_CHECK_INTERVAL)
+            for index, process in enumerate(processes):
+                if process is None or process.is_alive() or stop.is_set():
+                    continue
+                if burst and process.exitcode == 0:
+                    processes[index] = None
+                else:
+                    logger.warning('Worker %s exited with code %s, starting a new one', process.name, process.exitcode)
+                    processes[index] = start(index)
+            if not any(processes):
+                break
+            stop.wait(poll_interval)
+        for process in processes:
+            if process is not None:
+                process.join()
+    finally:
+        for signum, handler in previous_handlers.items():
+            signal.signal(signum, handler)
+        connections.close_all()
@@ -4,8 +4,11 @@ import matplotlib.pyplot as plt
 import seaborn as sns
 import pandas as pd
 from ..utils import mvo, annualize
+from ..utils import profiling
+from ..utils.chart import cached_chart
 
 
+@profiling.timed('chart.get_graph')
 def get_graph():
     buffer = BytesIO()
     plt.savefig(buffer, format='png')
@@ -17,6 +20,8 @@ def get_graph():
     return graph
 
 
+# the portfolio kwargs are not drawn, so they are not part of the key
+@cached_chart(key=lambda returns, covariance_matrix, **kwargs: (returns, covariance_matrix))
 def get_chart(returns, covariance_matrix, **kwargs):
     plt.switch_backend('AGG')
     all_mark = mvo.plot_efficient_frontier(20, returns, covariance_matrix, 0.02, show_cml=True, show_ew_portfolio=True, show_gmv_portfolio=True)
@@ -0,0 +1,59 @@
+from ..jobs.tasks import task
+from ..utils import covariance, reader, mvo, annualize, store
+from .chart import get_chart
+
+MAX_TICKERS = 50  # largest portfolio of a frontier submitted over HTTP
+
+
+def validate_frontier(params):
+    """Check the params of a frontier submitted over HTTP
+
+  Parameters
+  ----------
+  params: dict
+    {'tickers': list of 2 to MAX_TICKERS distinct tickers}
+
+  Returns
+  -------
+  dict
+    Cleaned params
+
+  Raises
+  ------
+  ValueError
+    If the params are invalid or some tickers are not stored yet, a client cannot make the server download quotes
+  """
+    if set(params) != {'tickers'}:
+        raise ValueError('expected the params {"tickers": [...]}')
+    tickers = params['tickers']
+    if not isinstance(tickers, list) or not all(isinstance(ticker, str) for ticker in tickers):
+        raise ValueError('tickers must be a list of strings')
+    if not 2 <= len(set(tickers)) == len(tickers) <= MAX_TICKERS:
+        raise ValueError(f'tickers must be 2 to {MAX_TICKERS} distinct tickers')
+    manifest = store.get_manifest()
+    unknown = [ticker for ticker in tickers if ticker not in manifest]
+    if unknown:
+        raise ValueError(f"tickers not in the store: {', '.join(unknown)}")
+    return {'tickers': tickers}
+
+
+@task('markowitz.frontier', version=store.get_version, validate=validate_frontier)
+def get_frontier(tickers):
+    portfolio_pct = reader.get_quotes(tickers)[1]
+    portfolio_pct_ann = annualize.get_annualized_returns(portfolio_pct, 255)
+    covariance_matrix = covariance.get_covariance(tickers)
+
+    gmv = mvo.get_gmv_portfolio(covariance_matrix)
+    gmv_weights = []
+    for t, w in zip(tickers, gmv):
+        if round(w, 4) > 0:
+            gmv_weights.append((t, float(w)))
+    all_mark = get_chart(portfolio_pct_ann, covariance_matrix)
+    sharp_weights = []
+    for elem in all_mark[1][0][0]:
+        sharp_weights.append((tickers[elem[0]], elem[1]))
+    return {
+        'chart': all_mark[0],
+        'gmv_weights': gmv_weights,
+        'max_sharpe': sharp_weights,
+    }
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+
+from apps.utils import reader, store
+
+
+class Command(BaseCommand):
+    help = 'Append quotes published since the last stored date to the local price store'
+
+    def add_arguments(self, parser):
+        parser.add_argument('tickers', nargs='*', help='Tickers to refresh, all stored tickers if omitted')
+        parser.add_argument('--exchange', default='US', help='Exchange code')
+        parser.add_argument('--end', default=None, help='Last date to refresh up to (YYYY-MM-DD), today if omitted')
+        parser.add_argument('--matrices', action='store_true',
+                            help='Rebuild the memory-mapped price and return matrices of the exchange afterwards')
+
+    def handle(self, *args, **options):
+        appended, failures = reader.refresh_quotes(options['tickers'] or None, options['exchange'], options['end'])
+        for ticker, rows in appended.items():
+            self.stdout.write(f'{ticker}: {rows} new rows')
+        for ticker, error in failures.items():
+            self.stderr.write(f'{ticker}: {error}')
+        self.stdout.write(self.style.SUCCESS(f'Refreshed {len(appended)} tickers, {len(failures)} failed'))
+        if options['matrices']:
+            store.open_matrices(options['exchange'])
+            self.stdout.write(self.style.SUCCESS(f"Matrices of {options['exchange']} are up to date"))
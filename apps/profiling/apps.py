@@ -0,0 +1,35 @@
+from django.apps import AppConfig
+from django.conf import settings
+
+from ..utils import profiling
+
+
+class ProfilingConfig(AppConfig):
+    name = 'apps.profiling'
+    label = 'profiling'
+
+    def ready(self):
+        if settings.PROFILING_ENABLED:
+            instrument_pypfopt()
+
+
+def instrument_pypfopt():
+    """Time the optimizers of the vendored pypfopt as the stages pypfopt.<class>.<method>
+
+  The library is wrapped from here rather than decorated in place, so that it stays a plain copy of upstream.
+  """
+    from ..blacklitterman.pypfopt import (
+        BlackLittermanModel, CLA, CovarianceShrinkage, EfficientFrontier, HRPOpt, base_optimizer,
+    )
+    stages = [
+        # every cvxpy solve of EfficientFrontier and of the other convex optimizers
+        (base_optimizer.BaseConvexOptimizer, ['_solve_cvxpy_opt_problem']),
+        (EfficientFrontier, ['min_volatility', 'max_sharpe', 'max_quadratic_utility', 'efficient_risk',
+                             'efficient_return']),
+        (CLA, ['max_sharpe', 'min_volatility', 'efficient_frontier']),
+        (HRPOpt, ['optimize']),
+        (BlackLittermanModel, ['bl_returns', 'bl_cov', 'bl_weights']),
+        (CovarianceShrinkage, ['shrunk_covariance', 'ledoit_wolf', 'oracle_approximating']),
+    ]
+    for owner, methods in stages:
+        profiling.instrument(owner, methods, f'pypfopt.{owner.__name__}')
@@ -0,0 +1,34 @@
+import tracemalloc
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+
+from ..utils import profiling
+
+
+class ProfilingMiddleware:
+    """Record the stages of every request
+
+    The recording is attached to the request as request.profiling, for the debug toolbar panel,
+    added to the totals of the view served by /profiling/metrics/ and, when PROFILING_SERVER_TIMING is set,
+    sent in a Server-Timing header shown by the network tab of the browser developer tools.
+    Put it first in MIDDLEWARE so that the other middleware is included in the total.
+    """
+
+    def __init__(self, get_response):
+        if not settings.PROFILING_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.trace_allocations = settings.PROFILING_TRACE_ALLOCATIONS
+        if self.trace_allocations and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    def __call__(self, request):
+        with profiling.recording(self.trace_allocations) as recorder:
+            request.profiling = recorder
+            response = self.get_response(request)
+        match = request.resolver_match
+        profiling.metrics.add(match.view_name if match is not None else 'unresolved', recorder)
+        if settings.PROFILING_SERVER_TIMING:
+            response['Server-Timing'] = profiling.get_server_timing(recorder)
+        return response
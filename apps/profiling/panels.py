@@ -0,0 +1,31 @@
+from debug_toolbar.panels import Panel
+
+
+class StagesPanel(Panel):
+    """Debug toolbar panel with the stages and cache lookups recorded by the profiling middleware"""
+
+    title = 'Stages'
+    template = 'profiling/panel.html'
+
+    def nav_subtitle(self):
+        stats = self.get_stats()
+        if 'stages' not in stats:
+            return ''
+        hits = sum(cache['hits'] for cache in stats['caches'])
+        lookups = hits + sum(cache['misses'] for cache in stats['caches'])
+        return f"{len(stats['stages'])} stages, {hits}/{lookups} cache hits"
+
+    def generate_stats(self, request, response):
+        recorder = getattr(request, 'profiling', None)
+        if recorder is None:
+            return
+        # stages finished by the view, the toolbar renders before the recording of the request ends
+        stages = [
+            {
+                'name': name, 'calls': stage.calls, 'wall': stage.wall * 1000, 'cpu': stage.cpu * 1000,
+                'max_wall': stage.max_wall * 1000, 'allocated': stage.allocated / 2 ** 20,
+            }
+            for name, stage in recorder.stages.items()
+        ]
+        caches = [{'name': name, **counts} for name, counts in recorder.caches.items()]
+        self.record_stats({'stages': stages, 'caches': caches, 'trace_allocations': recorder.trace_allocations})
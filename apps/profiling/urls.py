@@ -0,0 +1,8 @@
+from django.urls import path
+from .views import MetricsView
+
+app_name = 'profiling'
+
+urlpatterns = [
+    path('metrics/', MetricsView.as_view(), name='metrics'),
+]
@@ -0,0 +1,34 @@
+from django.conf import settings
+from django.http import Http404, JsonResponse
+from django.views import View
+
+from ..blacklitterman import blackl
+from ..utils import chart, covariance, profiling, reader
+
+# in-memory caches of the process, by the name their hits and misses are recorded under
+CACHES = {
+    'market': reader.market_cache,
+    'chart': chart.chart_cache,
+    'covariance': covariance.covariance_cache,
+    'blacklitterman': blackl.results_cache,
+}
+
+
+class MetricsView(View):
+    """Totals of the recorded stages per view since the process started, and the state of the in-memory caches
+
+    Only served in DEBUG or to staff users.
+    """
+
+    def dispatch(self, request, *args, **kwargs):
+        if not settings.PROFILING_ENABLED:
+            raise Http404('Profiling is disabled')
+        if not (settings.DEBUG or request.user.is_staff):
+            return JsonResponse({'error': 'Metrics are only available to staff users'}, status=403)
+        return super().dispatch(request, *args, **kwargs)
+
+    def get(self, request):
+        return JsonResponse({
+            'views': profiling.metrics.snapshot(),
+            'caches': {name: cache.stats() for name, cache in CACHES.items()},
+        })
@@ -3,8 +3,11 @@ from io import BytesIO
 import matplotlib.pyplot as plt
 import seaborn as sns
 import pandas as pd
+from ..utils.chart import cached_chart
+from ..utils import profiling
 
 
+@profiling.timed('chart.get_graph')
 def get_graph():
     buffer = BytesIO()
     plt.savefig(buffer, format='png')
@@ -18,15 +21,16 @@ def get_graph():
 
 def get_chart(data, *args, **kwargs):
     plt.switch_backend('AGG')
-    column_names = list(data.columns)
-    charts = []
-    for ticker in column_names:
-        fig = plt.figure()
-        axes = plt.figure(figsize=(5, 3))
-        data[ticker].plot()
-        plt.title(ticker)
-        plt.tight_layout()
-        chart = get_graph()
-        charts.append(chart)
-        plt.close()
-    return charts
+    # one chart per ticker, so a changed ticker does not re-render the others
+    return [get_ticker_chart(data[ticker]) for ticker in data.columns]
+
+
+@cached_chart
+def get_ticker_chart(prices):
+    fig = plt.figure(figsize=(5, 3))
+    prices.plot()
+    plt.title(prices.name)
+    plt.tight_layout()
+    chart = get_graph()
+    plt.close(fig)
+    return chart
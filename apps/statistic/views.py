@@ -1,9 +1,11 @@
 from django.views.generic import TemplateView
 
-from ..utils import reader, stats, mvo, annualize, risk
+from ..utils import covariance, reader, store, stats, mvo, annualize
 from .chart import get_chart
 import numpy as np
 
+WINDOW_LABELS = {'full': 'Весь период', '1y': '1 год', '3y': '3 года', '5y': '5 лет'}
+
 
 class StatsHomeView(TemplateView):
     template_name = 'statistic/statistic.html'
@@ -19,13 +21,18 @@ class StatsHomeView(TemplateView):
         tickers = tickers[0]
         # print(tickers)
 
-        portfolio_price = reader.get_quotes(tickers)[0]
+        portfolio_price, portfolio_pct = reader.get_mapped_quotes(tickers)
         context['charts'] = get_chart(portfolio_price)
-        portfolio_pct = reader.get_quotes(tickers)[1]
-        # print(portfolio_pct)
-        portfolio_pct_stats = stats.get_portfolio_stat_summary(portfolio_pct)
-        # print(portfolio_pct_stats)
-        context['portfolio_stats'] = portfolio_pct_stats
+        # statistics over trailing windows are computed when quotes are stored, the statistics over the period
+        # of the page (reader.START_DATE to reader.END_DATE) are computed here like those of the portfolio
+        window = self.request.GET.get('window')
+        window = window if window in stats.STAT_WINDOWS else 'full'
+        if window == 'full':
+            context['portfolio_stats'] = stats.get_portfolio_stat_summary(portfolio_pct)
+        else:
+            context['portfolio_stats'] = store.read_stats_index(tickers, window)
+        context['window'] = window
+        context['windows'] = WINDOW_LABELS.items()
 
         weights = []
         with open('./apps/data/weights.csv', 'r') as f:
@@ -35,20 +42,20 @@ class StatsHomeView(TemplateView):
 
         weights = np.array(weights[0])
         portfolio_pct_ann = annualize.get_annualized_returns(portfolio_pct, 255)
-        covariance_matrix = portfolio_pct.cov() * 255
+        covariance_matrix = covariance.get_covariance(tickers)
         context['total_port_returns'] = mvo.get_portfolio_returns(weights, portfolio_pct_ann[tickers])
         context['total_port_vol'] = mvo.get_portfolio_volatility(weights, covariance_matrix.loc[tickers, tickers])
 
         weighted_returns = weights * portfolio_pct
         total_port_returns = weighted_returns.sum(axis=1)
 
-        context['skewness'] = total_port_returns.aggregate(stats.get_skewness)
-        context['kurtosis'] = total_port_returns.aggregate(stats.get_kurtosis)
-        context['cornish_fisher_var'] = total_port_returns.aggregate(risk.get_cf_var)
-        context['historic_cvar'] = total_port_returns.aggregate(risk.get_conditional_historic_var)
-        # context['annualized_sharpe_ratio'] = total_port_returns.aggregate(risk.get_sharpe_ratio, risk_free_rate=0.03, periods_per_year=255)
-        context['annualized_sharpe_ratio'] = total_port_returns.aggregate(risk.get_sharpe_ratio)
-        context['drawdown'] = total_port_returns.aggregate(lambda returns_series: risk.get_drawdown(returns_series).Drawdown.min())
+        total_port_stats = stats.get_portfolio_stat_summary(total_port_returns).iloc[0]
+        context['skewness'] = total_port_stats['Skewness']
+        context['kurtosis'] = total_port_stats['Kurtosis']
+        context['cornish_fisher_var'] = total_port_stats['Cornish Fischer VaR (5%)']
+        context['historic_cvar'] = total_port_stats['Historic CVaR (5%)']
+        context['annualized_sharpe_ratio'] = total_port_stats['Sharpe Ratio']
+        context['drawdown'] = total_port_stats['Maximum Drawdown']
 
         return context
 
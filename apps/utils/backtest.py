@@ -0,0 +1,221 @@
+import os
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from . import mvo
+from ..blacklitterman.pypfopt import (
+    BlackLittermanModel, CLA, EfficientFrontier, HRPOpt, market_implied_prior_returns,
+)
+
+# Weights chosen at every rebalance date and the path of the rebalanced portfolio
+BacktestResult = namedtuple('BacktestResult', ['weights', 'turnover', 'costs', 'returns', 'equity'])
+
+
+def get_gmv_weights(expected_returns, covariance_matrix):
+    return mvo.get_gmv_portfolio(covariance_matrix.to_numpy())
+
+
+def get_max_sharpe_weights(expected_returns, covariance_matrix, risk_free_rate=0.02):
+    return mvo.maximize_sharpe_ratio(risk_free_rate, expected_returns.to_numpy(), covariance_matrix.to_numpy())
+
+
+def get_ef_min_volatility_weights(expected_returns, covariance_matrix):
+    ef = EfficientFrontier(expected_returns, covariance_matrix)
+    return pd.Series(ef.min_volatility())[expected_returns.index].to_numpy()
+
+
+def get_ef_max_sharpe_weights(expected_returns, covariance_matrix, risk_free_rate=0.02):
+    ef = EfficientFrontier(expected_returns, covariance_matrix)
+    return pd.Series(ef.max_sharpe(risk_free_rate))[expected_returns.index].to_numpy()
+
+
+def get_hrp_weights(expected_returns, covariance_matrix):
+    return pd.Series(HRPOpt(cov_matrix=covariance_matrix).optimize())[expected_returns.index].to_numpy()
+
+
+def get_cla_max_sharpe_weights(expected_returns, covariance_matrix):
+    return pd.Series(CLA(expected_returns, covariance_matrix).max_sharpe())[expected_returns.index].to_numpy()
+
+
+def get_black_litterman_weights(expected_returns, covariance_matrix, market_caps, viewdict, risk_aversion=1,
+                                risk_free_rate=0.02):
+    """Max Sharpe weights on the Black-Litterman posterior of the market implied prior and absolute views
+
+  Notes
+  -----
+    Market caps and views of tickers that are not in the window are ignored.
+    Bind the extra arguments with functools.partial to pass it to run_backtest.
+  """
+    tickers = expected_returns.index
+    market_caps = {ticker: cap for ticker, cap in market_caps.items() if ticker in tickers}
+    invested = list(market_caps)
+    market_prior = market_implied_prior_returns(
+        market_caps, risk_aversion, covariance_matrix.loc[invested, invested], risk_free_rate
+    )
+    prior = market_prior.reindex(tickers).fillna(expected_returns)
+    viewdict = {ticker: view for ticker, view in viewdict.items() if ticker in tickers}
+    bl = BlackLittermanModel(covariance_matrix, pi=prior, absolute_views=viewdict)
+    ef = EfficientFrontier(bl.bl_returns(), bl.bl_cov())
+    return pd.Series(ef.max_sharpe(risk_free_rate))[tickers].to_numpy()
+
+
+OPTIMIZERS = {
+    'gmv': get_gmv_weights,
+    'max_sharpe': get_max_sharpe_weights,
+    'ef_min_volatility': get_ef_min_volatility_weights,
+    'ef_max_sharpe': get_ef_max_sharpe_weights,
+    'hrp': get_hrp_weights,
+    'cla_max_sharpe': get_cla_max_sharpe_weights,
+}
+
+
+def run_backtest(prices, optimizer='gmv', window=255, rebalance_every=21, transaction_cost=0.001,
+                 periods_per_year=255, max_workers=None):
+    """Walk-forward backtest of a portfolio rebalanced to the weights of an optimizer
+
+  Parameters
+  ----------
+  prices: pd.DataFrame
+    Prices, one column per ticker (as in apps/data/stocks.csv), missing before a ticker is listed
+  optimizer: str or callable, optional, default='gmv'
+    Name in OPTIMIZERS or function (expected_returns, covariance_matrix) -> np.ndarray of weights,
+    called with annualized pd.Series and pd.DataFrame of the tickers that have a full window
+  window: int, optional, default=255
+    Number of periods of returns the estimates are computed from
+  rebalance_every: int, optional, default=21
+    Number of periods between rebalance dates
+  transaction_cost: float, optional, default=0.001
+    Cost as a fraction of the traded value
+  periods_per_year: int, optional, default=255
+    Number of periods in a year
+  max_workers: int, optional, default=None
+    Number of processes optimizing windows, the number of CPUs if None, 1 runs in the calling process
+
+  Returns
+  -------
+  BacktestResult
+    weights, turnover and costs per rebalance date, net returns per period and the equity curve (inception is 100)
+
+  Notes
+  -----
+    Weights estimated from the returns up to a date are held from the next period and drift with prices
+    until the next rebalance. Turnover is the sum of absolute trades, the first rebalance buys from cash.
+    The window sums of returns and of their cross products are updated with the periods entering and leaving
+    the window, so a rebalance costs O(rebalance_every * N^2) instead of O(window * N^2) before optimizing.
+    They are computed again from the returns every window // rebalance_every rebalances, which bounds
+    the rounding errors. These chains of rebalances are split into contiguous blocks evaluated in parallel,
+    so the weights do not depend on max_workers.
+    Tickers with a constant price over a window have no variance and are not invested.
+    The optimizer has to be picklable (a module level function or functools.partial of one) when max_workers > 1.
+  """
+    returns = prices.pct_change().iloc[1:]
+    values = returns.to_numpy(dtype=np.float64)
+    is_valid = ~np.isnan(values)
+    # row major like the copies sent to the workers, so that sums over periods are made in the same order
+    values = np.ascontiguousarray(np.where(is_valid, values, 0.))
+    positions = np.arange(window, values.shape[0], rebalance_every)
+    if positions.size == 0:
+        raise ValueError(f'Prices have fewer than {window + 2} periods, the first window is not complete')
+    tickers = list(returns.columns)
+
+    max_workers = max_workers or os.cpu_count() or 1
+    # a chain of rebalances starts from sums computed from the returns, blocks are made of whole chains
+    chain_size = max(1, window // rebalance_every)
+    chain_starts = np.arange(0, positions.size, chain_size)
+    blocks = [
+        positions[starts[0]:starts[-1] + chain_size]
+        for starts in np.array_split(chain_starts, min(max_workers, chain_starts.size)) if starts.size
+    ]
+    # every block gets only the periods of its own windows
+    tasks = [
+        (values[block[0] - window:block[-1]], is_valid[block[0] - window:block[-1]], block - block[0] + window,
+         window, chain_size, tickers, optimizer, periods_per_year)
+        for block in blocks
+    ]
+    if len(tasks) == 1:
+        weights = [_optimize_block(*tasks[0])]
+    else:
+        with ProcessPoolExecutor(max_workers=len(tasks)) as executor:
+            weights = list(executor.map(_optimize_block, *zip(*tasks)))
+    weights = np.concatenate(weights)
+
+    net_returns, turnover, costs = _simulate(values, positions, weights, transaction_cost)
+    dates = returns.index
+    net_returns = pd.Series(net_returns, index=dates[positions[0]:], name='Returns')
+    return BacktestResult(
+        weights=pd.DataFrame(weights, index=dates[positions], columns=tickers),
+        turnover=pd.Series(turnover, index=dates[positions], name='Turnover'),
+        costs=pd.Series(costs, index=dates[positions], name='Costs'),
+        returns=net_returns,
+        equity=(100 * (1 + net_returns).cumprod()).rename('Equity'),
+    )
+
+
+def _optimize_block(values, is_valid, positions, window, chain_size, tickers, optimizer, periods_per_year):
+    # Weights for consecutive rebalance positions, the window sums are slid from one position to the next
+    # and computed again at the start of every chain of chain_size positions
+    optimizer = OPTIMIZERS[optimizer] if isinstance(optimizer, str) else optimizer
+    log_growth = np.log1p(values)
+    is_zero = values == 0
+    weights = np.zeros((positions.size, values.shape[1]))
+    for k, position in enumerate(positions):
+        start = position - window
+        if k % chain_size == 0:
+            # sums are taken around the mean of the first window of the chain,
+            # so that adding and removing periods does not lose precision
+            shift = values[start:position].mean(axis=0)
+            shifted = values[start:position] - shift
+            sums = shifted.sum(axis=0)
+            products = shifted.T @ shifted
+            log_sums = log_growth[start:position].sum(axis=0)
+            counts = is_valid[start:position].sum(axis=0)
+            zero_counts = is_zero[start:position].sum(axis=0)
+        else:
+            entering, leaving = values[previous:position] - shift, values[previous - window:start] - shift
+            sums += entering.sum(axis=0) - leaving.sum(axis=0)
+            products += entering.T @ entering - leaving.T @ leaving
+            log_sums += log_growth[previous:position].sum(axis=0) - log_growth[previous - window:start].sum(axis=0)
+            counts += is_valid[previous:position].sum(axis=0) - is_valid[previous - window:start].sum(axis=0)
+            zero_counts += is_zero[previous:position].sum(axis=0) - is_zero[previous - window:start].sum(axis=0)
+        previous = position
+
+        # only tickers with returns over the whole window are invested, their sums have no filled periods,
+        # and only those whose price moved: a constant price has no variance
+        selected = np.flatnonzero((counts == window) & (zero_counts < window))
+        if selected.size == 0:
+            continue
+        labels = [tickers[i] for i in selected]
+        covariance_matrix = (
+            products[np.ix_(selected, selected)] - np.outer(sums[selected], sums[selected]) / window
+        ) / (window - 1) * periods_per_year
+        # rounding must not make a variance negative
+        np.fill_diagonal(covariance_matrix, np.maximum(covariance_matrix.diagonal(), 0))
+        # compounded like annualize.get_annualized_returns
+        expected_returns = np.expm1(log_sums[selected] * periods_per_year / window)
+        weights[k, selected] = optimizer(
+            pd.Series(expected_returns, index=labels),
+            pd.DataFrame(covariance_matrix, index=labels, columns=labels),
+        )
+    return weights
+
+
+def _simulate(values, positions, weights, transaction_cost):
+    # Net returns of the portfolio rebalanced at positions, weights drift with prices in between
+    net_returns = np.empty(values.shape[0] - positions[0])
+    turnover = np.empty(positions.size)
+    holdings = np.zeros(values.shape[1])
+    ends = np.append(positions[1:], values.shape[0])
+    for k, (position, end) in enumerate(zip(positions, ends)):
+        target = weights[k]
+        turnover[k] = np.abs(target - holdings).sum()
+        # value of every holding per unit of portfolio value at the rebalance, what is not invested stays in cash
+        growth = np.cumprod(1 + values[position:end], axis=0) * target
+        portfolio_value = growth.sum(axis=1) + (1 - target.sum())
+        segment_returns = portfolio_value / np.append(1, portfolio_value[:-1]) - 1
+        segment_returns[0] = (1 - turnover[k] * transaction_cost) * (1 + segment_returns[0]) - 1
+        net_returns[position - positions[0]:end - positions[0]] = segment_returns
+        holdings = growth[-1] / portfolio_value[-1]
+    return net_returns, turnover, turnover * transaction_cost
@@ -0,0 +1,155 @@
+import sys
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from . import profiling
+
+
+def get_size(value):
+    """Estimate memory footprint of a cached value
+
+  Parameters
+  ----------
+  value: object
+    pandas object, numpy array, bytes, str or a tuple/list of them
+
+  Returns
+  -------
+  int
+    Size in bytes
+  """
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(deep=True).sum()) + int(value.index.memory_usage(deep=True))
+    if isinstance(value, pd.Series):
+        return int(value.memory_usage(deep=True))
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if isinstance(value, (tuple, list)):
+        return sum(get_size(item) for item in value)
+    if isinstance(value, dict):
+        return sum(get_size(item) for item in value.values())
+    return sys.getsizeof(value)
+
+
+class LRUCache:
+    """Thread safe in-memory cache with a byte-size budget and least recently used eviction
+
+    Attributes
+    ----------
+    max_bytes: int
+      Budget for the total size of cached values
+    name: str or None
+      Name under which hits and misses are counted in the profiling of the current request, not counted if None
+    hits: int
+      Number of lookups that found a value
+    misses: int
+      Number of lookups that did not find a value
+
+    Notes
+    -----
+      Cached values are shared between callers and must not be modified in place.
+      A value larger than the whole budget is returned to the caller but not cached.
+    """
+
+    def __init__(self, max_bytes, get_size=get_size, name=None):
+        self.max_bytes = max_bytes
+        self.name = name
+        self.hits = 0
+        self.misses = 0
+        self._get_size = get_size
+        self._items = OrderedDict()  # key -> (value, size), most recently used last
+        self._size = 0
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self._items)
+
+    def __contains__(self, key):
+        return key in self._items
+
+    def get(self, key, default=None):
+        with self._lock:
+            hit = key in self._items
+            if hit:
+                self._items.move_to_end(key)
+                self.hits += 1
+                value = self._items[key][0]
+            else:
+                self.misses += 1
+                value = default
+        if self.name is not None:
+            profiling.record_cache(self.name, hit)
+        return value
+
+    def set(self, key, value):
+        size = self._get_size(value)
+        with self._lock:
+            self._discard(key)
+            if size > self.max_bytes:
+                return
+            self._items[key] = (value, size)
+            self._size += size
+            while self._size > self.max_bytes:
+                _, (_, evicted_size) = self._items.popitem(last=False)
+                self._size -= evicted_size
+
+    def get_or_set(self, key, compute):
+        """Return the cached value for key, computing and caching it on a miss
+
+    Parameters
+    ----------
+    key: hashable
+      Cache key
+    compute: callable
+      Function with no arguments that produces the value
+
+    Returns
+    -------
+    object
+      Cached or freshly computed value
+    """
+        value = self.get(key, _missing)
+        if value is _missing:
+            value = compute()
+            self.set(key, value)
+        return value
+
+    def _discard(self, key):
+        if key in self._items:
+            _, size = self._items.pop(key)
+            self._size -= size
+
+    def invalidate(self, predicate=None):
+        """Drop cached values
+
+    Parameters
+    ----------
+    predicate: callable, optional, default=None
+      Function key -> bool selecting keys to drop, drops everything if None
+
+    Returns
+    -------
+    int
+      Number of dropped values
+    """
+        with self._lock:
+            keys = [key for key in self._items if predicate is None or predicate(key)]
+            for key in keys:
+                self._discard(key)
+            return len(keys)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'items': len(self._items),
+                'bytes': self._size,
+                'max_bytes': self.max_bytes,
+            }
+
+
+_missing = object()
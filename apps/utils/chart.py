@@ -1,10 +1,22 @@
 import base64
+import functools
+import hashlib
+import os
 from io import BytesIO
 import matplotlib.pyplot as plt
+import numpy as np
 import seaborn as sns
 import pandas as pd
+from .cache import LRUCache
+from . import profiling
 
+CHART_CACHE_BYTES = int(os.environ.get("CHART_CACHE_BYTES", 64 * 1024 ** 2))
 
+# rendered charts shared by all views of the process, keyed by (chart function, fingerprint of its inputs)
+chart_cache = LRUCache(CHART_CACHE_BYTES, name='chart')
+
+
+@profiling.timed('chart.get_graph')
 def get_graph():
     buffer = BytesIO()
     plt.savefig(buffer, format='png')
@@ -34,4 +46,87 @@ def get_chart(chart_type, data, results_by, **kwargs):
         print('ups... failed to identify the chart type')
     plt.tight_layout()
     chart = get_graph()
-    return chart
\ No newline at end of file
+    return chart
+
+
+def get_fingerprint(*values):
+    """Hash chart inputs into a short key
+
+  Parameters
+  ----------
+  values: object
+    pandas objects, numpy arrays, lists, tuples, dicts or any other objects with a stable repr
+
+  Returns
+  -------
+  str
+    Hex digest that changes when the data, the labels or the order of the values change
+  """
+    digest = hashlib.blake2b(digest_size=16)
+    for value in values:
+        _update_fingerprint(digest, value)
+    return digest.hexdigest()
+
+
+def _update_fingerprint(digest, value):
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        labels = list(value.columns) if isinstance(value, pd.DataFrame) else value.name
+        digest.update(f'{type(value).__name__}{value.shape}{labels!r}'.encode())
+        digest.update(pd.util.hash_pandas_object(value, index=True).to_numpy().tobytes())
+    elif isinstance(value, np.ndarray):
+        digest.update(f'ndarray{value.dtype}{value.shape}'.encode())
+        digest.update(np.ascontiguousarray(value).tobytes())
+    elif isinstance(value, (list, tuple)):
+        digest.update(f'{type(value).__name__}{len(value)}'.encode())
+        for item in value:
+            _update_fingerprint(digest, item)
+    elif isinstance(value, dict):
+        digest.update(f'dict{len(value)}'.encode())
+        for item in value.items():
+            _update_fingerprint(digest, item)
+    else:
+        digest.update(repr(value).encode())
+
+
+def cached_chart(function=None, key=None):
+    """Decorate a chart function so that identical charts are rendered only once
+
+  Parameters
+  ----------
+  function: callable, optional
+    Chart function returning the encoded chart, allows using the decorator without parentheses
+  key: callable, optional, default=None
+    Function taking the chart arguments and returning the values the chart depends on,
+    all arguments are used if None
+
+  Returns
+  -------
+  callable
+    Function returning the cached chart when the fingerprint of its inputs was seen before
+
+  Notes
+  -----
+    Figures opened while rendering are closed, a cached chart does not touch matplotlib at all.
+    Calls are timed as the profiling stage chart.<module>.<function>, e.g. chart.markowitz.chart.get_chart.
+    Results are shared between callers and must not be modified in place.
+  """
+    def decorator(function):
+        stage = f"chart.{function.__module__.replace('apps.', '', 1)}.{function.__qualname__}"
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with profiling.timed(stage):
+                inputs = key(*args, **kwargs) if key is not None else (args, kwargs)
+                cache_key = (function.__module__, function.__qualname__, get_fingerprint(inputs))
+                return chart_cache.get_or_set(cache_key, lambda: _render(function, args, kwargs))
+        return wrapper
+    return decorator if function is None else decorator(function)
+
+
+def _render(function, args, kwargs):
+    opened = set(plt.get_fignums())
+    try:
+        return function(*args, **kwargs)
+    finally:
+        for number in set(plt.get_fignums()) - opened:
+            plt.close(number)
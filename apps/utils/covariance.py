@@ -0,0 +1,104 @@
+import os
+
+from ..blacklitterman.pypfopt import risk_models
+from . import profiling, reader, store
+from .cache import LRUCache, get_size
+
+COVARIANCE_CACHE_BYTES = int(os.environ.get("COVARIANCE_CACHE_BYTES", 64 * 1024 ** 2))
+PERIODS_PER_YEAR = 255
+# sample covariance over pairwise complete returns, not fixed to be positive semidefinite, so that its entry (i, j)
+# only depends on the returns of i and j and the matrix of a subset of tickers is a block of the matrix of a universe
+_PAIRWISE_METHOD = 'pairwise_sample_cov'
+
+
+def _get_size(value):
+    if isinstance(value, risk_models.FactorCovariance):
+        return value.loadings.nbytes + value.specific_variances.nbytes
+    return get_size(value)
+
+
+# covariance matrices shared by all views of the process,
+# keyed by (tickers, exchange, start, end, method, frequency, options, store version)
+covariance_cache = LRUCache(COVARIANCE_CACHE_BYTES, get_size=_get_size, name='covariance')
+
+
+@profiling.timed('covariance.get_covariance')
+def get_covariance(tickers, method='sample_cov', exchange='US', start=reader.START_DATE, end=reader.END_DATE,
+                   frequency=PERIODS_PER_YEAR, from_universe=False, **kwargs):
+    """Get the annualized covariance matrix of the daily returns of many tickers
+
+  Parameters
+  ----------
+  tickers: list
+    List of tickers
+  method: str, optional, default='sample_cov'
+    Estimator of risk_models.risk_matrix, e.g. 'sample_cov', 'semicovariance', 'exp_cov', 'ledoit_wolf',
+    'ledoit_wolf_single_factor', 'ledoit_wolf_constant_correlation', 'oracle_approximating'
+  exchange: str, optional, default='US'
+    Exchange code
+  start: str or datetime-like, optional
+    First date of the returns
+  end: str or datetime-like, optional
+    Last date of the returns, inclusive
+  frequency: int, optional, default=255
+    Number of periods in a year
+  from_universe: bool, optional, default=False
+    Take the matrix from the sample covariance of all stored tickers, 'sample_cov' without options only
+  **kwargs
+    Other options of the estimator, e.g. span of exp_cov
+
+  Returns
+  -------
+  pd.DataFrame
+    Covariance matrix with the tickers as index and columns (a risk_models.FactorCovariance for 'factor_cov')
+
+  Notes
+  -----
+    Returns are the percent changes of reader.get_mapped_quotes(). Matrices are cached until the store of the exchange
+    changes and are shared by all callers, copy them before modifying in place.
+    A matrix is estimated from the returns of the requested tickers only. With from_universe, the sample covariance
+    of all tickers stored over the window is computed once and the blocks of the requested tickers are taken from it,
+    as long as it fits in a quarter of the cache, which saves estimating many small sets of tickers one by one.
+    The result is then the pairwise sample covariance, it is not fixed to be positive semidefinite when missing
+    returns make it indefinite, unlike the 'sample_cov' matrix, so that a block does not depend on the universe.
+  """
+    tickers = list(tickers)
+    options = tuple(sorted(kwargs.items()))
+    if from_universe:
+        if method != 'sample_cov' or options:
+            raise ValueError("from_universe is only available for 'sample_cov' without options")
+        universe = _get_block_universe(tickers, exchange, start, end)
+        if universe is None:
+            return _get_matrix(tickers, _PAIRWISE_METHOD, exchange, start, end, frequency, options)
+        matrix = _get_matrix(universe, _PAIRWISE_METHOD, exchange, start, end, frequency, options)
+        return matrix.loc[tickers, tickers]
+    return _get_matrix(tickers, method, exchange, start, end, frequency, options)
+
+
+def _get_block_universe(tickers, exchange, start, end):
+    # stored tickers covering the whole window, if the requested ones are among them and their matrix fits in the cache
+    stored = store.get_manifest(exchange)
+    missing = store.get_missing_ranges(stored, start, end, exchange)
+    universe = sorted(ticker for ticker in stored if ticker not in missing)
+    if not set(tickers) <= set(universe) or 8 * len(universe) ** 2 > covariance_cache.max_bytes // 4:
+        return None
+    return universe
+
+
+def _get_matrix(tickers, method, exchange, start, end, frequency, options):
+    key = (tuple(tickers), exchange, str(start), str(end), method, frequency, options, store.get_version(exchange))
+    matrix = covariance_cache.get(key)
+    if matrix is None:
+        matrix = _compute_matrix(tickers, method, exchange, start, end, frequency, options)
+        # loading the returns may fetch and write missing quotes, so the matrix is cached under the new version
+        covariance_cache.set(key[:-1] + (store.get_version(exchange),), matrix)
+    return matrix
+
+
+def _compute_matrix(tickers, method, exchange, start, end, frequency, options):
+    # read from the matrices mapped by all processes, rather than cached as frames in every one
+    returns = reader.get_mapped_quotes(tickers, exchange, start, end)[1]
+    if method == _PAIRWISE_METHOD:
+        return returns.cov() * frequency
+    return risk_models.risk_matrix(returns, method, returns_data=True, frequency=frequency, **dict(options))
+
@@ -0,0 +1,141 @@
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+# files of a matrix directory
+VALUES_FILE = 'values.npy'  # dates x tickers in Fortran order, every ticker is a contiguous column
+DATES_FILE = 'dates.npy'  # datetime64[D], sorted
+TICKERS_FILE = 'tickers.json'
+
+
+def write_matrix(frame, path, dtype=np.float64):
+    """Write a wide frame as a matrix that can be memory-mapped
+
+  Parameters
+  ----------
+  frame: pd.DataFrame
+    Values with a sorted date index and one column per ticker
+  path: str
+    Directory to create, must not exist
+  dtype: numpy dtype, optional, default=np.float64
+    Type of the stored values, np.float32 halves the size
+
+  Notes
+  -----
+    The values are a plain .npy file, so np.load(path, mmap_mode='r') also opens them.
+  """
+    dates = pd.DatetimeIndex(frame.index.to_timestamp() if isinstance(frame.index, pd.PeriodIndex) else frame.index)
+    if not dates.is_monotonic_increasing:
+        raise ValueError('Dates must be sorted')
+    os.makedirs(path)
+    values = np.lib.format.open_memmap(
+        os.path.join(path, VALUES_FILE), mode='w+', dtype=dtype, shape=frame.shape, fortran_order=True,
+    )
+    # column by column, a column of the frame is a contiguous run of the file
+    for i in range(frame.shape[1]):
+        values[:, i] = frame.iloc[:, i].to_numpy(dtype=dtype, na_value=np.nan)
+    values.flush()
+    del values
+    np.save(os.path.join(path, DATES_FILE), dates.values.astype('datetime64[D]'))
+    with open(os.path.join(path, TICKERS_FILE), 'w') as f:
+        json.dump([str(ticker) for ticker in frame.columns], f)
+
+
+class MappedMatrix:
+    """Read-only dates x tickers matrix mapped from disk
+
+    Processes mapping the same file share its pages in the OS cache instead of each holding a copy.
+
+    Attributes
+    ----------
+    values: np.memmap
+      Read-only values, dates x tickers
+    dates: pd.DatetimeIndex
+      Sorted dates of the rows
+    tickers: pd.Index
+      Tickers of the columns
+
+    Notes
+    -----
+      Selections are views of the mapped file whenever possible, see get_values().
+      They are read-only, compute new arrays instead of modifying them in place.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.values = np.load(os.path.join(path, VALUES_FILE), mmap_mode='r')
+        self.dates = pd.DatetimeIndex(np.load(os.path.join(path, DATES_FILE)), name='Date')
+        with open(os.path.join(path, TICKERS_FILE), 'r') as f:
+            self.tickers = pd.Index(json.load(f), name='Ticker')
+
+    def __len__(self):
+        return len(self.dates)
+
+    @property
+    def shape(self):
+        return self.values.shape
+
+    def get_rows(self, start=None, end=None):
+        """Slice of the rows between two dates, inclusive"""
+        first = 0 if start is None else self.dates.searchsorted(pd.Timestamp(start), side='left')
+        last = len(self.dates) if end is None else self.dates.searchsorted(pd.Timestamp(end), side='right')
+        return slice(first, last)
+
+    def get_columns(self, tickers=None):
+        """Slice or positions of the columns of tickers
+
+    Raises
+    ------
+    KeyError
+      If some tickers are not in the matrix
+    """
+        if tickers is None:
+            return slice(None)
+        positions = self.tickers.get_indexer(list(tickers))
+        if (positions < 0).any():
+            missing = [ticker for ticker, position in zip(tickers, positions) if position < 0]
+            raise KeyError(f"Tickers not in the matrix: {', '.join(map(str, missing))}")
+        if len(positions) and (np.diff(positions) == 1).all():
+            # consecutive columns are selected by a slice, which does not copy
+            return slice(positions[0], positions[-1] + 1)
+        return positions
+
+    def get_values(self, start=None, end=None, tickers=None):
+        """Values between two dates of some tickers
+
+    Parameters
+    ----------
+    start: str or datetime-like, optional, default=None
+      First date, the first row if None
+    end: str or datetime-like, optional, default=None
+      Last date, inclusive, the last row if None
+    tickers: list, optional, default=None
+      Tickers in the order of the columns, all tickers if None
+
+    Returns
+    -------
+    np.ndarray
+      Read-only view of the mapped file when the tickers are consecutive columns of the matrix (or all of them),
+      otherwise a copy of the selected columns only
+    """
+        return self._take(self.get_rows(start, end), self.get_columns(tickers))
+
+    def get_frame(self, start=None, end=None, tickers=None):
+        """DataFrame of get_values() indexed by date, with the tickers as columns, sharing its memory"""
+        rows = self.get_rows(start, end)
+        columns = self.get_columns(tickers)
+        values = self._take(rows, columns)
+        return pd.DataFrame(values, index=self.dates[rows], columns=self.tickers[columns], copy=False)
+
+    def _take(self, rows, columns):
+        if isinstance(columns, slice):
+            return np.asarray(self.values[rows, columns])
+        # a column is contiguous on disk, so taking columns reads only their pages
+        return np.take(self.values[rows], columns, axis=1)
+
+
+def open_matrix(path):
+    """Map a matrix written by write_matrix()"""
+    return MappedMatrix(path)
@@ -1,10 +1,18 @@
+from collections import namedtuple
+
 import numpy as np
 import pandas as pd
 import matplotlib.pyplot as plt
+from scipy.linalg import cho_factor, cho_solve
 from scipy.optimize import minimize
 import matplotlib.patches as mpatches
 from matplotlib.lines import Line2D
 
+from . import profiling
+
+# Inverted covariance matrix and the two funds that span the frontier without weight bounds
+FrontierTerms = namedtuple('FrontierTerms', ['inverse', 'inverse_ones', 'inverse_returns', 'a', 'b', 'c', 'd'])
+
 def get_portfolio_returns(weights, returns_series):
   """Compute portfolio returns
 
@@ -69,24 +77,194 @@ def plot_efficient_frontier_2assets(number_of_portfolios, returns_series, covari
   return
 
 
+@profiling.timed('mvo.get_optimal_weights')
 def get_optimal_weights(number_of_portfolios, expected_returns, covariance_matrix):
   """Computes a list of optimal weights for a list of given expected returns
 
   Parameters
   ----------
-  number_of_portfolios
-  expected_returns
-  covariance_matrix
+  number_of_portfolios: int
+    Number of points on the efficient frontier
+  expected_returns: pd.Series or array_like
+    Expected returns of assets
+  covariance_matrix: pd.DataFrame or array_like
+    Covariance-variance matrix for assets in portfolio
 
   Returns
   -------
+  list
+    Long only weights of minimum volatility portfolios for target returns from the lowest to the highest expected return
 
+  Notes
+  -----
+  The covariance matrix is inverted once through its Cholesky factor. A point is taken from the analytic two-fund solution when none of its
+  weights is negative, otherwise it is solved with an active-set method started from the neighbouring point,
+  so consecutive points cost only a few small linear solves.
   """
+  expected_returns = np.asarray(expected_returns, dtype=np.float64)
+  covariance_matrix = np.asarray(covariance_matrix, dtype=np.float64)
+  terms = get_frontier_terms(expected_returns, covariance_matrix)
   target_returns = np.linspace(expected_returns.min(), expected_returns.max(), number_of_portfolios)
-  weights = [minimize_volatility(target_return, expected_returns, covariance_matrix) for target_return in target_returns]
+  weights = []
+  previous_weights = None
+  for target_return in target_returns:
+    previous_weights = _get_frontier_weights(target_return, expected_returns, covariance_matrix, terms, previous_weights)
+    weights.append(previous_weights)
   return weights
 
 
+@profiling.timed('mvo.get_frontier_terms')
+def get_frontier_terms(expected_returns, covariance_matrix):
+  """Invert the covariance matrix once and solve it for the two funds spanning the unconstrained frontier
+
+  Parameters
+  ----------
+  expected_returns: array_like
+    Expected returns of assets
+  covariance_matrix: array_like
+    Covariance-variance matrix for assets in portfolio
+
+  Returns
+  -------
+  FrontierTerms or None
+    Inverse covariance matrix, solved funds and the scalars a = 1'S^-1 1, b = 1'S^-1 mu, c = mu'S^-1 mu,
+    d = ac - b^2, None if the covariance matrix is not positive definite or all expected returns are equal
+  """
+  expected_returns = np.asarray(expected_returns, dtype=np.float64)
+  inverse = _get_inverse(covariance_matrix)
+  if inverse is None:
+    return None
+  inverse_ones = inverse.sum(axis=1)
+  inverse_returns = inverse @ expected_returns
+  a = inverse_ones.sum()
+  b = expected_returns @ inverse_ones
+  c = expected_returns @ inverse_returns
+  d = a * c - b ** 2
+  if d <= 1e-12 * a * c:
+    return None
+  return FrontierTerms(inverse, inverse_ones, inverse_returns, a, b, c, d)
+
+
+def _get_inverse(covariance_matrix):
+  covariance_matrix = np.asarray(covariance_matrix, dtype=np.float64)
+  try:
+    factor = cho_factor(covariance_matrix)
+  except np.linalg.LinAlgError:
+    return None
+  return cho_solve(factor, np.eye(covariance_matrix.shape[0]))
+
+
+def _as_long_only(weights, tolerance=1e-10):
+  # Analytic weights are optimal for the long only problem as well when none of them is negative
+  if weights.min() < -tolerance:
+    return None
+  weights = np.clip(weights, 0, None)
+  return weights / weights.sum()
+
+
+def _get_frontier_weights(target_return, expected_returns, covariance_matrix, terms, previous_weights=None):
+  if terms is not None:
+    weights = _as_long_only(((terms.c - terms.b * target_return) * terms.inverse_ones
+                             + (terms.a * target_return - terms.b) * terms.inverse_returns) / terms.d)
+    if weights is not None:
+      return weights
+  lowest, highest = expected_returns.argmin(), expected_returns.argmax()
+  if target_return <= expected_returns[lowest] or target_return >= expected_returns[highest]:
+    # only assets with the extreme expected return can be held
+    is_held = expected_returns == expected_returns[lowest if target_return <= expected_returns[lowest] else highest]
+    weights = np.zeros_like(expected_returns)
+    weights[is_held] = get_gmv_portfolio(covariance_matrix[np.ix_(is_held, is_held)]) if is_held.sum() > 1 else 1
+    return weights
+  # feasible start: move from the neighbouring point towards the asset with the highest or the lowest expected return
+  if previous_weights is None:
+    previous_weights = np.zeros_like(expected_returns)
+    previous_weights[lowest] = 1
+  previous_return = previous_weights @ expected_returns
+  extreme = highest if target_return >= previous_return else lowest
+  step = (target_return - previous_return) / (expected_returns[extreme] - previous_return)
+  initial_guess = (1 - step) * previous_weights
+  initial_guess[extreme] += step
+  weights = _solve_long_only_qp(
+    covariance_matrix, np.vstack([expected_returns, np.ones_like(expected_returns)]), initial_guess,
+    inverse=terms.inverse if terms is not None else None)
+  if weights is None:
+    weights = minimize_volatility(target_return, expected_returns, covariance_matrix, initial_guess=initial_guess)
+  return weights
+
+
+def _solve_long_only_qp(covariance_matrix, constraints, initial_guess, inverse=None, tolerance=1e-10):
+  """Minimize w'Sw subject to constraints @ w = const and w >= 0 with a primal active-set method
+
+  Parameters
+  ----------
+  covariance_matrix: np.ndarray
+    Covariance-variance matrix for assets in portfolio
+  constraints: np.ndarray
+    Matrix of the equality constraints, one row per constraint
+  initial_guess: np.ndarray
+    Feasible weights, the weights at zero form the initial working set
+  inverse: np.ndarray, optional, default=None
+    Inverse of the covariance matrix, lets every iteration solve a system of the size of the smaller
+    of the free and the working set instead of the free set only
+  tolerance: float, optional, default=1e-10
+    Tolerance for a zero step and for negative multipliers
+
+  Returns
+  -------
+  np.ndarray or None
+    Optimal weights, None if the method did not converge, e.g. for degenerate constraints
+  """
+  number_of_assets = initial_guess.shape[0]
+  number_of_constraints = constraints.shape[0]
+  inverse_constraints = inverse @ constraints.T if inverse is not None else None
+  weights = np.clip(initial_guess, 0, None)
+  is_active = weights <= 0
+  for _ in range(5 * number_of_assets + 10):
+    free, active = np.flatnonzero(~is_active), np.flatnonzero(is_active)
+    is_full_rank = np.linalg.matrix_rank(constraints[:, free]) == number_of_constraints
+    step = np.zeros(number_of_assets)
+    if inverse is not None and active.shape[0] < free.shape[0]:
+      # the minimum of w'Sw on the working set is S^-1 C'(C S^-1 C')^-1 d with C = [constraints; unit rows of active]
+      inverse_working = np.hstack([inverse_constraints, inverse[:, active]])
+      schur = np.vstack([constraints @ inverse_working, inverse_working[active]])
+      targets = np.concatenate([constraints @ weights, np.zeros(active.shape[0])])
+      solve = np.linalg.solve if is_full_rank else lambda a, b: np.linalg.lstsq(a, b, rcond=None)[0]
+      solution = solve(schur, targets)
+      step[free] = (inverse_working @ solution)[free] - weights[free]
+      bound_multipliers = solution[number_of_constraints:]
+    else:
+      size = free.shape[0]
+      gradient = covariance_matrix @ weights
+      kkt = np.zeros((size + number_of_constraints, size + number_of_constraints))
+      kkt[:size, :size] = covariance_matrix[np.ix_(free, free)]
+      kkt[:size, size:] = constraints[:, free].T
+      kkt[size:, :size] = constraints[:, free]
+      rhs = np.concatenate([-gradient[free], np.zeros(number_of_constraints)])
+      solve = np.linalg.solve if is_full_rank else lambda a, b: np.linalg.lstsq(a, b, rcond=None)[0]
+      solution = solve(kkt, rhs)
+      step[free] = solution[:size]
+      bound_multipliers = gradient[active] + constraints[:, active].T @ solution[size:]
+    if np.abs(step).max() <= tolerance:
+      # release the bound with the most negative multiplier, stop when there is none
+      if not active.shape[0] or bound_multipliers.min() >= -tolerance:
+        return weights
+      is_active[active[bound_multipliers.argmin()]] = False
+      continue
+    is_decreasing = step < 0
+    ratios = -weights[is_decreasing] / step[is_decreasing]
+    if ratios.size and ratios.min() < 1:
+      # the step is blocked by a weight reaching zero
+      blocking = ratios.argmin()
+      weights += ratios[blocking] * step
+      blocking_asset = np.flatnonzero(is_decreasing)[blocking]
+      weights[blocking_asset] = 0
+      is_active[blocking_asset] = True
+    else:
+      weights += step
+  return None
+
+
+@profiling.timed('mvo.plot_efficient_frontier')
 def plot_efficient_frontier(number_of_portfolios, expected_returns, covariance_matrix, risk_free_rate=0, show_cml=False, show_ew_portfolio=False, show_gmv_portfolio=False, style='.-', *args):
   other_data=[]
   weights = get_optimal_weights(number_of_portfolios, expected_returns, covariance_matrix)
@@ -137,22 +315,47 @@ def plot_efficient_frontier(number_of_portfolios, expected_returns, covariance_m
   return chart, other_data
 
 
-def minimize_volatility(target_return, expected_returns, covariance_matrix):
+@profiling.timed('mvo.minimize_volatility')
+def minimize_volatility(target_return, expected_returns, covariance_matrix, initial_guess=None):
+  """Computes long only weights with minimal volatility for a target return with SLSQP
+
+  Parameters
+  ----------
+  target_return: float
+    Target portfolio return
+  expected_returns: pd.Series or array_like
+    Expected returns of assets
+  covariance_matrix: pd.DataFrame or array_like
+    Covariance-variance matrix for assets in portfolio
+  initial_guess: array_like, optional, default=None
+    Weights to start from, e.g. the solution for a close target return, equally weighted portfolio if None
+
+  Returns
+  -------
+  np.ndarray
+    Weights of assets
+  """
+  expected_returns = np.asarray(expected_returns, dtype=np.float64)
+  covariance_matrix = np.asarray(covariance_matrix, dtype=np.float64)
   number_of_assets = expected_returns.shape[0]  # get number of assets from returns vector
-  initial_guess = np.repeat(1/number_of_assets, number_of_assets)  # start with equally weighted portfolio
+  if initial_guess is None:
+    initial_guess = np.repeat(1/number_of_assets, number_of_assets)  # start with equally weighted portfolio
   weight_constraints = ((0.0, 1.0),) * number_of_assets  # set constraints for each asset, bottom and top
   return_equals_target = {  # condition #1 - use only those returns where calculated returns equal target returns
     'type': 'eq',
     'args': (expected_returns,),
-    'fun': lambda weights, expected_returns: target_return - get_portfolio_returns(weights, expected_returns)
+    'fun': lambda weights, expected_returns: target_return - get_portfolio_returns(weights, expected_returns),
+    'jac': lambda weights, expected_returns: -expected_returns
   }
   weights_sum_to_one = {  # condition #2 - all weights must add up to 1, i.e. no shorting or leverage
     'type': 'eq',
-    'fun': lambda weights: np.sum(weights) - 1
+    'fun': lambda weights: np.sum(weights) - 1,
+    'jac': lambda weights: np.ones_like(weights)
   }
   results = minimize(
                       get_portfolio_volatility, initial_guess,
                       args=(covariance_matrix,),
+                      jac=_get_volatility_gradient,
                       method="SLSQP",
                       options={"disp": False},
                       constraints=(return_equals_target, weights_sum_to_one),
@@ -161,13 +364,62 @@ def minimize_volatility(target_return, expected_returns, covariance_matrix):
   return results.x
 
 
+def _get_volatility_gradient(weights, covariance_matrix):
+  return covariance_matrix @ weights / get_portfolio_volatility(weights, covariance_matrix)
+
+
+@profiling.timed('mvo.maximize_sharpe_ratio')
 def maximize_sharpe_ratio(risk_free_rate, expected_returns, covariance_matrix):
+  """Computes long only weights of the portfolio with the maximal Sharpe Ratio
+
+  Parameters
+  ----------
+  risk_free_rate: float
+    Risk Free rate
+  expected_returns: pd.Series or array_like
+    Expected returns of assets
+  covariance_matrix: pd.DataFrame or array_like
+    Covariance-variance matrix for assets in portfolio
+
+  Returns
+  -------
+  np.ndarray
+    Weights of assets
+
+  Notes
+  -----
+  The analytic tangency portfolio is used when none of its weights is negative, otherwise the equivalent problem
+  min y'Sy subject to (mu - rf)'y = 1, y >= 0 is solved with an active-set method and w = y / sum(y).
+  SLSQP is only the last resort, e.g. when no asset beats the risk free rate.
+  """
+  expected_returns = np.asarray(expected_returns, dtype=np.float64)
+  covariance_matrix = np.asarray(covariance_matrix, dtype=np.float64)
+  excess_returns = expected_returns - risk_free_rate
+  inverse = _get_inverse(covariance_matrix)
+  if inverse is not None:
+    weights = inverse @ excess_returns
+    if weights.sum() > 0:
+      weights = _as_long_only(weights / weights.sum())
+      if weights is not None:
+        return weights
+  best = excess_returns.argmax()
+  if excess_returns[best] > 0:
+    initial_guess = np.zeros_like(excess_returns)
+    initial_guess[best] = 1 / excess_returns[best]
+    weights = _solve_long_only_qp(covariance_matrix, excess_returns[np.newaxis, :], initial_guess, inverse=inverse)
+    if weights is not None:
+      return weights / weights.sum()
+  return _maximize_sharpe_ratio_slsqp(risk_free_rate, expected_returns, covariance_matrix)
+
+
+def _maximize_sharpe_ratio_slsqp(risk_free_rate, expected_returns, covariance_matrix):
   number_of_assets = expected_returns.shape[0]  # get number of assets from returns vector
   initial_guess = np.repeat(1/number_of_assets, number_of_assets)  # start with equally weighted portfolio
   weight_constraints = ((0.0, 1.0),) * number_of_assets  # set constraints for each asset, bottom and top
   all_weights_sum_to_one = {
     'type': 'eq',
-    'fun': lambda weights: np.sum(weights) - 1
+    'fun': lambda weights: np.sum(weights) - 1,
+    'jac': lambda weights: np.ones_like(weights)
   }
 
   def get_negative_sharpe_ratio(weights, risk_free_rate, expected_returns, covariance_matrix):
@@ -175,9 +427,15 @@ def maximize_sharpe_ratio(risk_free_rate, expected_returns, covariance_matrix):
     portfolio_volatility = get_portfolio_volatility(weights, covariance_matrix)
     return -(portfolio_returns - risk_free_rate) / portfolio_volatility
 
+  def get_negative_sharpe_ratio_gradient(weights, risk_free_rate, expected_returns, covariance_matrix):
+    portfolio_returns = get_portfolio_returns(weights, expected_returns)
+    portfolio_volatility = get_portfolio_volatility(weights, covariance_matrix)
+    return -(expected_returns - (portfolio_returns - risk_free_rate) * (covariance_matrix @ weights) / portfolio_volatility**2) / portfolio_volatility
+
   results = minimize(
                       get_negative_sharpe_ratio, initial_guess,
                       args=(risk_free_rate, expected_returns, covariance_matrix,),
+                      jac=get_negative_sharpe_ratio_gradient,
                       method="SLSQP",
                       options={"disp" : False},
                       constraints=(all_weights_sum_to_one),
@@ -186,15 +444,19 @@ def maximize_sharpe_ratio(risk_free_rate, expected_returns, covariance_matrix):
   return results.x
 
 
+@profiling.timed('mvo.get_gmv_portfolio')
 def get_gmv_portfolio(covariance_matrix):
-  """
+  """Computes long only weights of the global minimum volatility portfolio
 
   Parameters
   ----------
-  covariance_matrix
+  covariance_matrix: pd.DataFrame or array_like
+    Covariance-variance matrix for assets in portfolio
 
   Returns
   -------
+  np.ndarray
+    Weights of assets
 
   Notes
   -----
@@ -202,4 +464,4 @@ def get_gmv_portfolio(covariance_matrix):
    to maximize the Sharpe Ratio of the portfolio is to minimize the volatility of this portfolio
   """
   number_of_assets = covariance_matrix.shape[0]
-  return maximize_sharpe_ratio(0, np.repeat(1, number_of_assets), covariance_matrix)
\ No newline at end of file
+  return maximize_sharpe_ratio(0, np.repeat(1, number_of_assets), covariance_matrix)
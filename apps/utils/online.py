@@ -0,0 +1,246 @@
+import warnings
+
+import numpy as np
+import pandas as pd
+from scipy.stats import norm
+
+
+class OnlineStats:
+    """Streaming accumulator of the statistics of get_portfolio_stat_summary
+
+    Attributes
+    ----------
+    columns: pd.Index
+      Assets, one per column of the returns
+    periods: int
+      Number of rows seen, missing returns included
+    count: np.ndarray
+      Number of valid returns per asset
+
+    Notes
+    -----
+      Rows are folded in one at a time or in blocks with update(). A block is summarized on its own and merged
+      with the Welford/Pebay formulas for the mean and the central moments M2-M4, and for the pairwise co-moments
+      of the covariance. Log wealth keeps its total, running peak, trough and maximum drawdown. Historic CVaR needs
+      the lowest returns, so the tail_size lowest returns of every asset are kept, which is exact while
+      significance_level % of the valid returns fit in the tail. Memory and the cost of summary() depend only on
+      the number of assets, not on the number of rows.
+    """
+
+    def __init__(self, columns, risk_free_rate=0.03, periods_per_year=255, significance_level=5, tail_size=1024):
+        self.columns = pd.Index(columns)
+        self.risk_free_rate = risk_free_rate
+        self.periods_per_year = periods_per_year
+        self.significance_level = significance_level
+        self.tail_size = tail_size
+        number_of_assets = len(self.columns)
+        self.periods = 0
+        self.count = np.zeros(number_of_assets)
+        self._mean = np.zeros(number_of_assets)
+        self._moments = np.zeros((3, number_of_assets))  # M2, M3, M4
+        self._has_missing = np.zeros(number_of_assets, dtype=bool)
+        # pairwise counts, means of asset i over the rows where j is valid too, and co-moments
+        self._pair_count = np.zeros((number_of_assets, number_of_assets))
+        self._pair_mean = np.zeros((number_of_assets, number_of_assets))
+        self._comoment = np.zeros((number_of_assets, number_of_assets))
+        self._log_wealth = np.zeros(number_of_assets)
+        self._peak = np.full(number_of_assets, -np.inf)
+        self._trough = np.full(number_of_assets, np.inf)
+        self._drawdown = np.full(number_of_assets, np.inf)
+        self._excess_log_growth = np.zeros(number_of_assets)
+        self._tail = np.empty((0, number_of_assets))  # lowest returns, +inf where an asset has fewer
+        self._is_tail_cut = np.zeros(number_of_assets, dtype=bool)
+
+    @classmethod
+    def from_returns(cls, returns_series, **kwargs):
+        """Accumulator of a whole returns history, see get_portfolio_stat_summary() for the arguments"""
+        if isinstance(returns_series, pd.Series):
+            returns_series = returns_series.to_frame()
+        return cls(returns_series.columns, **kwargs).update(returns_series)
+
+    def update(self, returns):
+        """Fold in new rows of returns
+
+    Parameters
+    ----------
+    returns: pd.DataFrame, pd.Series or array_like
+      One row (a Series indexed by the columns or a 1-d array) or a block of rows, in time order
+
+    Returns
+    -------
+    OnlineStats
+      self, updated in place
+    """
+        if isinstance(returns, pd.DataFrame):
+            values = returns.reindex(columns=self.columns).to_numpy(dtype=np.float64)
+        elif isinstance(returns, pd.Series):
+            values = returns.reindex(self.columns).to_numpy(dtype=np.float64)[np.newaxis, :]
+        else:
+            values = np.atleast_2d(np.asarray(returns, dtype=np.float64))
+        if values.shape[0]:
+            self.merge(self._summarize_block(values))
+        return self
+
+    def _summarize_block(self, values):
+        block = OnlineStats(self.columns, self.risk_free_rate, self.periods_per_year, self.significance_level,
+                            self.tail_size)
+        mask = np.isnan(values)
+        valid = (~mask).astype(np.float64)
+        filled = np.where(mask, 0., values)
+        block.periods = values.shape[0]
+        block.count = valid.sum(axis=0)
+        block._has_missing = mask.any(axis=0)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            block._mean = np.where(block.count > 0, filled.sum(axis=0) / block.count, 0.)
+            deviations = np.where(mask, 0., values - block._mean)
+            block._moments = np.array([(deviations**power).sum(axis=0) for power in (2, 3, 4)])
+            block._pair_count = valid.T @ valid
+            # mean deviation of asset i over the rows where asset j is valid too
+            pair_deviation = np.where(block._pair_count > 0, (deviations.T @ valid) / block._pair_count, 0.)
+        # co-moment around the pairwise means: sum d_i d_j - n_ij mean_i|j mean_j|i, with deviations for precision
+        block._comoment = deviations.T @ deviations - block._pair_count * pair_deviation * pair_deviation.T
+        block._pair_mean = pair_deviation + block._mean[:, np.newaxis]
+
+        log_wealth = np.cumsum(np.log1p(filled), axis=0)
+        block._log_wealth = log_wealth[-1].copy()
+        # the wealth index skips missing returns, so the dates before the first valid return are not a peak
+        log_wealth[mask] = np.nan
+        block._peak = np.fmax.reduce(log_wealth, axis=0, initial=-np.inf)
+        block._trough = np.fmin.reduce(log_wealth, axis=0, initial=np.inf)
+        block._drawdown = np.fmin.reduce(log_wealth - np.fmax.accumulate(log_wealth, axis=0), axis=0, initial=np.inf)
+        risk_free_rate_per_period = (1 + self.risk_free_rate)**(1 / self.periods_per_year) - 1
+        block._excess_log_growth = np.where(mask, 0., np.log1p(values - risk_free_rate_per_period)).sum(axis=0)
+        block._tail = np.where(mask, np.inf, values)
+        block._trim_tail()
+        return block
+
+    def _trim_tail(self):
+        if self._tail.shape[0] > self.tail_size:
+            self._is_tail_cut |= np.isfinite(self._tail).sum(axis=0) > self.tail_size
+            self._tail = np.partition(self._tail, self.tail_size - 1, axis=0)[:self.tail_size]
+
+    def merge(self, other):
+        """Fold in the statistics of the rows that follow the rows of this accumulator
+
+    Parameters
+    ----------
+    other: OnlineStats
+      Accumulator of the same columns and parameters, its rows come after the rows of self
+
+    Returns
+    -------
+    OnlineStats
+      self, updated in place
+    """
+        count_a, count_b = self.count, other.count
+        count = count_a + count_b
+        with np.errstate(divide='ignore', invalid='ignore'):
+            delta = other._mean - self._mean
+            m2_a, m3_a, m4_a = self._moments
+            m2_b, m3_b, m4_b = other._moments
+            # terms of the Pebay formulas, zero when either side is empty
+            ratio = np.where(count > 0, count_a * count_b / count, 0.)
+            share_b = np.where(count > 0, count_b / count, 0.)
+            share_a = np.where(count > 0, count_a / count, 0.)
+            m2 = m2_a + m2_b + delta**2 * ratio
+            m3 = (m3_a + m3_b + delta**3 * ratio * (share_a - share_b)
+                  + 3 * delta * (share_a * m2_b - share_b * m2_a))
+            m4 = (m4_a + m4_b + delta**4 * ratio * (share_a**2 - share_a * share_b + share_b**2)
+                  + 6 * delta**2 * (share_a**2 * m2_b + share_b**2 * m2_a)
+                  + 4 * delta * (share_a * m3_b - share_b * m3_a))
+            self._mean = self._mean + delta * share_b
+            self._moments = np.array([m2, m3, m4])
+
+            pair_count = self._pair_count + other._pair_count
+            pair_delta = other._pair_mean - self._pair_mean
+            pair_ratio = np.where(pair_count > 0, self._pair_count * other._pair_count / pair_count, 0.)
+            self._comoment = self._comoment + other._comoment + pair_delta * pair_delta.T * pair_ratio
+            self._pair_mean = self._pair_mean + pair_delta * np.where(pair_count > 0, other._pair_count / pair_count, 0.)
+            self._pair_count = pair_count
+        self.count = count
+
+        # the log wealth of other starts where the log wealth of self ends
+        self._drawdown = np.minimum(
+            np.minimum(self._drawdown, other._drawdown), self._log_wealth + other._trough - self._peak
+        )
+        self._peak = np.maximum(self._peak, self._log_wealth + other._peak)
+        self._trough = np.minimum(self._trough, self._log_wealth + other._trough)
+        self._log_wealth = self._log_wealth + other._log_wealth
+        self._excess_log_growth = self._excess_log_growth + other._excess_log_growth
+        self.periods += other.periods
+        self._has_missing |= other._has_missing
+        self._is_tail_cut |= other._is_tail_cut
+        self._tail = np.concatenate([self._tail, other._tail])
+        self._trim_tail()
+        return self
+
+    def covariance(self):
+        """Sample covariance of the returns over pairwise complete rows, like pd.DataFrame.cov()"""
+        with np.errstate(divide='ignore', invalid='ignore'):
+            covariance = np.where(self._pair_count > 1, self._comoment / (self._pair_count - 1), np.nan)
+        return pd.DataFrame(covariance, index=self.columns, columns=self.columns)
+
+    def _get_historic_cvar(self):
+        quantile = self.significance_level / 100
+        tail = np.sort(self._tail, axis=0)
+        historic_cvar = np.full(len(self.columns), np.nan)
+        for i in np.flatnonzero((self.count > 0) & ~self._has_missing):
+            count = int(self.count[i])
+            # linear interpolation between order statistics, like np.percentile
+            position = (count - 1) * quantile
+            lower = int(np.floor(position))
+            upper = min(lower + 1, count - 1)
+            if upper >= tail.shape[0]:
+                warnings.warn(f'Historic CVaR of {self.columns[i]} needs more than tail_size={self.tail_size} returns')
+                continue
+            historic_var = tail[lower, i] + (tail[upper, i] - tail[lower, i]) * (position - lower)
+            beyond = tail[:, i][tail[:, i] <= historic_var]
+            if self._is_tail_cut[i] and beyond.size == tail.shape[0]:
+                warnings.warn(f'Historic CVaR of {self.columns[i]} needs more than tail_size={self.tail_size} returns')
+                continue
+            historic_cvar[i] = -beyond.mean()
+        return historic_cvar
+
+    def summary(self):
+        """Statistics of all rows seen so far
+
+    Returns
+    -------
+    pd.DataFrame
+      Same table as get_portfolio_stat_summary() of the concatenated rows
+
+    See Also
+    --------
+    stats.get_portfolio_stat_summary()
+    """
+        count = self.count
+        with np.errstate(divide='ignore', invalid='ignore'):
+            m2, m3, m4 = self._moments / count
+            population_std = np.sqrt(m2)
+            sample_std = np.sqrt(np.where(count > 1, self._moments[0] / (count - 1), np.nan))
+            skewness = m3 / population_std**3
+            kurtosis = m4 / population_std**4
+
+            # missing returns count as periods but not as growth
+            growth_exponent = self.periods_per_year / self.periods
+            annualized_returns = np.expm1(self._log_wealth * growth_exponent)
+            annualized_volatility = sample_std * self.periods_per_year**0.5
+            sharpe_ratio = np.expm1(self._excess_log_growth * growth_exponent) / annualized_volatility
+
+            z_score = norm.ppf(self.significance_level / 100)
+            z_score = (z_score + (z_score**2 - 1) * skewness / 6 + (z_score**3 - 3 * z_score) * (kurtosis - 3) / 24
+                       - (2 * z_score**3 - 5 * z_score) * (skewness**2) / 36)
+            mean = np.where(count > 0, self._mean, np.nan)
+            cornish_fisher_var = -(mean + z_score * population_std)
+        drawdown = np.where(count > 0, np.expm1(self._drawdown), np.nan)
+
+        return pd.DataFrame({
+            "Annualized Returns": annualized_returns,
+            "Annualized Volatility": annualized_volatility,
+            "Skewness": skewness,
+            "Kurtosis": kurtosis,
+            f"Cornish Fischer VaR ({self.significance_level}%)": cornish_fisher_var,
+            f"Historic CVaR ({self.significance_level}%)": self._get_historic_cvar(),
+            "Sharpe Ratio": sharpe_ratio,
+            "Maximum Drawdown": drawdown,
+        }, index=self.columns)
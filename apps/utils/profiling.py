@@ -0,0 +1,307 @@
+import contextlib
+import contextvars
+import threading
+import time
+import tracemalloc
+
+# recorder of the request (or job, or shell session) running in the current thread, None when nothing is recorded
+_recorder = contextvars.ContextVar('profiling_recorder', default=None)
+
+
+class Stage:
+    """Totals of the calls of one instrumented stage"""
+
+    __slots__ = ('calls', 'wall', 'cpu', 'allocated', 'max_wall')
+
+    def __init__(self):
+        self.calls = 0
+        self.wall = 0.
+        self.cpu = 0.
+        self.allocated = 0
+        self.max_wall = 0.
+
+    def add(self, wall, cpu, allocated=0, calls=1):
+        self.calls += calls
+        self.wall += wall
+        self.cpu += cpu
+        self.allocated = max(self.allocated, allocated)
+        self.max_wall = max(self.max_wall, wall)
+
+    def to_dict(self):
+        return {
+            'calls': self.calls,
+            'wall': self.wall,
+            'cpu': self.cpu,
+            'allocated': self.allocated,
+            'max_wall': self.max_wall,
+        }
+
+
+class Recorder:
+    """Wall time, CPU time and allocations of the stages run while it is active, and cache hits and misses
+
+    Attributes
+    ----------
+    stages: dict
+      {stage name: Stage}, in the order the stages were first entered
+    caches: dict
+      {cache name: {'hits': int, 'misses': int}}
+    wall: float
+      Seconds between the start and the end of recording, set when it ends
+    cpu: float
+      CPU seconds of the recording thread, set when it ends
+    trace_allocations: bool
+      Whether the peak memory allocated by the stages is recorded, needs tracemalloc to be tracing
+
+    Notes
+    -----
+      CPU time is the time of the thread running the stage, work done by other threads
+      (e.g. the download pool of reader.fetch_many) only shows in the wall time.
+      Stages can be nested, the time of an inner stage is also counted in the outer one.
+      A stage entered again while it is running (recursion) is counted once.
+    """
+
+    def __init__(self, trace_allocations=False):
+        self.stages = {}
+        self.caches = {}
+        self.wall = None
+        self.cpu = None
+        self.trace_allocations = trace_allocations and tracemalloc.is_tracing()
+        self._frames = []  # [name, start wall, start cpu, start memory, peak memory] of the running stages
+        self._depth = {}
+
+    def start(self, name):
+        depth = self._depth.get(name, 0)
+        self._depth[name] = depth + 1
+        if depth:
+            return
+        self.stages.setdefault(name, Stage())
+        current = peak = 0
+        if self.trace_allocations:
+            current, peak = tracemalloc.get_traced_memory()
+            # the peak is reset for the new stage, the running stages keep the peak reached so far
+            for frame in self._frames:
+                frame[4] = max(frame[4], peak)
+            tracemalloc.reset_peak()
+            peak = current
+        self._frames.append([name, time.perf_counter(), time.thread_time(), current, peak])
+
+    def stop(self, name):
+        depth = self._depth.get(name, 0)
+        if depth > 1:
+            self._depth[name] = depth - 1
+            return
+        self._depth.pop(name, None)
+        if not self._frames or self._frames[-1][0] != name:
+            # started before recording began
+            return
+        _, wall, cpu, start_memory, peak = self._frames.pop()
+        wall = time.perf_counter() - wall
+        cpu = time.thread_time() - cpu
+        allocated = 0
+        if self.trace_allocations:
+            peak = max(peak, tracemalloc.get_traced_memory()[1])
+            allocated = peak - start_memory
+            if self._frames:
+                self._frames[-1][4] = max(self._frames[-1][4], peak)
+        self.stages[name].add(wall, cpu, allocated)
+
+    def record_cache(self, name, hit):
+        counts = self.caches.setdefault(name, {'hits': 0, 'misses': 0})
+        counts['hits' if hit else 'misses'] += 1
+
+    def to_dict(self):
+        return {
+            'wall': self.wall,
+            'cpu': self.cpu,
+            'stages': {name: stage.to_dict() for name, stage in self.stages.items()},
+            'caches': {name: dict(counts) for name, counts in self.caches.items()},
+        }
+
+
+def get_recorder():
+    """Recorder of the current thread, None when nothing is recorded"""
+    return _recorder.get()
+
+
+@contextlib.contextmanager
+def recording(trace_allocations=False):
+    """Record the stages run in the block
+
+  Parameters
+  ----------
+  trace_allocations: bool, optional, default=False
+    Record the peak memory allocated by the stages, only when tracemalloc is tracing
+
+  Yields
+  ------
+  Recorder
+    Filled as the stages run, wall and cpu are set when the block ends
+  """
+    recorder = Recorder(trace_allocations)
+    token = _recorder.set(recorder)
+    wall, cpu = time.perf_counter(), time.thread_time()
+    try:
+        yield recorder
+    finally:
+        recorder.wall = time.perf_counter() - wall
+        recorder.cpu = time.thread_time() - cpu
+        _recorder.reset(token)
+
+
+class timed(contextlib.ContextDecorator):
+    """Record the time spent in a block or function as a stage of the current recorder
+
+  Parameters
+  ----------
+  name: str
+    Name of the stage, 'module.function' by convention
+
+  Examples
+  --------
+    >>> @timed('mvo.get_gmv_portfolio')
+    ... def get_gmv_portfolio(covariance_matrix): ...
+
+    >>> with timed('reader.read_csv'):
+    ...     prices = pd.read_csv(path)
+
+  Notes
+  -----
+    Does nothing but look up the recorder when nothing is recorded.
+  """
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        recorder = _recorder.get()
+        if recorder is not None:
+            recorder.start(self.name)
+        return self
+
+    def __exit__(self, *exc_info):
+        recorder = _recorder.get()
+        if recorder is not None:
+            recorder.stop(self.name)
+        return False
+
+
+def record_cache(name, hit):
+    """Count a hit or miss of a cache in the current recorder"""
+    recorder = _recorder.get()
+    if recorder is not None:
+        recorder.record_cache(name, hit)
+
+
+def instrument(owner, attributes, prefix):
+    """Time methods or functions of a class or module that cannot be decorated in place, e.g. third-party code
+
+  Parameters
+  ----------
+  owner: type or module
+    Class or module defining the attributes
+  attributes: list of str
+    Names of the methods or functions to time, recorded as the stages prefix.name
+  prefix: str
+    Prefix of the stage names
+
+  Notes
+  -----
+    Instrumenting twice is harmless, the attributes are only wrapped once.
+  """
+    for attribute in attributes:
+        function = getattr(owner, attribute)
+        if getattr(function, '_profiling_stage', None) is not None:
+            continue
+        name = f'{prefix}.{attribute}'
+        wrapper = timed(name)(function)
+        wrapper._profiling_stage = name
+        setattr(owner, attribute, wrapper)
+
+
+class Metrics:
+    """Thread safe totals of the recordings of every view since the process started or the last reset"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._views = {}
+
+    def add(self, view, recorder):
+        with self._lock:
+            totals = self._views.setdefault(view, {
+                'requests': 0, 'wall': 0., 'cpu': 0., 'max_wall': 0., 'stages': {}, 'caches': {},
+            })
+            totals['requests'] += 1
+            totals['wall'] += recorder.wall
+            totals['cpu'] += recorder.cpu
+            totals['max_wall'] = max(totals['max_wall'], recorder.wall)
+            for name, stage in recorder.stages.items():
+                total = totals['stages'].setdefault(name, Stage())
+                total.add(stage.wall, stage.cpu, stage.allocated, stage.calls)
+                total.max_wall = max(total.max_wall, stage.max_wall)
+            for name, counts in recorder.caches.items():
+                total = totals['caches'].setdefault(name, {'hits': 0, 'misses': 0})
+                total['hits'] += counts['hits']
+                total['misses'] += counts['misses']
+
+    def snapshot(self):
+        """Totals and means per view
+
+    Returns
+    -------
+    dict
+      {view: {'requests', 'wall', 'cpu', 'mean_wall', 'max_wall', 'stages', 'caches'}}, stages have the number
+      of calls, total wall and cpu seconds, the largest allocation of a request and the slowest call
+    """
+        with self._lock:
+            return {
+                view: {
+                    'requests': totals['requests'],
+                    'wall': totals['wall'],
+                    'cpu': totals['cpu'],
+                    'mean_wall': totals['wall'] / totals['requests'],
+                    'max_wall': totals['max_wall'],
+                    'stages': {name: stage.to_dict() for name, stage in totals['stages'].items()},
+                    'caches': {name: dict(counts) for name, counts in totals['caches'].items()},
+                }
+                for view, totals in self._views.items()
+            }
+
+    def reset(self):
+        with self._lock:
+            self._views.clear()
+
+
+# totals of the requests served by the process, filled by the profiling middleware
+metrics = Metrics()
+
+
+def get_server_timing(recorder):
+    """Server-Timing header value of a recording, one metric per stage and cache and the total
+
+  Parameters
+  ----------
+  recorder: Recorder
+    Finished recording
+
+  Returns
+  -------
+  str
+    e.g. 'mvo.get_gmv_portfolio;dur=12.3;desc="cpu 12.1 ms, 1 call", ..., total;dur=80.2;desc="cpu 75.0 ms"'
+  """
+    metrics = []
+    for name, stage in recorder.stages.items():
+        description = f'cpu {stage.cpu * 1000:.1f} ms, {stage.calls} call{"s" if stage.calls > 1 else ""}'
+        if recorder.trace_allocations:
+            description += f', {stage.allocated / 2 ** 20:.1f} MiB'
+        metrics.append(f'{_get_token(name)};dur={stage.wall * 1000:.1f};desc="{description}"')
+    for name, counts in recorder.caches.items():
+        metrics.append(f'{_get_token("cache." + name)};desc="{counts["hits"]} hits, {counts["misses"]} misses"')
+    if recorder.wall is not None:
+        metrics.append(f'total;dur={recorder.wall * 1000:.1f};desc="cpu {recorder.cpu * 1000:.1f} ms"')
+    return ', '.join(metrics)
+
+
+def _get_token(name):
+    # metric names are HTTP tokens, which have no spaces, commas, quotes, semicolons or equal signs
+    return ''.join(character if character.isalnum() or character in '._-' else '_' for character in name)
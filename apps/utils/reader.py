@@ -1,43 +1,355 @@
+import numpy as np
 import pandas as pd
-import fastparquet
 import datetime
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from io import StringIO
+import requests
 import requests_cache
-from eod_historical_data import get_eod_data
-pd.set_option("max_rows", 10)
+from requests.adapters import HTTPAdapter
+from . import store
+from . import profiling
+from .cache import LRUCache
+pd.set_option("display.max_rows", 10)
+
+START_DATE = "2010-01-01"
+END_DATE = "2021-01-01"
+
+EOD_API_URL = os.environ.get("EOD_HISTORICAL_API_URL", "https://eodhistoricaldata.com/api")
+EOD_API_KEY = os.environ.get("EOD_HISTORICAL_API_KEY", "demo")
+MAX_WORKERS = 8  # number of concurrent downloads, also the size of the HTTP connection pool
+RETRIES = 3  # number of attempts per ticker
+RETRY_BACKOFF = 0.5  # seconds, doubled after every failed attempt
+TIMEOUT = 30  # seconds
+MARKET_CACHE_BYTES = int(os.environ.get("MARKET_CACHE_BYTES", 256 * 1024 ** 2))
 
 expire_after = datetime.timedelta(days=10)
 session = requests_cache.CachedSession(cache_name='cache', backend='sqlite', expire_after=expire_after)
+session.mount('https://', HTTPAdapter(pool_connections=MAX_WORKERS, pool_maxsize=MAX_WORKERS))
+session.mount('http://', HTTPAdapter(pool_connections=MAX_WORKERS, pool_maxsize=MAX_WORKERS))
+
+# aligned price and return frames shared by all views of the process,
+# keyed by (tickers, exchange, start, end, store version)
+market_cache = LRUCache(MARKET_CACHE_BYTES, name='market')
+
+
+class QuoteFetchError(Exception):
+    """Raised when quotes of some tickers could not be downloaded
+
+    Attributes
+    ----------
+    failures: dict
+      {ticker: error message}
+    """
+
+    def __init__(self, failures):
+        self.failures = failures
+        super().__init__(f"Failed to fetch quotes for {', '.join(failures)}")
+
+
+def fetch_eod(ticker, exchange, start, end, base_url=EOD_API_URL, api_key=EOD_API_KEY, session=session):
+    """Download daily quotes of a single ticker from EOD Historical Data
+
+  Parameters
+  ----------
+  ticker: str
+    Ticker
+  exchange: str
+    Exchange code
+  start: datetime-like
+    First date
+  end: datetime-like
+    Last date, inclusive
+  base_url: str, optional, default=EOD_API_URL
+    Root URL of the EOD API, can point to a local server serving EOD-format CSV
+  api_key: str, optional, default=EOD_API_KEY
+    EOD API token
+  session: requests.Session, optional
+    Session to send the request with, defaults to the shared cached session
+
+  Returns
+  -------
+  pd.DataFrame
+    Open | High | Low | Close | Adjusted_close | Volume indexed by date
+
+  Raises
+  ------
+  requests.HTTPError
+    If the server does not respond with 200
+  """
+    params = {
+        'api_token': api_key,
+        'from': pd.Timestamp(start).strftime('%Y-%m-%d'),
+        'to': pd.Timestamp(end).strftime('%Y-%m-%d'),
+        'period': 'd',
+    }
+    response = session.get(f'{base_url}/eod/{ticker}.{exchange}', params=params, timeout=TIMEOUT)
+    if response.status_code != requests.codes.ok:
+        # the request URL carries the API token, so it is not part of the message
+        raise requests.HTTPError(f'{response.status_code} {response.reason} for {ticker}.{exchange}', response=response)
+    df = pd.read_csv(StringIO(response.text), index_col=0)
+    # EOD CSV may end with a footer line that is not a date
+    df.index = pd.to_datetime(df.index, format='%Y-%m-%d', errors='coerce')
+    df = df[df.index.notna()]
+    df.index.name = 'Date'
+    return df
+
+
+def _is_retryable(error):
+    if isinstance(error, requests.HTTPError) and error.response is not None:
+        return error.response.status_code == 429 or error.response.status_code >= 500
+    return isinstance(error, requests.RequestException)
+
+
+def _fetch_with_retry(source, ticker, exchange, start, end, retries):
+    delay = RETRY_BACKOFF
+    for attempt in range(retries):
+        try:
+            return source(ticker, exchange, start, end)
+        except Exception as error:
+            if attempt == retries - 1 or not _is_retryable(error):
+                raise
+            time.sleep(delay)
+            delay *= 2
+
+
+@profiling.timed('reader.fetch_many')
+def fetch_many(requested, exchange='US', source=fetch_eod, max_workers=MAX_WORKERS, retries=RETRIES):
+    """Download quotes for many tickers concurrently
+
+  Parameters
+  ----------
+  requested: list
+    List of (ticker, start, end) tuples
+  exchange: str, optional, default='US'
+    Exchange code
+  source: callable, optional, default=fetch_eod
+    Function (ticker, exchange, start, end) -> pd.DataFrame, must be thread safe
+  max_workers: int, optional, default=MAX_WORKERS
+    Maximum number of concurrent downloads
+  retries: int, optional, default=RETRIES
+    Number of attempts per ticker, network errors, 429 and 5xx responses are retried with exponential backoff
+
+  Returns
+  -------
+  tuple
+    list of (ticker, quotes, start, end) for successful downloads and {ticker: error message} for failed ones
+
+  Notes
+  -----
+    A failed ticker does not stop the others, the caller decides what to do with partial results.
+  """
+    fetched, failures = [], {}
+    if not requested:
+        return fetched, failures
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(requested))) as executor:
+        futures = [
+            (ticker, start, end, executor.submit(_fetch_with_retry, source, ticker, exchange, start, end, retries))
+            for ticker, start, end in requested
+        ]
+        for ticker, start, end, future in futures:
+            try:
+                fetched.append((ticker, future.result(), start, end))
+            except Exception as error:
+                failures[ticker] = f'{type(error).__name__}: {error}'
+    return fetched, failures
+
+
+@profiling.timed('reader.load_quotes')
+def load_quotes(tickers, exchange='US', start=START_DATE, end=END_DATE, columns=('Close',), source=fetch_eod):
+    """Load quotes from the local price store, fetching from the source only what the store is missing
+
+  Parameters
+  ----------
+  tickers: list
+    List of tickers
+  exchange: str, optional, default='US'
+    Exchange code
+  start: str or datetime-like, optional
+    First date
+  end: str or datetime-like, optional
+    Last date, inclusive
+  columns: sequence, optional, default=('Close',)
+    Quote columns to read
+  source: callable, optional, default=fetch_eod
+    Function (ticker, exchange, start, end) -> pd.DataFrame used for the missing data
+
+  Returns
+  -------
+  pd.DataFrame
+    Long table of quotes: Date | Ticker | columns
+
+  Raises
+  ------
+  QuoteFetchError
+    If some of the missing quotes could not be downloaded, the downloaded ones are stored anyway
+  """
+    _fetch_missing(tickers, exchange, start, end, source)
+    return store.read_quotes(tickers, exchange, columns=columns, start=start, end=end)
+
 
+def _fetch_missing(tickers, exchange, start, end, source):
+    missing = store.get_missing_ranges(tickers, start, end, exchange)
+    requested = [(ticker, range_start, range_end) for ticker, ranges in missing.items() for range_start, range_end in ranges]
+    fetched, failures = fetch_many(requested, exchange, source)
+    if fetched:
+        store.write_quotes_many(fetched, exchange)
+        invalidate_market_cache(exchange)
+    if failures:
+        raise QuoteFetchError(failures)
 
-def get_quotes(tickers, exchange='US'):
-    port = []
-    port_pct = []
-    for ticker in tickers:
-        df = get_eod_data(ticker, exchange,  start="2010-01-01", end="2021-01-01", session=session)
-        port.append(df['Close'])
-        port_pct.append(df['Close'].pct_change().dropna())
-    port = pd.concat(port, axis=1, ignore_index=False)
-    port_pct = pd.concat(port_pct, axis=1, ignore_index=False)
+
+def refresh_quotes(tickers=None, exchange='US', end=None, source=fetch_eod):
+    """Append the quotes published since the last stored date to the local price store
+
+  Parameters
+  ----------
+  tickers: list, optional, default=None
+    List of tickers, all stored tickers of the exchange if None
+  exchange: str, optional, default='US'
+    Exchange code
+  end: str or datetime-like, optional, default=None
+    Last date to refresh up to, inclusive, today if None
+  source: callable, optional, default=fetch_eod
+    Function (ticker, exchange, start, end) -> pd.DataFrame
+
+  Returns
+  -------
+  tuple
+    {ticker: number of appended rows} and {ticker: error message} for tickers that failed to download
+
+  Notes
+  -----
+    Only the missing tail is requested from the source and stored history is never rewritten,
+    so a refresh costs in proportion to the number of new rows.
+  """
+    requested = [(ticker, start, tail_end) for ticker, (start, tail_end) in store.get_tail_ranges(tickers, end, exchange).items()]
+    fetched, failures = fetch_many(requested, exchange, source)
+    appended = {}
+    if fetched:
+        appended = store.write_quotes_many(fetched, exchange)
+        invalidate_market_cache(exchange)
+    return appended, failures
+
+
+def invalidate_market_cache(exchange=None):
+    """Drop cached frames after the underlying price data has changed
+
+  Parameters
+  ----------
+  exchange: str, optional, default=None
+    Exchange code, drops frames of all exchanges if None
+
+  Returns
+  -------
+  int
+    Number of dropped frames
+  """
+    return market_cache.invalidate(None if exchange is None else lambda key: key[1] == exchange)
+
+
+@profiling.timed('reader.get_quotes')
+def get_quotes(tickers, exchange='US', start=START_DATE, end=END_DATE, source=fetch_eod):
+    """Get aligned close prices and percent changes of many tickers
+
+  Parameters
+  ----------
+  tickers: list
+    List of tickers
+  exchange: str, optional, default='US'
+    Exchange code
+  start: str or datetime-like, optional
+    First date
+  end: str or datetime-like, optional
+    Last date, inclusive
+  source: callable, optional, default=fetch_eod
+    Function (ticker, exchange, start, end) -> pd.DataFrame used for the missing data
+
+  Returns
+  -------
+  tuple
+    (prices, percent changes) DataFrames with tickers as columns and daily periods as index
+
+  Notes
+  -----
+    Frames are cached in memory until the store of the exchange changes and are shared by all callers,
+    copy them before modifying in place.
+  """
+    key = (tuple(tickers), exchange, str(start), str(end), store.get_version(exchange))
+    frames = market_cache.get(key)
+    if frames is None:
+        frames = _get_quotes(tickers, exchange, start, end, source)
+        # the store may have been written while loading, so the frames are cached under the new version
+        market_cache.set(key[:-1] + (store.get_version(exchange),), frames)
+    return frames
+
+
+def _get_quotes(tickers, exchange, start, end, source):
+    quotes = load_quotes(tickers, exchange, start, end, source=source)
+    # percent changes are computed per ticker before aligning the dates, as if every ticker was downloaded separately
+    quotes['Pct'] = quotes.groupby('Ticker')['Close'].pct_change()
+    port = quotes.pivot(index='Date', columns='Ticker', values='Close').reindex(columns=tickers)
+    port_pct = quotes.pivot(index='Date', columns='Ticker', values='Pct').reindex(columns=tickers).dropna(how='all')
     port.columns = tickers
     port_pct.columns = tickers
-    port.index = pd.to_datetime(port.index, format="%Y%m%d")  # convert index to DateTime Series
-    port_pct.index = pd.to_datetime(port_pct.index, format="%Y%m%d")  # convert index to DateTime Series
     port.index = port.index.to_period('D')  # convert DateTime to Periods
     port_pct.index = port_pct.index.to_period('D')  # convert DateTime to Periods
     return port, port_pct
 
-def get_ind(ticker):
-    df = get_eod_data(ticker, 'INDX',  start="2010-01-01", end="2021-01-01", session=session)
-    port = df['Close']
-    port_pct = df['Close'].pct_change().dropna()
-    port.columns = ticker
-    port_pct.columns = ticker
-    port.index = pd.to_datetime(port.index, format="%Y%m%d")  # convert index to DateTime Series
-    port_pct.index = pd.to_datetime(port_pct.index, format="%Y%m%d")  # convert index to DateTime Series
-    port.index = port.index.to_period('D')  # convert DateTime to Periods
-    port_pct.index = port_pct.index.to_period('D')  # convert DateTime to Periods
+@profiling.timed('reader.get_mapped_quotes')
+def get_mapped_quotes(tickers, exchange='US', start=START_DATE, end=END_DATE, dtype='float64', source=fetch_eod):
+    """Get aligned close prices and percent changes of many tickers from the memory-mapped matrices of the store
+
+  Parameters
+  ----------
+  tickers: list
+    List of tickers
+  exchange: str, optional, default='US'
+    Exchange code
+  start: str or datetime-like, optional
+    First date
+  end: str or datetime-like, optional
+    Last date, inclusive
+  dtype: str, optional, default='float64'
+    Type of the values, 'float32' halves the memory
+  source: callable, optional, default=fetch_eod
+    Function (ticker, exchange, start, end) -> pd.DataFrame used for the missing data
+
+  Returns
+  -------
+  tuple
+    (prices, percent changes) DataFrames with tickers as columns and daily periods as index, like get_quotes()
+
+  Notes
+  -----
+    The frames are read-only views of the files mapped by all processes when the tickers are consecutive
+    columns of the matrices (they are sorted), otherwise only the columns of the tickers are copied.
+    Unlike get_quotes(), the percent change of the first date is relative to the last close stored before it.
+  """
+    _fetch_missing(tickers, exchange, start, end, source)
+    prices, returns = store.open_matrices(exchange, dtype)
+    port = prices.get_frame(start, end, tickers)
+    port_pct = returns.get_frame(start, end, tickers)
+    # dates on which none of the tickers has a quote, dropped without copying when there are none
+    port = _drop_empty_rows(port)
+    port_pct = _drop_empty_rows(port_pct)
+    port.columns = tickers
+    port_pct.columns = tickers
+    port.index = port.index.to_period('D')
+    port_pct.index = port_pct.index.to_period('D')
     return port, port_pct
 
+
+def _drop_empty_rows(frame):
+    empty = np.isnan(frame.to_numpy()).all(axis=1)
+    return frame[~empty] if empty.any() else frame
+
+
+def get_ind(ticker, start=START_DATE, end=END_DATE, source=fetch_eod):
+    port, port_pct = get_quotes([ticker], 'INDX', start, end, source=source)
+    return port[ticker], port_pct[ticker]
+
 # # get_symbols()
 # # tickers = ['AAPL','ABBV', 'ABT', 'ACN', 'ADBE', 'AMZN', 'AVGO', 'BAC', 'BRK.A', 'CMCSA', 'COST', 'CRM', 'CSCO', 'CVX', 'DHR', 'DIS', 'FB', 'GOOG', 'HD', 'INTC', 'JNJ', 'JPM', 'KO', 'LLY', 'MA', 'MCD', 'MDT', 'MRK', 'MS', 'MSFT', 'NFLX', 'NKE', 'NVDA', 'ORCL', 'PEP', 'PFE', 'PG', 'PYPL', 'QCOM', 'T', 'TMO', 'TSLA', 'TXN', 'UNH', 'UPS', 'V', 'VZ', 'WFC', 'WMT', 'XOM']
 # print(get_quotes(tickers))
@@ -46,4 +358,4 @@ def get_ind(ticker):
 # df_market = pd.read_csv('../data/market.csv', header=0, index_col=0, parse_dates=True)
 # df_market.index = pd.to_datetime(df_market.index, format="%Y%m%d") # convert index to DateTime Series
 # df_market.index = df_market.index.to_period('D') # convert DateTime to Periods
-# print(df_market)
\ No newline at end of file
+# print(df_market)
@@ -1,8 +1,13 @@
+import os
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
 import pandas as pd
 import numpy as np
 from scipy.stats import norm
 from . import stats
 from . import annualize
+from . import profiling
 
 
 # import scipy
@@ -141,6 +146,142 @@ def get_conditional_historic_var(returns_series, significance_level=5):
         raise TypeError('Expected either Dataframe or Series')
 
 
+@profiling.timed('risk.get_monte_carlo_var')
+def get_monte_carlo_var(expected_returns, covariance_matrix, weights, significance_level=5, horizons=(1,),
+                        number_of_scenarios=100000, distribution='normal', degrees_of_freedom=5, seed=None,
+                        chunk_size=None, max_workers=None):
+    """Compute Monte Carlo VaR and CVaR of many portfolios and horizons from one set of simulated scenarios
+
+  Parameters
+  ----------
+  expected_returns: pd.Series or array_like
+    Expected returns of assets per period
+  covariance_matrix: pd.DataFrame or array_like
+    Covariance-variance matrix of asset returns per period, sample or shrunk
+  weights: pd.DataFrame, pd.Series or array_like
+    Weights of one portfolio, or one row of weights per portfolio
+  significance_level: int, optional, default=5
+    Significance level.
+  horizons: sequence, optional, default=(1,)
+    Horizons in periods
+  number_of_scenarios: int, optional, default=100000
+    Number of simulated scenarios
+  distribution: str, optional, default='normal'
+    'normal' for multivariate normal or 't' for multivariate Student-t scenarios
+  degrees_of_freedom: float, optional, default=5
+    Degrees of freedom of the Student-t distribution, must be greater than 2
+  seed: int or np.random.SeedSequence, optional, default=None
+    Seed of the simulation
+  chunk_size: int, optional, default=None
+    Number of scenarios simulated at once, sized for about 64 MB of draws if None
+  max_workers: int, optional, default=None
+    Number of threads simulating chunks, the number of CPUs if None
+
+  Returns
+  -------
+  pd.DataFrame
+    VaR | CVaR as positive losses, indexed by (Portfolio, Horizon)
+
+  Raises
+  ------
+  ValueError
+    If the distribution is unknown, or labelled expected returns miss assets of the covariance matrix
+
+  Notes
+  -----
+    Labelled expected returns and weights are aligned on the columns of a labelled covariance matrix,
+    missing weights are 0.
+    Scenarios are correlated through the Cholesky factor L of the covariance matrix. Only the portfolio shocks
+    z @ (L' W') are computed, so asset level scenarios are never formed. With fewer portfolios than assets the draws
+    are made in the space of the portfolios, through the Cholesky factor of W S W', which has the same distribution.
+    Only the worst significance_level % shocks of every portfolio are kept between chunks,
+    so memory does not grow with number_of_scenarios.
+    Student-t scenarios are normal draws divided by a common chi-square draw, scaled to keep the covariance.
+    Horizons use square root of time scaling of the one period shocks: the mean grows with h, the shocks with sqrt(h).
+    Every chunk draws from its own stream spawned from the seed, so for a given seed and chunk_size
+    the result does not depend on the number of threads.
+  """
+    if distribution not in ('normal', 't'):
+        raise ValueError(f"Unknown distribution {distribution!r}, expected 'normal' or 't'")
+    if distribution == 't' and degrees_of_freedom <= 2:
+        raise ValueError('Student-t scenarios need more than 2 degrees of freedom')
+    if isinstance(covariance_matrix, pd.DataFrame) and isinstance(expected_returns, pd.Series):
+        missing = covariance_matrix.columns.difference(expected_returns.index)
+        if len(missing):
+            raise ValueError(f"No expected returns for {', '.join(map(str, missing))}")
+        expected_returns = expected_returns.reindex(covariance_matrix.columns)
+    if isinstance(covariance_matrix, pd.DataFrame) and isinstance(weights, (pd.Series, pd.DataFrame)):
+        weights = weights.reindex(covariance_matrix.columns, axis=weights.ndim - 1, fill_value=0)
+    if isinstance(weights, pd.DataFrame):
+        labels = weights.index
+    elif isinstance(weights, pd.Series):
+        labels = pd.Index([weights.name if weights.name is not None else 0])
+    else:
+        labels = None
+    weights = np.atleast_2d(np.asarray(weights, dtype=np.float64))
+    labels = pd.RangeIndex(weights.shape[0]) if labels is None else labels
+    expected_returns = np.asarray(expected_returns, dtype=np.float64)
+    covariance_matrix = np.asarray(covariance_matrix, dtype=np.float64)
+
+    number_of_assets = covariance_matrix.shape[0]
+    if chunk_size is None:
+        chunk_size = max(1, 8 * 1024 ** 2 // min(number_of_assets, weights.shape[0]))
+    tail_size = max(1, int(np.ceil(number_of_scenarios * significance_level / 100)))
+    if weights.shape[0] < number_of_assets:
+        # portfolio shocks are themselves normal (or t with the same chi-square draw) with covariance W S W',
+        # so fewer portfolios than assets are simulated directly, with one draw per portfolio instead of per asset
+        loadings = _get_covariance_factor(weights @ covariance_matrix @ weights.T).T
+    else:
+        loadings = _get_covariance_factor(covariance_matrix).T @ weights.T
+    chunk_sizes = [min(chunk_size, number_of_scenarios - start) for start in range(0, number_of_scenarios, chunk_size)]
+    seed_sequence = seed if isinstance(seed, np.random.SeedSequence) else np.random.SeedSequence(seed)
+    max_workers = max_workers or os.cpu_count() or 1
+
+    tail = np.empty((0, weights.shape[0]))
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        pending = deque()
+        for chunk_seed, size in zip(seed_sequence.spawn(len(chunk_sizes)), chunk_sizes):
+            pending.append(executor.submit(
+                _simulate_tail, chunk_seed, size, loadings, distribution, degrees_of_freedom, tail_size
+            ))
+            # finished chunks are merged while the next ones are simulated, at most two per thread are held
+            if len(pending) >= 2 * max_workers:
+                tail = _get_tail(np.concatenate([tail, pending.popleft().result()]), tail_size)
+        while pending:
+            tail = _get_tail(np.concatenate([tail, pending.popleft().result()]), tail_size)
+
+    portfolio_returns = weights @ expected_returns
+    index = pd.MultiIndex.from_product([labels, list(horizons)], names=['Portfolio', 'Horizon'])
+    horizons = np.asarray(horizons, dtype=np.float64)
+    # the tail_size-th worst shock is the VaR quantile, the mean of the tail is the expected shortfall
+    var = -(np.outer(portfolio_returns, horizons) + np.outer(tail.max(axis=0), np.sqrt(horizons)))
+    cvar = -(np.outer(portfolio_returns, horizons) + np.outer(tail.mean(axis=0), np.sqrt(horizons)))
+    return pd.DataFrame({'VaR': var.ravel(), 'CVaR': cvar.ravel()}, index=index)
+
+
+def _get_covariance_factor(covariance_matrix):
+    # Cholesky factor, or the symmetric square root for a singular (e.g. more assets than periods) sample covariance
+    try:
+        return np.linalg.cholesky(covariance_matrix)
+    except np.linalg.LinAlgError:
+        eigenvalues, eigenvectors = np.linalg.eigh(covariance_matrix)
+        return eigenvectors * np.sqrt(np.clip(eigenvalues, 0, None))
+
+
+def _get_tail(shocks, tail_size):
+    if shocks.shape[0] > tail_size:
+        shocks = np.partition(shocks, tail_size - 1, axis=0)[:tail_size]
+    return shocks
+
+
+def _simulate_tail(seed_sequence, size, loadings, distribution, degrees_of_freedom, tail_size):
+    generator = np.random.default_rng(seed_sequence)
+    shocks = generator.standard_normal((size, loadings.shape[0])) @ loadings
+    if distribution == 't':
+        shocks *= np.sqrt((degrees_of_freedom - 2) / generator.chisquare(degrees_of_freedom, size))[:, np.newaxis]
+    return _get_tail(shocks, tail_size)
+
+
 def get_drawdown(returns_series):
     """Computes historical Wealth Index and maximum drawdown \n
   Maximum drawdown - is the maximum loss investor could have experienced if they bought stocks at the top and sold stocks at the bottom \n
@@ -0,0 +1,329 @@
+import numpy as np
+import pandas as pd
+from scipy.stats import norm
+
+
+def _as_frame(returns_series):
+    if isinstance(returns_series, pd.Series):
+        return returns_series.to_frame()
+    if isinstance(returns_series, pd.DataFrame):
+        return returns_series
+    raise TypeError('Expected either Dataframe or Series')
+
+
+def _like(returns_series, values):
+    # Wrap a result in the type, index and columns of the returns
+    if isinstance(returns_series, pd.Series):
+        return pd.Series(values[:, 0], index=returns_series.index, name=returns_series.name)
+    return pd.DataFrame(values, index=returns_series.index, columns=returns_series.columns)
+
+
+def _get_window_sums(values, window):
+    # Sums over the window ending at every row, over all rows so far if window is None
+    cumulative = np.cumsum(values, axis=0)
+    if window is None or window >= values.shape[0]:
+        return cumulative
+    sums = cumulative.copy()
+    sums[window:] -= cumulative[:-window]
+    return sums
+
+
+def _get_min_periods(window, min_periods):
+    if min_periods is not None:
+        return min_periods
+    return 1 if window is None else window
+
+
+def _get_moments(returns_series, window, min_periods):
+    # Count, mean and central moments of the valid returns of every window from running power sums
+    values = _as_frame(returns_series).to_numpy(dtype=np.float64)
+    mask = np.isnan(values)
+    # powers are summed around the column means so that differences of running sums do not lose precision
+    shift = np.zeros(values.shape[1])
+    has_values = ~mask.all(axis=0)
+    shift[has_values] = np.nanmean(values[:, has_values], axis=0)
+    shifted = np.where(mask, 0., values - shift)
+    count = _get_window_sums((~mask).astype(np.float64), window)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        mean = _get_window_sums(shifted, window) / count
+        second, third, fourth = (_get_window_sums(shifted**power, window) / count for power in (2, 3, 4))
+        second_moment = second - mean**2
+        third_moment = third - 3 * mean * second + 2 * mean**3
+        fourth_moment = fourth - 4 * mean * third + 6 * mean**2 * second - 3 * mean**4
+        # constant windows are left with rounding noise instead of zero moments by the running differences
+        is_constant = second_moment <= 1e-10 * second
+    for moment in (second_moment, third_moment, fourth_moment):
+        moment[is_constant] = 0.
+    moments = [count, mean + shift, second_moment, third_moment, fourth_moment]
+    is_short = count < _get_min_periods(window, min_periods)
+    for moment in moments:
+        moment[is_short] = np.nan
+    return moments
+
+
+def get_rolling_volatility(returns_series, window=None, periods_per_year=255, min_periods=None):
+    """Compute annualized volatility over rolling or expanding windows
+
+  Parameters
+  ----------
+  returns_series: pd.DataFrame or Series
+    Series of returns
+  window: int, optional, default=None
+    Number of periods in a window, expanding windows from the first period if None
+  periods_per_year: int, optional, default=255
+    Number of periods in a year
+  min_periods: int, optional, default=None
+    Minimal number of valid returns in a window, window (1 for expanding windows) if None
+
+  Returns
+  -------
+  pd.DataFrame or Series
+    Annualized volatility of the window ending at every period, aligned to returns_series
+
+  See Also
+  --------
+  annualize.get_annualized_volatility()
+  """
+    count, _, second_moment, _, _ = _get_moments(returns_series, window, min_periods)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        sample_variance = np.where(count > 1, second_moment * count / (count - 1), np.nan)
+    return _like(returns_series, np.sqrt(sample_variance) * periods_per_year**0.5)
+
+
+def get_rolling_skewness(returns_series, window=None, min_periods=None):
+    """Compute the skewness of the distribution over rolling or expanding windows
+
+  Parameters
+  ----------
+  returns_series: pd.DataFrame or Series
+    Series of returns
+  window: int, optional, default=None
+    Number of periods in a window, expanding windows from the first period if None
+  min_periods: int, optional, default=None
+    Minimal number of valid returns in a window, window (1 for expanding windows) if None
+
+  Returns
+  -------
+  pd.DataFrame or Series
+    Population skewness of the window ending at every period, aligned to returns_series
+
+  See Also
+  --------
+  stats.get_skewness()
+  """
+    _, _, second_moment, third_moment, _ = _get_moments(returns_series, window, min_periods)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return _like(returns_series, third_moment / second_moment**1.5)
+
+
+def get_rolling_kurtosis(returns_series, window=None, min_periods=None):
+    """Compute the kurtosis of the distribution over rolling or expanding windows
+
+  Parameters
+  ----------
+  returns_series: pd.DataFrame or Series
+    Series of returns
+  window: int, optional, default=None
+    Number of periods in a window, expanding windows from the first period if None
+  min_periods: int, optional, default=None
+    Minimal number of valid returns in a window, window (1 for expanding windows) if None
+
+  Returns
+  -------
+  pd.DataFrame or Series
+    Population kurtosis (not excess) of the window ending at every period, aligned to returns_series
+
+  See Also
+  --------
+  stats.get_kurtosis()
+  """
+    _, _, second_moment, _, fourth_moment = _get_moments(returns_series, window, min_periods)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return _like(returns_series, fourth_moment / second_moment**2)
+
+
+def get_rolling_cf_var(returns_series, window=None, significance_level=5, min_periods=None):
+    """Compute semi-parametric Cornish-Fisher VaR over rolling or expanding windows
+
+  Parameters
+  ----------
+  returns_series: pd.DataFrame or Series
+    Series of returns
+  window: int, optional, default=None
+    Number of periods in a window, expanding windows from the first period if None
+  significance_level: int, optional, default=5
+    Significance level.
+  min_periods: int, optional, default=None
+    Minimal number of valid returns in a window, window (1 for expanding windows) if None
+
+  Returns
+  -------
+  pd.DataFrame or Series
+    Cornish-Fisher Value at Risk of the window ending at every period, aligned to returns_series
+
+  See Also
+  --------
+  risk.get_cf_var()
+  """
+    _, mean, second_moment, third_moment, fourth_moment = _get_moments(returns_series, window, min_periods)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        skewness = third_moment / second_moment**1.5
+        kurtosis = fourth_moment / second_moment**2
+        z_score = norm.ppf(significance_level / 100)
+        z_score = (z_score + (z_score**2 - 1) * skewness / 6 + (z_score**3 - 3 * z_score) * (kurtosis - 3) / 24
+                   - (2 * z_score**3 - 5 * z_score) * (skewness**2) / 36)
+        return _like(returns_series, -(mean + z_score * np.sqrt(second_moment)))
+
+
+def get_rolling_sharpe_ratio(returns_series, window=None, risk_free_rate=0.03, periods_per_year=255, min_periods=None):
+    """Compute the Sharpe Ratio over rolling or expanding windows
+
+  Parameters
+  ----------
+  returns_series: pd.DataFrame or Series
+    Series of returns
+  window: int, optional, default=None
+    Number of periods in a window, expanding windows from the first period if None
+  risk_free_rate: float, optional, default=0.03
+    Risk Free rate
+  periods_per_year: int, optional, default=255
+    Number of periods in a year
+  min_periods: int, optional, default=None
+    Minimal number of valid returns in a window, window (1 for expanding windows) if None
+
+  Returns
+  -------
+  pd.DataFrame or Series
+    Sharpe Ratio of the window ending at every period, aligned to returns_series
+
+  Notes
+  -----
+    Excess returns are compounded through running sums of log growth, missing returns count as periods
+    but not as growth, as in stats.get_portfolio_stat_summary.
+
+  See Also
+  --------
+  risk.get_sharpe_ratio()
+  """
+    values = _as_frame(returns_series).to_numpy(dtype=np.float64)
+    risk_free_rate_per_period = (1 + risk_free_rate)**(1 / periods_per_year) - 1
+    with np.errstate(invalid='ignore'):
+        log_growth = np.where(np.isnan(values), 0., np.log1p(values - risk_free_rate_per_period))
+    number_of_periods = np.arange(1, values.shape[0] + 1, dtype=np.float64)
+    if window is not None:
+        number_of_periods = np.minimum(number_of_periods, window)
+    annualized_excess_returns = _like(returns_series, np.expm1(
+        _get_window_sums(log_growth, window) * periods_per_year / number_of_periods[:, np.newaxis]
+    ))
+    annualized_volatility = get_rolling_volatility(returns_series, window, periods_per_year, min_periods)
+    return annualized_excess_returns / annualized_volatility
+
+
+def get_rolling_historic_var(returns_series, window=None, significance_level=5, min_periods=None):
+    """Compute historic VaR over rolling or expanding windows
+
+  Parameters
+  ----------
+  returns_series: pd.DataFrame or Series
+    Series of returns
+  window: int, optional, default=None
+    Number of periods in a window, expanding windows from the first period if None
+  significance_level: int, optional, default=5
+    Significance level.
+  min_periods: int, optional, default=None
+    Minimal number of valid returns in a window, window (1 for expanding windows) if None
+
+  Returns
+  -------
+  pd.DataFrame or Series
+    Historic Value at Risk of the window ending at every period, aligned to returns_series
+
+  Notes
+  -----
+    The percentile is interpolated linearly like np.percentile. pandas keeps every window sorted in a skiplist,
+    so moving the window by one period costs O(log(window)) instead of sorting the window again.
+
+  See Also
+  --------
+  risk.get_historic_var()
+  """
+    min_periods = _get_min_periods(window, min_periods)
+    if window is None:
+        windows = returns_series.expanding(min_periods=min_periods)
+    else:
+        windows = returns_series.rolling(window, min_periods=min_periods)
+    return -windows.quantile(significance_level / 100, interpolation='linear')
+
+
+def get_rolling_maximum_drawdown(returns_series, window=None, min_periods=None):
+    """Compute the maximum drawdown over rolling or expanding windows
+
+  Parameters
+  ----------
+  returns_series: pd.DataFrame or Series
+    Series of returns
+  window: int, optional, default=None
+    Number of periods in a window, expanding windows from the first period if None
+  min_periods: int, optional, default=None
+    Minimal number of valid returns in a window, window (1 for expanding windows) if None
+
+  Returns
+  -------
+  pd.DataFrame or Series
+    Maximum drawdown (a negative fraction) of the wealth index of the window ending at every period,
+    aligned to returns_series
+
+  Notes
+  -----
+    Drawdowns are differences of the log wealth x. The series is cut into blocks of window periods and for every
+    block the running maximum, minimum and drawdown are accumulated from its start (prefix) and from its end (suffix).
+    A window is a suffix of one block followed by a prefix of the next, so its drawdown is
+    min(suffix drawdown, prefix drawdown, prefix minimum - suffix maximum) and the whole computation is O(T).
+    Missing returns are skipped by the wealth index, as in stats.get_portfolio_stat_summary.
+
+  See Also
+  --------
+  risk.get_drawdown()
+  """
+    values = _as_frame(returns_series).to_numpy(dtype=np.float64)
+    mask = np.isnan(values)
+    number_of_periods, number_of_columns = values.shape
+    with np.errstate(invalid='ignore'):
+        log_wealth = np.cumsum(np.where(mask, 0., np.log1p(values)), axis=0)
+        # the wealth index skips missing returns, a column starts at its first valid return
+        log_wealth[mask] = np.nan
+        if window is None or window >= number_of_periods:
+            drawdown = np.fmin.accumulate(log_wealth - np.fmax.accumulate(log_wealth, axis=0), axis=0)
+        else:
+            number_of_blocks = -(-number_of_periods // window)
+            padded = np.full((number_of_blocks * window, number_of_columns), np.nan)
+            padded[:number_of_periods] = log_wealth
+            blocks = padded.reshape(number_of_blocks, window, number_of_columns)
+            # the padding is at the end of the last block, it only enters suffixes of periods past the data
+            prefix_max = np.fmax.accumulate(blocks, axis=1)
+            prefix_min = np.fmin.accumulate(blocks, axis=1)
+            prefix_drawdown = np.fmin.accumulate(blocks - prefix_max, axis=1)
+            reversed_blocks = blocks[:, ::-1]
+            suffix_max = np.fmax.accumulate(reversed_blocks, axis=1)[:, ::-1]
+            suffix_min = np.fmin.accumulate(reversed_blocks, axis=1)[:, ::-1]
+            suffix_drawdown = np.fmin.accumulate((suffix_min - blocks)[:, ::-1], axis=1)[:, ::-1]
+            prefix_max, prefix_min, prefix_drawdown, suffix_max, suffix_drawdown = (
+                array.reshape(-1, number_of_columns)[:number_of_periods]
+                for array in (prefix_max, prefix_min, prefix_drawdown, suffix_max, suffix_drawdown)
+            )
+            drawdown = np.full_like(log_wealth, np.nan)
+            # the window ending at t starts at t - window + 1, in the previous block unless t ends a block
+            end = np.arange(window - 1, number_of_periods)
+            start = end - window + 1
+            drawdown[end] = np.fmin(
+                np.fmin(suffix_drawdown[start], prefix_drawdown[end]), prefix_min[end] - suffix_max[start]
+            )
+            ends_block = (end + 1) % window == 0
+            drawdown[end[ends_block]] = prefix_drawdown[end[ends_block]]
+            # windows that are not full yet are the expanding windows from the first period
+            drawdown[:window - 1] = np.fmin.accumulate(
+                log_wealth[:window - 1] - np.fmax.accumulate(log_wealth[:window - 1], axis=0), axis=0
+            )
+        count = _get_window_sums((~mask).astype(np.float64), window)
+        drawdown[count < _get_min_periods(window, min_periods)] = np.nan
+        return _like(returns_series, np.expm1(drawdown))
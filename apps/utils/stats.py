@@ -1,7 +1,13 @@
+import numpy as np
 import scipy.stats
 import pandas as pd
+from scipy.stats import norm
 from . import risk
 from . import annualize
+from . import profiling
+
+# trailing windows of the statistics index, in years
+STAT_WINDOWS = {'1y': 1, '3y': 3, '5y': 5}
 
 
 def get_skewness(returns_series, ddof=0):
@@ -83,7 +89,8 @@ def is_normal(returns_series, significance_level=0.01):
   return p_value > significance_level
 
 
-def get_portfolio_stat_summary(returns_series, risk_free_rate=0.03, periods_per_year=255):
+@profiling.timed('stats.get_portfolio_stat_summary')
+def get_portfolio_stat_summary(returns_series, risk_free_rate=0.03, periods_per_year=255, significance_level=5):
   """Compute securities portfolio statistics
 
   Parameters
@@ -92,30 +99,130 @@ def get_portfolio_stat_summary(returns_series, risk_free_rate=0.03, periods_per_
     Series of portfolio returns
   risk_free_rate: float, optional, default = 0.03
     Risk Free rate available to investor
-  periods_per_year: int, optional, default = 12
+  periods_per_year: int, optional, default = 255
     Number of periods in a year. If returns series is monthly, set to 12; if daily, set to 255
+  significance_level: int, optional, default=5
+    Significance level of Cornish-Fisher VaR and historic CVaR
 
   Returns
   -------
   pd.DataFrame
-    pandas Dataframe with portfolio statistics
+    pandas Dataframe with portfolio statistics, one row per column of returns_series
+
+  Notes
+  -----
+    All statistics are computed in one pass over the returns matrix, the mean and the central moments
+    are shared between them. Missing returns are skipped the same way as pandas does, so the numbers
+    match applying annualize.get_annualized_returns, risk.get_cf_var etc. column by column.
   """
-  annualized_returns = returns_series.aggregate(annualize.get_annualized_returns, periods_per_year=periods_per_year)
-  annualized_volatility = returns_series.aggregate(annualize.get_annualized_volatility, periods_per_year=periods_per_year)
-  annualized_sharpe_ratio = returns_series.aggregate(risk.get_sharpe_ratio, risk_free_rate=risk_free_rate, periods_per_year=periods_per_year)
-  drawdown = returns_series.aggregate(lambda returns_series: risk.get_drawdown(returns_series).Drawdown.min())
-  skewness = returns_series.aggregate(get_skewness)
-  kurtosis = returns_series.aggregate(get_kurtosis)
-  cornish_fisher_var = returns_series.aggregate(risk.get_cf_var)
-  historic_cvar = returns_series.aggregate(risk.get_conditional_historic_var)
-  results = pd.DataFrame({
+  if isinstance(returns_series, pd.Series):
+    returns_series = returns_series.to_frame()
+  # column-major layout keeps every column contiguous, so sums along it are computed like pandas does per column
+  values = np.asfortranarray(returns_series.to_numpy(dtype=np.float64))
+  mask = np.isnan(values)
+  number_of_periods = values.shape[0]
+  count = number_of_periods - mask.sum(axis=0)
+  is_empty = count == 0
+  filled = np.where(mask, 0., values)
+
+  with np.errstate(divide='ignore', invalid='ignore'):
+    mean = filled.sum(axis=0) / count
+    deviations = np.where(mask, 0., values - mean)
+    squared_deviations = deviations**2
+    second_moment = squared_deviations.sum(axis=0)
+    population_std = np.sqrt(second_moment / count)
+    sample_std = np.sqrt(np.where(count > 1, second_moment / (count - 1), np.nan))
+    skewness = (deviations**3).sum(axis=0) / count / population_std**3
+    kurtosis = (deviations**4).sum(axis=0) / count / population_std**4
+
+    # missing returns count as periods but not as growth
+    growth_exponent = periods_per_year / number_of_periods
+    growth = 1 + filled
+    annualized_returns = np.prod(growth, axis=0)**growth_exponent - 1
+    annualized_volatility = sample_std * periods_per_year**0.5
+    risk_free_rate_per_period = (1 + risk_free_rate)**(1 / periods_per_year) - 1
+    excess_growth = np.prod(np.where(mask, 1., 1 + (values - risk_free_rate_per_period)), axis=0)
+    sharpe_ratio = (excess_growth**growth_exponent - 1) / annualized_volatility
+
+    z_score = norm.ppf(significance_level / 100)
+    z_score = (z_score + (z_score**2 - 1) * skewness / 6 + (z_score**3 - 3 * z_score) * (kurtosis - 3) / 24
+               - (2 * z_score**3 - 5 * z_score) * (skewness**2) / 36)
+    cornish_fisher_var = -(mean + z_score * population_std)
+
+    # a missing return makes the whole historic CVaR missing, like np.percentile does
+    historic_var = np.percentile(values, significance_level, axis=0)
+    is_beyond = values <= historic_var
+    beyond_count = is_beyond.sum(axis=0)
+    # returns beyond VaR are summed per column in their original order, so the sums round exactly like pandas
+    beyond_returns = np.split(values.T[is_beyond.T], np.cumsum(beyond_count)[:-1])
+    historic_cvar = -np.array([returns.sum() for returns in beyond_returns]) / beyond_count
+
+    # like risk.get_drawdown of every column, the wealth index skips missing returns, so it starts at the first
+    # valid return of a column instead of at 100 on the dates before it
+    wealth_index = 100 * np.cumprod(growth, axis=0)
+    wealth_index[mask] = np.nan
+    previous_peaks = np.fmax.accumulate(wealth_index, axis=0)
+    drawdown = np.fmin.reduce((wealth_index - previous_peaks) / previous_peaks, axis=0, initial=np.inf)
+  drawdown[is_empty] = np.nan
+
+  return pd.DataFrame({
     "Annualized Returns": annualized_returns,
     "Annualized Volatility": annualized_volatility,
     "Skewness": skewness,
     "Kurtosis": kurtosis,
-    "Cornish Fischer VaR (5%)": cornish_fisher_var,
-    "Historic CVaR (5%)": historic_cvar,
-    "Sharpe Ratio": annualized_sharpe_ratio,
+    f"Cornish Fischer VaR ({significance_level}%)": cornish_fisher_var,
+    f"Historic CVaR ({significance_level}%)": historic_cvar,
+    "Sharpe Ratio": sharpe_ratio,
     "Maximum Drawdown": drawdown,
-  })
-  return results
+  }, index=returns_series.columns)
+
+
+def get_window_stat_summary(returns_series, windows=None, risk_free_rate=0.03, periods_per_year=255,
+                            significance_level=5):
+  """Compute the statistics of get_portfolio_stat_summary over trailing windows of every column
+
+  Parameters
+  ----------
+  returns_series: pd.DataFrame or Series
+    Returns, one column per security, missing before its first and after its last return
+  windows: dict, optional, default=None
+    {window name: years, None for the whole history}, STAT_WINDOWS if None
+  risk_free_rate: float, optional, default = 0.03
+    Risk Free rate available to investor
+  periods_per_year: int, optional, default = 255
+    Number of periods in a year
+  significance_level: int, optional, default=5
+    Significance level of Cornish-Fisher VaR and historic CVaR
+
+  Returns
+  -------
+  pd.DataFrame
+    Statistics indexed by (column, window), missing when a column has fewer returns than the window
+
+  Notes
+  -----
+    A window is the last years * periods_per_year returns of every column, whatever their dates, so securities
+    with different histories are compared over the same number of periods. Columns with the same number of
+    returns in a window are summarized together in one pass.
+  """
+  if isinstance(returns_series, pd.Series):
+    returns_series = returns_series.to_frame()
+  windows = STAT_WINDOWS if windows is None else windows
+  histories = [returns_series[column].dropna().to_numpy(dtype=np.float64) for column in returns_series.columns]
+  summaries = []
+  for window, years in windows.items():
+    groups = {}
+    for position, history in enumerate(histories):
+      length = len(history) if years is None else int(round(years * periods_per_year))
+      if 0 < length <= len(history):
+        groups.setdefault(length, []).append(position)
+    for length, positions in groups.items():
+      values = np.column_stack([histories[position][-length:] for position in positions])
+      summary = get_portfolio_stat_summary(pd.DataFrame(values, columns=returns_series.columns[positions]),
+                                           risk_free_rate, periods_per_year, significance_level)
+      summary.index = pd.MultiIndex.from_arrays([summary.index, [window] * len(summary)])
+      summaries.append(summary)
+  index = pd.MultiIndex.from_product([returns_series.columns, list(windows)])
+  if not summaries:
+    return pd.DataFrame(index=index, columns=get_portfolio_stat_summary(pd.DataFrame([[0.]])).columns, dtype=float)
+  return pd.concat(summaries).reindex(index)
@@ -0,0 +1,583 @@
+import contextlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+
+import fastparquet
+import numpy as np
+import pandas as pd
+
+from . import matrix, profiling, stats
+
+try:
+    import fcntl
+except ImportError:  # Windows, writes are only serialized within a process
+    fcntl = None
+
+STORE_DIR = './apps/data/store'
+MANIFEST_FILE = '_manifest.json'
+MATRIX_DIR = '_matrix'  # memory-mapped matrices of the exchanges, next to the exchange partitions
+STATS_DIR = '_stats'  # statistics index of the tickers of every exchange and the closes it is computed from
+LOCK_FILE = '.lock'  # locked by the process writing to the store
+QUOTE_COLUMNS = ['Open', 'High', 'Low', 'Close', 'Adjusted_close', 'Volume']
+# closes kept per ticker for the statistics index, one more than the returns of the longest window
+STATS_TAIL_SIZE = int(round(max(stats.STAT_WINDOWS.values()) * 255)) + 1
+
+_lock = threading.Lock()
+_stats_lock = threading.Lock()
+_matrix_lock = threading.Lock()
+_matrices = {}  # (store_dir, exchange, dtype) -> (path, prices, returns) mapped by this process
+_stats_indexes = {}  # (store_dir, exchange) -> (modification time, statistics index) read by this process
+
+
+def _get_exchange_dir(exchange, store_dir=STORE_DIR):
+    return os.path.join(store_dir, exchange)
+
+
+@contextlib.contextmanager
+def _flock(path, exclusive=True):
+    # a lock on a file of the store, exclusive for a writer, shared between readers
+    if fcntl is None:
+        yield
+        return
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'a') as f:
+        fcntl.flock(f, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+@contextlib.contextmanager
+def _file_lock(path, thread_lock):
+    # web and job worker processes write the same store, a thread lock orders the threads of a process
+    # and a lock on a file of the store orders the processes
+    with thread_lock, _flock(path):
+        yield
+
+
+def _write_lock(store_dir=STORE_DIR):
+    return _file_lock(os.path.join(store_dir, LOCK_FILE), _lock)
+
+
+def _stats_write_lock(store_dir=STORE_DIR):
+    # held while the statistics index is updated, separate from the quotes so that it does not block their writers
+    return _file_lock(os.path.join(store_dir, STATS_DIR, LOCK_FILE), _stats_lock)
+
+
+def get_manifest(exchange='US', store_dir=STORE_DIR):
+    """Read the manifest of an exchange partition
+
+  Parameters
+  ----------
+  exchange: str, optional, default='US'
+    Exchange code
+  store_dir: str, optional
+    Root directory of the price store
+
+  Returns
+  -------
+  dict
+    {ticker: {'start': str, 'end': str, 'last': str or None}} date range covered by the store
+    and the last stored date for every ticker
+
+  Notes
+  -----
+    Coverage is the date range that was requested from the source, not the range of the stored rows,
+    so a ticker listed after the start of the range is not fetched again on every read.
+  """
+    path = os.path.join(_get_exchange_dir(exchange, store_dir), MANIFEST_FILE)
+    if not os.path.exists(path):
+        return {}
+    with open(path, 'r') as f:
+        return json.load(f)
+
+
+def get_version(exchange='US', store_dir=STORE_DIR):
+    """Get the version of the stored data of an exchange
+
+  Parameters
+  ----------
+  exchange: str, optional, default='US'
+    Exchange code
+  store_dir: str, optional
+    Root directory of the price store
+
+  Returns
+  -------
+  int
+    Number that changes on every write to the exchange partition, 0 if nothing is stored
+
+  Notes
+  -----
+    The version is the modification time of the manifest, so writes made by other processes are seen as well.
+  """
+    try:
+        return os.stat(os.path.join(_get_exchange_dir(exchange, store_dir), MANIFEST_FILE)).st_mtime_ns
+    except FileNotFoundError:
+        return 0
+
+
+def _save_manifest(manifest, exchange, store_dir):
+    path = os.path.join(_get_exchange_dir(exchange, store_dir), MANIFEST_FILE)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+def get_missing_ranges(tickers, start, end, exchange='US', store_dir=STORE_DIR):
+    """Find date ranges that have to be fetched from the source
+
+  Parameters
+  ----------
+  tickers: list
+    List of tickers
+  start: str or datetime-like
+    First date of the requested range
+  end: str or datetime-like
+    Last date of the requested range, inclusive
+  exchange: str, optional, default='US'
+    Exchange code
+  store_dir: str, optional
+    Root directory of the price store
+
+  Returns
+  -------
+  dict
+    {ticker: [(start, end), ...]} only for tickers that are not fully covered by the store
+  """
+    start, end = pd.Timestamp(start), pd.Timestamp(end)
+    manifest = get_manifest(exchange, store_dir)
+    missing = {}
+    for ticker in tickers:
+        coverage = manifest.get(ticker)
+        if coverage is None:
+            missing[ticker] = [(start, end)]
+            continue
+        covered_start, covered_end = pd.Timestamp(coverage['start']), pd.Timestamp(coverage['end'])
+        ranges = []
+        if start < covered_start:
+            ranges.append((start, covered_start - pd.Timedelta(days=1)))
+        if end > covered_end:
+            ranges.append((covered_end + pd.Timedelta(days=1), end))
+        if ranges:
+            missing[ticker] = ranges
+    return missing
+
+
+def _normalize_quotes(quotes, ticker, start, end):
+    # Bring source data to the store schema: Date column, fixed float columns, requested range only
+    df = quotes.copy()
+    if 'Date' not in df.columns:
+        df.index.name = 'Date'
+        df = df.reset_index()
+    df['Date'] = pd.to_datetime(df['Date'])
+    df = df[(df['Date'] >= start) & (df['Date'] <= end)]
+    for column in QUOTE_COLUMNS:
+        df[column] = df[column].astype(np.float64) if column in df.columns else np.nan
+    df = df[['Date'] + QUOTE_COLUMNS]
+    df['Ticker'] = ticker
+    return df
+
+
+def write_quotes(ticker, quotes, start, end, exchange='US', store_dir=STORE_DIR):
+    """Append quotes of a single ticker to the store and extend its coverage
+
+  Parameters
+  ----------
+  ticker: str
+    Ticker
+  quotes: pd.DataFrame
+    Daily quotes indexed by date (as returned by the EOD source)
+  start: str or datetime-like
+    First date of the fetched range
+  end: str or datetime-like
+    Last date of the fetched range, inclusive
+  exchange: str, optional, default='US'
+    Exchange code
+  store_dir: str, optional
+    Root directory of the price store
+
+  Returns
+  -------
+  int
+    Number of written rows
+
+  See Also
+  --------
+  write_quotes_many()
+  """
+    return write_quotes_many([(ticker, quotes, start, end)], exchange, store_dir)[ticker]
+
+
+def write_quotes_many(batches, exchange='US', store_dir=STORE_DIR):
+    """Append quotes of many tickers to the store in one write and extend their coverage
+
+  Parameters
+  ----------
+  batches: list
+    List of (ticker, quotes, start, end) tuples, quotes are indexed by date (as returned by the EOD source)
+    and start, end is the fetched date range, inclusive
+  exchange: str, optional, default='US'
+    Exchange code
+  store_dir: str, optional
+    Root directory of the price store
+
+  Returns
+  -------
+  dict
+    {ticker: number of written rows}
+
+  Notes
+  -----
+    Rows are written as new part files in the ticker partitions, existing files are never rewritten.
+    A fetched range must overlap or be adjacent to the range already covered by the store.
+    Writes are serialized between the threads and the processes (web and job workers) sharing the store.
+    The statistics index is updated from the written closes once the write is done, see update_stats_index().
+  """
+    batches = [(ticker, quotes, pd.Timestamp(start), pd.Timestamp(end)) for ticker, quotes, start, end in batches]
+    frames = [_normalize_quotes(quotes, ticker, start, end) for ticker, quotes, start, end in batches]
+    exchange_dir = _get_exchange_dir(exchange, store_dir)
+    written = {}
+    closes = {}
+    with _write_lock(store_dir):
+        os.makedirs(exchange_dir, exist_ok=True)
+        df = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+        if not df.empty:
+            fastparquet.write(
+                exchange_dir, df,
+                partition_on=['Ticker'], file_scheme='hive', write_index=False,
+                append=os.path.exists(os.path.join(exchange_dir, '_metadata')),
+            )
+        manifest = get_manifest(exchange, store_dir)
+        for (ticker, _, start, end), frame in zip(batches, frames):
+            coverage = manifest.get(ticker)
+            last = frame['Date'].max() if not frame.empty else None
+            if coverage is not None:
+                start = min(start, pd.Timestamp(coverage['start']))
+                end = max(end, pd.Timestamp(coverage['end']))
+                if coverage.get('last') is not None:
+                    last = pd.Timestamp(coverage['last']) if last is None else max(last, pd.Timestamp(coverage['last']))
+            manifest[ticker] = {
+                'start': start.strftime('%Y-%m-%d'),
+                'end': end.strftime('%Y-%m-%d'),
+                'last': last.strftime('%Y-%m-%d') if last is not None else None,
+            }
+            written[ticker] = written.get(ticker, 0) + len(frame)
+            closes[ticker] = pd.concat([closes.get(ticker), frame.set_index('Date')['Close']])
+        _save_manifest(manifest, exchange, store_dir)
+    update_stats_index(closes, exchange, store_dir)
+    return written
+
+
+def get_tail_ranges(tickers=None, end=None, exchange='US', store_dir=STORE_DIR):
+    """Find date ranges that extend stored tickers up to a given date
+
+  Parameters
+  ----------
+  tickers: list, optional, default=None
+    List of tickers, all stored tickers of the exchange if None
+  end: str or datetime-like, optional, default=None
+    Last date to refresh up to, inclusive, today if None
+  exchange: str, optional, default='US'
+    Exchange code
+  store_dir: str, optional
+    Root directory of the price store
+
+  Returns
+  -------
+  dict
+    {ticker: (start, end)} where start is the day after the last stored date
+
+  Notes
+  -----
+    Tickers that are not in the store yet are skipped, they have to be loaded with an explicit date range first.
+  """
+    end = pd.Timestamp.today().normalize() if end is None else pd.Timestamp(end)
+    manifest = get_manifest(exchange, store_dir)
+    tickers = list(manifest) if tickers is None else tickers
+    ranges = {}
+    for ticker in tickers:
+        coverage = manifest.get(ticker)
+        if coverage is None:
+            continue
+        if coverage.get('last') is not None:
+            start = pd.Timestamp(coverage['last']) + pd.Timedelta(days=1)
+        else:
+            start = pd.Timestamp(coverage['start'])
+        if start <= end:
+            ranges[ticker] = (start, end)
+    return ranges
+
+
+@profiling.timed('store.read_quotes')
+def read_quotes(tickers, exchange='US', columns=None, start=None, end=None, store_dir=STORE_DIR):
+    """Load quotes of many tickers from the store in one columnar read
+
+  Parameters
+  ----------
+  tickers: list
+    List of tickers
+  exchange: str, optional, default='US'
+    Exchange code
+  columns: list, optional, default=None
+    Quote columns to read, all columns if None
+  start: str or datetime-like, optional, default=None
+    First date to read
+  end: str or datetime-like, optional, default=None
+    Last date to read, inclusive
+  store_dir: str, optional
+    Root directory of the price store
+
+  Returns
+  -------
+  pd.DataFrame
+    Long table of quotes: Date | Ticker | columns, sorted by ticker and date
+
+  Notes
+  -----
+    Reads wait for a write in progress, in this or another process, to finish.
+  """
+    columns = QUOTE_COLUMNS if columns is None else list(columns)
+    exchange_dir = _get_exchange_dir(exchange, store_dir)
+    if not os.path.exists(os.path.join(exchange_dir, '_metadata')):
+        return pd.DataFrame(columns=['Date', 'Ticker'] + columns)
+    filters = [('Ticker', 'in', list(tickers))]
+    # Date filters only skip whole row groups, rows are masked below
+    if start is not None:
+        start = pd.Timestamp(start)
+        filters.append(('Date', '>=', start))
+    if end is not None:
+        end = pd.Timestamp(end)
+        filters.append(('Date', '<=', end))
+    # an append rewrites _metadata in place, it is read under the lock of the writers, the part files it lists
+    # are never rewritten
+    with _flock(os.path.join(store_dir, LOCK_FILE), exclusive=False):
+        parquet_file = fastparquet.ParquetFile(exchange_dir)
+    df = parquet_file.to_pandas(columns=['Date', 'Ticker'] + columns, filters=filters)
+    mask = df['Ticker'].isin(tickers)
+    if start is not None:
+        mask &= df['Date'] >= start
+    if end is not None:
+        mask &= df['Date'] <= end
+    df = df[mask]
+    df['Ticker'] = df['Ticker'].astype(str)
+    df = df.drop_duplicates(subset=['Ticker', 'Date'], keep='last')
+    return df.sort_values(['Ticker', 'Date']).reset_index(drop=True)
+
+
+def _get_matrix_dir(exchange, store_dir=STORE_DIR):
+    return os.path.join(store_dir, MATRIX_DIR, exchange)
+
+
+def write_matrices(exchange='US', dtype='float64', store_dir=STORE_DIR):
+    """Write the close prices and returns of every stored ticker of an exchange as memory-mapped matrices
+
+  Parameters
+  ----------
+  exchange: str, optional, default='US'
+    Exchange code
+  dtype: str, optional, default='float64'
+    Type of the stored values, 'float32' halves the size
+  store_dir: str, optional
+    Root directory of the price store
+
+  Returns
+  -------
+  str
+    Directory of the matrices, named after the version of the store they were built from
+
+  Notes
+  -----
+    Returns are the percent changes between the stored closes of every ticker, like reader.get_quotes().
+    Matrices of older versions are removed, processes that still map them keep reading the old files.
+  """
+    dtype = np.dtype(dtype).name
+    version = get_version(exchange, store_dir)
+    tickers = sorted(get_manifest(exchange, store_dir))
+    quotes = read_quotes(tickers, exchange, columns=['Close'], store_dir=store_dir)
+    quotes['Pct'] = quotes.groupby('Ticker')['Close'].pct_change()
+    matrix_dir = _get_matrix_dir(exchange, store_dir)
+    path = os.path.join(matrix_dir, f'{version}-{dtype}')
+    os.makedirs(matrix_dir, exist_ok=True)
+    # written aside and renamed, so a matrix directory is always complete
+    tmp_path = tempfile.mkdtemp(prefix='.tmp-', dir=matrix_dir)
+    for name, column in (('prices', 'Close'), ('returns', 'Pct')):
+        frame = quotes.pivot(index='Date', columns='Ticker', values=column).reindex(columns=tickers)
+        matrix.write_matrix(frame, os.path.join(tmp_path, name), dtype)
+    try:
+        os.rename(tmp_path, path)
+    except OSError:  # built by another process in the meantime
+        shutil.rmtree(tmp_path, ignore_errors=True)
+    for name in os.listdir(matrix_dir):
+        if name.endswith(f'-{dtype}') and os.path.join(matrix_dir, name) != path:
+            shutil.rmtree(os.path.join(matrix_dir, name), ignore_errors=True)
+    return path
+
+
+def open_matrices(exchange='US', dtype='float64', store_dir=STORE_DIR):
+    """Map the close prices and returns matrices of an exchange, writing them first if the store has changed
+
+  Parameters
+  ----------
+  exchange: str, optional, default='US'
+    Exchange code
+  dtype: str, optional, default='float64'
+    Type of the stored values
+  store_dir: str, optional
+    Root directory of the price store
+
+  Returns
+  -------
+  tuple
+    (prices, returns) matrix.MappedMatrix, dates x tickers
+
+  Notes
+  -----
+    Processes map the same files, so the pages are held once in the OS cache for all of them.
+    Matrices are rebuilt by the first process that opens them after a write to the store,
+    build them after a refresh (refresh_quotes --matrices) to keep that out of the requests.
+  """
+    dtype = np.dtype(dtype).name
+    path = os.path.join(_get_matrix_dir(exchange, store_dir), f'{get_version(exchange, store_dir)}-{dtype}')
+    key = (store_dir, exchange, dtype)
+    with _matrix_lock:
+        mapped = _matrices.get(key)
+        if mapped is None or mapped[0] != path:
+            if not os.path.exists(path):
+                path = write_matrices(exchange, dtype, store_dir)
+            prices = matrix.open_matrix(os.path.join(path, 'prices'))
+            returns = matrix.open_matrix(os.path.join(path, 'returns'))
+            mapped = _matrices[key] = path, prices, returns
+    return mapped[1], mapped[2]
+
+
+def _get_stats_index_path(exchange, store_dir=STORE_DIR):
+    return os.path.join(store_dir, STATS_DIR, f'{exchange}.parquet')
+
+
+def _read_stats_index(exchange, store_dir=STORE_DIR):
+    path = _get_stats_index_path(exchange, store_dir)
+    key = (store_dir, exchange)
+    try:
+        modified = os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        return None
+    cached = _stats_indexes.get(key)
+    if cached is None or cached[0] != modified:
+        index = fastparquet.ParquetFile(path).to_pandas().set_index(['Ticker', 'Window'])
+        cached = _stats_indexes[key] = modified, index
+    return cached[1]
+
+
+def _get_stats_tail_path(ticker, exchange, store_dir=STORE_DIR):
+    return os.path.join(store_dir, STATS_DIR, exchange, f'{ticker}.parquet')
+
+
+def _read_stats_tail(ticker, exchange, store_dir=STORE_DIR):
+    # last closes of a ticker, from the stored quotes the first time
+    path = _get_stats_tail_path(ticker, exchange, store_dir)
+    if os.path.exists(path):
+        tail = fastparquet.ParquetFile(path).to_pandas()
+    else:
+        tail = read_quotes([ticker], exchange, columns=['Close'], store_dir=store_dir)
+    return tail.set_index('Date')['Close'].astype(np.float64)
+
+
+def _write_stats_tail(tail, ticker, exchange, store_dir=STORE_DIR):
+    path = _get_stats_tail_path(ticker, exchange, store_dir)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + '.tmp'
+    fastparquet.write(tmp_path, tail.rename('Close').reset_index(), write_index=False)
+    os.replace(tmp_path, path)
+
+
+def update_stats_index(closes, exchange='US', store_dir=STORE_DIR):
+    """Fold new closes into the statistics of the windows of stats.STAT_WINDOWS
+
+  Parameters
+  ----------
+  closes: dict
+    {ticker: pd.Series of close prices indexed by date} written to the store since the last update,
+    an empty Series only indexes the stored closes of the ticker
+  exchange: str, optional, default='US'
+    Exchange code
+  store_dir: str, optional
+    Root directory of the price store
+
+  Notes
+  -----
+    The last STATS_TAIL_SIZE closes of every indexed ticker are kept next to the index. New closes are merged into
+    them, a rewritten date keeps its new close, and the windows are computed from them only, so an update costs
+    in proportion to the new closes and the longest window, not to the stored history. The stored closes of a
+    ticker are read once, when it is indexed for the first time.
+    Windows end at the last stored close of every ticker, returns are the percent changes between its closes.
+  """
+    if not closes:
+        return
+    with _stats_write_lock(store_dir):
+        returns = {}
+        for ticker, new_closes in closes.items():
+            tail = pd.concat([_read_stats_tail(ticker, exchange, store_dir), new_closes.astype(np.float64)])
+            tail = tail[~tail.index.duplicated(keep='last')].dropna().sort_index().iloc[-STATS_TAIL_SIZE:]
+            _write_stats_tail(tail, ticker, exchange, store_dir)
+            returns[ticker] = tail.pct_change().to_numpy()[1:]
+        # windows count returns, not dates, so the returns of the tickers are not aligned on their dates
+        length = max(len(values) for values in returns.values())
+        returns = pd.DataFrame({
+            ticker: np.concatenate([np.full(length - len(values), np.nan), values]) for ticker, values in returns.items()
+        }, columns=list(returns))
+        summary = stats.get_window_stat_summary(returns)
+        summary.index.names = ['Ticker', 'Window']
+        index = _read_stats_index(exchange, store_dir)
+        if index is not None:
+            summary = pd.concat([index[~index.index.get_level_values('Ticker').isin(list(closes))], summary])
+        path = _get_stats_index_path(exchange, store_dir)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = path + '.tmp'
+        fastparquet.write(tmp_path, summary.reset_index(), write_index=False)
+        os.replace(tmp_path, path)
+
+
+def read_stats_index(tickers, window='1y', exchange='US', store_dir=STORE_DIR):
+    """Read the statistics of tickers over a trailing window from the statistics index
+
+  Parameters
+  ----------
+  tickers: list
+    List of tickers
+  window: str, optional, default='1y'
+    Window of stats.STAT_WINDOWS
+  exchange: str, optional, default='US'
+    Exchange code
+  store_dir: str, optional
+    Root directory of the price store
+
+  Returns
+  -------
+  pd.DataFrame
+    Columns of stats.get_portfolio_stat_summary, one row per ticker, missing for tickers that are not stored
+    or have a shorter history than the window
+
+  Notes
+  -----
+    The index is read once per process and version, so a read costs in proportion to the number of tickers.
+    Stored tickers missing from the index, e.g. stored before it existed, are added to it first.
+  """
+    if window not in stats.STAT_WINDOWS:
+        raise ValueError(f"Unknown window {window!r}, expected one of {', '.join(stats.STAT_WINDOWS)}")
+    tickers = list(tickers)
+    index = _read_stats_index(exchange, store_dir)
+    indexed = set() if index is None else set(index.index.get_level_values('Ticker'))
+    manifest = get_manifest(exchange, store_dir)
+    missing = [ticker for ticker in tickers if ticker in manifest and ticker not in indexed]
+    if missing:
+        update_stats_index({ticker: pd.Series(dtype=np.float64) for ticker in missing}, exchange, store_dir)
+        index = _read_stats_index(exchange, store_dir)
+    if index is None:
+        return pd.DataFrame(index=tickers, columns=stats.get_window_stat_summary(pd.DataFrame()).columns, dtype=float)
+    return index.xs(window, level='Window').reindex(tickers)
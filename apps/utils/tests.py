@@ -0,0 +1,667 @@
+import functools
+import http.server
+import multiprocessing
+import os
+import shutil
+import tempfile
+import threading
+import urllib.parse
+from unittest import mock
+
+import cvxpy as cp
+import numpy as np
+import pandas as pd
+import requests
+from django.test import SimpleTestCase
+
+from ..blacklitterman.pypfopt import risk_models
+from . import annualize, backtest, covariance, matrix, mvo, reader, risk, rolling, stats, store
+from .cache import LRUCache
+from .online import OnlineStats
+
+
+def get_quotes(start, end, first_close=100.):
+    """Daily quotes in the format of the EOD source, one row per business day"""
+    dates = pd.bdate_range(start, end, name='Date')
+    close = first_close + np.arange(len(dates), dtype=np.float64)
+    return pd.DataFrame({
+        'Open': close, 'High': close, 'Low': close, 'Close': close, 'Adjusted_close': close,
+        'Volume': np.full(len(dates), 1000.),
+    }, index=dates)
+
+
+class StoreTestCase(SimpleTestCase):
+    def setUp(self):
+        self.store_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.store_dir, ignore_errors=True)
+
+
+class StoreTests(StoreTestCase):
+    def test_read_written_quotes(self):
+        quotes = get_quotes('2020-01-01', '2020-03-31')
+        written = store.write_quotes('AAPL', quotes, '2020-01-01', '2020-03-31', store_dir=self.store_dir)
+        self.assertEqual(written, len(quotes))
+        df = store.read_quotes(['AAPL'], columns=['Close'], start='2020-02-01', end='2020-02-29',
+                               store_dir=self.store_dir)
+        expected = quotes.loc['2020-02-01':'2020-02-29', 'Close']
+        self.assertEqual(list(df.columns), ['Date', 'Ticker', 'Close'])
+        self.assertEqual(list(df['Date']), list(expected.index))
+        np.testing.assert_array_equal(df['Close'], expected)
+
+    def test_read_many_tickers(self):
+        store.write_quotes_many([
+            ('AAPL', get_quotes('2020-01-01', '2020-01-31'), '2020-01-01', '2020-01-31'),
+            ('MSFT', get_quotes('2020-01-15', '2020-01-31', 200.), '2020-01-01', '2020-01-31'),
+        ], store_dir=self.store_dir)
+        df = store.read_quotes(['MSFT', 'AAPL'], columns=['Close'], store_dir=self.store_dir)
+        self.assertEqual(list(df['Ticker'].unique()), ['AAPL', 'MSFT'])
+        self.assertEqual(df[df['Ticker'] == 'MSFT']['Close'].iloc[0], 200.)
+        self.assertTrue(store.read_quotes(['GOOG'], store_dir=self.store_dir).empty)
+
+    def test_missing_ranges(self):
+        self.assertEqual(
+            store.get_missing_ranges(['AAPL'], '2020-01-01', '2020-12-31', store_dir=self.store_dir),
+            {'AAPL': [(pd.Timestamp('2020-01-01'), pd.Timestamp('2020-12-31'))]},
+        )
+        # coverage is the requested range, a ticker listed after its start is not fetched again
+        store.write_quotes('AAPL', get_quotes('2020-03-02', '2020-06-30'), '2020-01-01', '2020-06-30',
+                           store_dir=self.store_dir)
+        self.assertEqual(store.get_missing_ranges(['AAPL'], '2020-01-01', '2020-06-30', store_dir=self.store_dir), {})
+        self.assertEqual(
+            store.get_missing_ranges(['AAPL'], '2019-12-01', '2020-07-31', store_dir=self.store_dir),
+            {'AAPL': [
+                (pd.Timestamp('2019-12-01'), pd.Timestamp('2019-12-31')),
+                (pd.Timestamp('2020-07-01'), pd.Timestamp('2020-07-31')),
+            ]},
+        )
+
+    def test_manifest_and_version(self):
+        self.assertEqual(store.get_manifest(store_dir=self.store_dir), {})
+        self.assertEqual(store.get_version(store_dir=self.store_dir), 0)
+        store.write_quotes('AAPL', get_quotes('2020-01-01', '2020-01-31'), '2020-01-01', '2020-01-31',
+                           store_dir=self.store_dir)
+        self.assertEqual(store.get_manifest(store_dir=self.store_dir)['AAPL'],
+                         {'start': '2020-01-01', 'end': '2020-01-31', 'last': '2020-01-31'})
+        self.assertNotEqual(store.get_version(store_dir=self.store_dir), 0)
+        self.assertEqual(store.get_version('INDX', store_dir=self.store_dir), 0)
+
+
+class AppendTests(StoreTestCase):
+    def get_part_files(self):
+        exchange_dir = os.path.join(self.store_dir, 'US')
+        return {
+            os.path.join(root, name): os.stat(os.path.join(root, name)).st_mtime_ns
+            for root, _, names in os.walk(exchange_dir) for name in names if name.endswith('.parquet')
+        }
+
+    def test_tail_ranges(self):
+        store.write_quotes('AAPL', get_quotes('2020-01-01', '2020-01-29'), '2020-01-01', '2020-01-31',
+                           store_dir=self.store_dir)
+        self.assertEqual(store.get_tail_ranges(end='2020-02-07', store_dir=self.store_dir),
+                         {'AAPL': (pd.Timestamp('2020-01-30'), pd.Timestamp('2020-02-07'))})
+        self.assertEqual(store.get_tail_ranges(end='2020-01-29', store_dir=self.store_dir), {})
+        self.assertEqual(store.get_tail_ranges(['MSFT'], end='2020-02-07', store_dir=self.store_dir), {})
+
+    def test_append_keeps_stored_files(self):
+        quotes = get_quotes('2020-01-01', '2020-02-28')
+        store.write_quotes('AAPL', quotes[:'2020-01-31'], '2020-01-01', '2020-01-31', store_dir=self.store_dir)
+        files = self.get_part_files()
+        start, end = store.get_tail_ranges(end='2020-02-28', store_dir=self.store_dir)['AAPL']
+        written = store.write_quotes('AAPL', quotes[start:end], start, end, store_dir=self.store_dir)
+        self.assertEqual(written, len(quotes['2020-02-01':]))
+        new_files = self.get_part_files()
+        self.assertEqual({path: new_files[path] for path in files}, files)
+        self.assertEqual(len(new_files), len(files) + 1)
+        df = store.read_quotes(['AAPL'], columns=['Close'], store_dir=self.store_dir)
+        np.testing.assert_array_equal(df['Close'], quotes['Close'])
+        self.assertEqual(store.get_manifest(store_dir=self.store_dir)['AAPL'],
+                         {'start': '2020-01-01', 'end': '2020-02-28', 'last': '2020-02-28'})
+
+    def test_rewritten_rows_keep_the_last_write(self):
+        store.write_quotes('AAPL', get_quotes('2020-01-01', '2020-01-31'), '2020-01-01', '2020-01-31',
+                           store_dir=self.store_dir)
+        store.write_quotes('AAPL', get_quotes('2020-01-31', '2020-02-07', 500.), '2020-01-31', '2020-02-07',
+                           store_dir=self.store_dir)
+        df = store.read_quotes(['AAPL'], columns=['Close'], start='2020-01-30', end='2020-02-03',
+                               store_dir=self.store_dir)
+        self.assertEqual(list(df['Close']), [121., 500., 501.])
+
+
+def write_tickers(store_dir, tickers):
+    for ticker in tickers:
+        store.write_quotes(ticker, get_quotes('2020-01-01', '2020-01-31'), '2020-01-01', '2020-01-31',
+                           store_dir=store_dir)
+
+
+class ConcurrentWriteTests(StoreTestCase):
+    def test_processes_write_the_same_store(self):
+        context = multiprocessing.get_context('fork')
+        processes = [
+            context.Process(target=write_tickers, args=(self.store_dir, [f'T{i}{j}' for j in range(5)]))
+            for i in range(4)
+        ]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join()
+        self.assertEqual([process.exitcode for process in processes], [0] * 4)
+        tickers = [f'T{i}{j}' for i in range(4) for j in range(5)]
+        self.assertEqual(sorted(store.get_manifest(store_dir=self.store_dir)), tickers)
+        df = store.read_quotes(tickers, columns=['Close'], store_dir=self.store_dir)
+        self.assertEqual(df.groupby('Ticker').size().to_dict(), {ticker: 23 for ticker in tickers})
+
+    def test_reads_wait_for_a_write(self):
+        write_tickers(self.store_dir, ['AAPL'])
+        result = {}
+        reader_thread = threading.Thread(target=lambda: result.update(
+            df=store.read_quotes(['AAPL'], columns=['Close'], store_dir=self.store_dir)
+        ))
+        with store._write_lock(self.store_dir):
+            reader_thread.start()
+            reader_thread.join(0.2)
+            self.assertTrue(reader_thread.is_alive())
+        reader_thread.join()
+        self.assertEqual(len(result['df']), 23)
+
+
+class StatsIndexTests(StoreTestCase):
+    def setUp(self):
+        super().setUp()
+        rng = np.random.default_rng(0)
+        self.quotes = {}
+        for ticker, start in (('AAPL', '2015-01-01'), ('MSFT', '2018-06-01')):
+            quotes = get_quotes(start, '2020-12-31')
+            quotes['Close'] = 100 * np.cumprod(1 + rng.normal(0.0005, 0.02, len(quotes)))
+            self.quotes[ticker] = quotes
+
+    def write(self, start, end):
+        store.write_quotes_many([
+            (ticker, quotes[start:end], start, end) for ticker, quotes in self.quotes.items()
+        ], store_dir=self.store_dir)
+
+    def get_expected(self, end):
+        returns = pd.DataFrame({ticker: quotes[:end]['Close'].pct_change() for ticker, quotes in self.quotes.items()})
+        return stats.get_window_stat_summary(returns)
+
+    def assert_index_equal(self, end):
+        expected = self.get_expected(end)
+        for window in stats.STAT_WINDOWS:
+            result = store.read_stats_index(['AAPL', 'MSFT', 'GOOG'], window, store_dir=self.store_dir)
+            self.assertTrue(result.loc['GOOG'].isna().all())
+            pd.testing.assert_frame_equal(result.loc[['AAPL', 'MSFT']], expected.xs(window, level=1),
+                                          check_exact=False, rtol=1e-12, check_names=False)
+
+    def test_updates_from_the_written_closes(self):
+        self.write('2015-01-01', '2020-06-30')
+        self.assert_index_equal('2020-06-30')
+        # the stored history is read once, later writes only merge their closes into the last ones
+        with mock.patch.object(store, 'read_quotes', side_effect=AssertionError('store read')):
+            self.write('2020-06-30', '2020-12-31')
+        self.assert_index_equal('2020-12-31')
+        tail = store._read_stats_tail('AAPL', 'US', self.store_dir)
+        self.assertEqual(len(tail), store.STATS_TAIL_SIZE)
+        self.assertEqual(tail.index[-1], pd.Timestamp('2020-12-31'))
+
+    def test_stored_tickers_are_indexed_on_read(self):
+        self.write('2015-01-01', '2020-12-31')
+        shutil.rmtree(os.path.join(self.store_dir, store.STATS_DIR))
+        self.assert_index_equal('2020-12-31')
+        with self.assertRaises(ValueError):
+            store.read_stats_index(['AAPL'], 'full', store_dir=self.store_dir)
+
+
+class MatrixTests(StoreTestCase):
+    def test_write_matrix(self):
+        dates = pd.bdate_range('2020-01-01', periods=30, name='Date')
+        values = np.random.default_rng(0).normal(100, 1, (len(dates), 4))
+        values[:5, 3] = np.nan
+        frame = pd.DataFrame(values, index=dates, columns=['A', 'B', 'C', 'D'])
+        path = os.path.join(self.store_dir, 'matrix')
+        matrix.write_matrix(frame, path)
+        mapped = matrix.open_matrix(path)
+        pd.testing.assert_frame_equal(mapped.get_frame(), frame, check_names=False, check_freq=False)
+
+        # consecutive tickers are a read-only view of the mapped file
+        view = mapped.get_frame('2020-01-10', '2020-01-20', ['B', 'C'])
+        pd.testing.assert_frame_equal(view, frame.loc['2020-01-10':'2020-01-20', ['B', 'C']], check_names=False,
+                                      check_freq=False)
+        self.assertTrue(np.shares_memory(view.to_numpy(), mapped.values))
+        self.assertFalse(view.to_numpy().flags.writeable)
+        # other tickers are copied, in the requested order
+        values = mapped.get_values('2020-01-10', None, ['D', 'A'])
+        np.testing.assert_array_equal(values, frame.loc['2020-01-10':, ['D', 'A']].to_numpy())
+        self.assertFalse(np.shares_memory(values, mapped.values))
+        with self.assertRaises(KeyError):
+            mapped.get_values(tickers=['A', 'E'])
+
+        matrix.write_matrix(frame, os.path.join(self.store_dir, 'float32'), np.float32)
+        values = matrix.open_matrix(os.path.join(self.store_dir, 'float32')).get_values()
+        self.assertEqual(values.dtype, np.float32)
+        np.testing.assert_allclose(values, frame.to_numpy(), rtol=1e-6)
+
+    def test_rebuilt_after_a_write(self):
+        store.write_quotes_many([
+            ('AAPL', get_quotes('2020-01-01', '2020-01-31'), '2020-01-01', '2020-01-31'),
+            ('MSFT', get_quotes('2020-01-15', '2020-01-31', 200.), '2020-01-01', '2020-01-31'),
+        ], store_dir=self.store_dir)
+        prices, returns = store.open_matrices(store_dir=self.store_dir)
+        self.assertEqual(list(prices.tickers), ['AAPL', 'MSFT'])
+        self.assertEqual(prices.dates[-1], pd.Timestamp('2020-01-31'))
+        self.assertAlmostEqual(returns.get_frame('2020-01-02', '2020-01-02')['AAPL'].iloc[0], 1 / 100)
+        self.assertEqual(store.open_matrices(store_dir=self.store_dir)[0], prices)
+
+        store.write_quotes('AAPL', get_quotes('2020-02-03', '2020-02-07', 500.), '2020-02-01', '2020-02-07',
+                           store_dir=self.store_dir)
+        new_prices, new_returns = store.open_matrices(store_dir=self.store_dir)
+        self.assertEqual(new_prices.dates[-1], pd.Timestamp('2020-02-07'))
+        self.assertAlmostEqual(new_returns.get_frame('2020-02-03', '2020-02-03')['AAPL'].iloc[0], 500 / 122 - 1)
+        # only the matrices of the new version are kept, the old ones stay readable while mapped
+        version_dir = os.path.dirname(new_prices.path)
+        self.assertEqual(os.listdir(os.path.dirname(version_dir)), [os.path.basename(version_dir)])
+        self.assertEqual(prices.get_values(tickers=['MSFT'])[-1, 0], 212.)
+
+
+class CacheTests(SimpleTestCase):
+    def test_eviction(self):
+        cache = LRUCache(3 * 800, name='test')
+        for key in 'abc':
+            cache.set(key, np.zeros(100))
+        self.assertIsNotNone(cache.get('a'))
+        cache.set('d', np.zeros(100))
+        # b is the least recently used
+        self.assertEqual(sorted(cache._items), ['a', 'c', 'd'])
+        self.assertEqual(cache.stats()['bytes'], 2400)
+        cache.set('e', np.zeros(1000))
+        self.assertNotIn('e', cache)
+        self.assertEqual(len(cache), 3)
+
+    def test_get_or_set(self):
+        cache = LRUCache(1024)
+        compute = mock.Mock(return_value='value')
+        self.assertEqual(cache.get_or_set('key', compute), 'value')
+        self.assertEqual(cache.get_or_set('key', compute), 'value')
+        compute.assert_called_once_with()
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+
+    def test_invalidate(self):
+        cache = LRUCache(1024)
+        cache.set(('a', 'US'), 1)
+        cache.set(('b', 'US'), 2)
+        cache.set(('c', 'INDX'), 3)
+        self.assertEqual(cache.invalidate(lambda key: key[1] == 'US'), 2)
+        self.assertEqual(list(cache._items), [('c', 'INDX')])
+        self.assertEqual(cache.invalidate(), 1)
+        self.assertEqual(cache.stats()['bytes'], 0)
+
+
+class MarketCacheTests(SimpleTestCase):
+    def setUp(self):
+        reader.market_cache.invalidate()
+        self.addCleanup(reader.market_cache.invalidate)
+        self.version = 1
+        patchers = [
+            mock.patch.object(store, 'get_version', side_effect=lambda exchange='US': self.version),
+            mock.patch.object(reader, '_get_quotes', side_effect=lambda *args: (object(), object())),
+        ]
+        for patcher in patchers:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_frames_are_shared(self):
+        frames = reader.get_quotes(['AAPL', 'MSFT'])
+        self.assertIs(reader.get_quotes(['AAPL', 'MSFT']), frames)
+        self.assertIsNot(reader.get_quotes(['MSFT', 'AAPL']), frames)
+        self.assertIsNot(reader.get_quotes(['AAPL', 'MSFT'], start='2015-01-01'), frames)
+        self.assertEqual(reader._get_quotes.call_count, 3)
+
+    def test_new_version(self):
+        frames = reader.get_quotes(['AAPL'])
+        self.version = 2
+        self.assertIsNot(reader.get_quotes(['AAPL']), frames)
+
+    def test_invalidate(self):
+        frames = reader.get_quotes(['AAPL'])
+        index = reader.get_quotes(['GSPC'], 'INDX')
+        self.assertEqual(reader.invalidate_market_cache('US'), 1)
+        self.assertIsNot(reader.get_quotes(['AAPL']), frames)
+        self.assertIs(reader.get_quotes(['GSPC'], 'INDX'), index)
+
+
+class CovarianceTests(SimpleTestCase):
+    def setUp(self):
+        covariance.covariance_cache.invalidate()
+        self.addCleanup(covariance.covariance_cache.invalidate)
+        rng = np.random.default_rng(0)
+        values = rng.normal(0, 0.01, (150, 3))
+        # every pair is observed over its own rows only, the pairwise matrix of the three tickers is indefinite
+        values[:50, 2] = np.nan
+        values[50:100, 0] = np.nan
+        values[100:, 1] = np.nan
+        values[:50, 1] = values[:50, 0]
+        values[50:100, 2] = values[50:100, 1]
+        values[100:, 2] = -values[100:, 0]
+        self.returns = pd.DataFrame(values, columns=['A', 'B', 'C'])
+        patchers = [
+            mock.patch.object(store, 'get_version', return_value=1),
+            mock.patch.object(store, 'get_manifest', return_value=dict.fromkeys(self.returns.columns, {})),
+            mock.patch.object(store, 'get_missing_ranges', return_value={}),
+            mock.patch.object(reader, 'get_mapped_quotes',
+                              side_effect=lambda tickers, *args: (None, self.returns[tickers])),
+        ]
+        for patcher in patchers:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_requested_tickers(self):
+        matrix = covariance.get_covariance(['A', 'B'])
+        reader.get_mapped_quotes.assert_called_once_with(['A', 'B'], 'US', reader.START_DATE, reader.END_DATE)
+        pd.testing.assert_frame_equal(matrix, risk_models.sample_cov(self.returns[['A', 'B']], returns_data=True,
+                                                                     frequency=255))
+
+    def test_from_universe(self):
+        for tickers in (['A', 'B'], ['C', 'A']):
+            matrix = covariance.get_covariance(tickers, from_universe=True)
+            # the block of the pairwise matrix, not of the matrix fixed to be positive semidefinite
+            pd.testing.assert_frame_equal(matrix, self.returns[tickers].cov() * 255)
+        self.assertLess(np.linalg.eigvalsh(covariance.get_covariance(['A', 'B', 'C'], from_universe=True)).min(), 0)
+        reader.get_mapped_quotes.assert_called_once_with(['A', 'B', 'C'], 'US', reader.START_DATE, reader.END_DATE)
+        with self.assertRaises(ValueError):
+            covariance.get_covariance(['A', 'B'], 'ledoit_wolf', from_universe=True)
+
+    def test_store_written_while_loading(self):
+        def get_mapped_quotes(tickers, *args):
+            # the missing quotes are fetched and written to the store
+            store.get_version.return_value = 2
+            return None, self.returns[tickers]
+
+        reader.get_mapped_quotes.side_effect = get_mapped_quotes
+        matrix = covariance.get_covariance(['A', 'B'])
+        self.assertIs(covariance.get_covariance(['A', 'B']), matrix)
+        reader.get_mapped_quotes.assert_called_once()
+
+
+def solve_min_variance(covariance_matrix, constraints):
+    """Reference long only minimum variance weights with cvxpy, constraints is a function of the weights variable"""
+    weights = cp.Variable(covariance_matrix.shape[0])
+    problem = cp.Problem(cp.Minimize(cp.quad_form(weights, covariance_matrix)), [weights >= 0, *constraints(weights)])
+    problem.solve(solver=cp.OSQP, eps_abs=1e-12, eps_rel=1e-12, max_iter=200000, polish=True)
+    return weights.value / weights.value.sum()
+
+
+class MvoTests(SimpleTestCase):
+    def setUp(self):
+        prices = pd.read_csv('./apps/data/stocks.csv', index_col=0, parse_dates=True)
+        returns = prices[['AAPL', 'ABT', 'BRK', 'JNJ', 'KO', 'MSFT', 'NVDA', 'PG', 'TSLA', 'XOM']].pct_change().dropna()
+        self.expected_returns = returns.mean().to_numpy() * 255
+        self.covariance_matrix = returns.cov().to_numpy() * 255
+
+    def test_bounds_active(self):
+        # the long only bounds bind, the portfolios come from the active-set method
+        mu, sigma = self.expected_returns, self.covariance_matrix
+        gmv = mvo.get_gmv_portfolio(sigma)
+        self.assertGreater((gmv < 1e-12).sum(), 0)
+        np.testing.assert_allclose(gmv, solve_min_variance(sigma, lambda w: [cp.sum(w) == 1]), atol=1e-8)
+        max_sharpe = mvo.maximize_sharpe_ratio(0.02, mu, sigma)
+        self.assertGreater((max_sharpe < 1e-12).sum(), 0)
+        np.testing.assert_allclose(max_sharpe, solve_min_variance(sigma, lambda w: [(mu - 0.02) @ w == 1]), atol=1e-8)
+        targets = np.linspace(mu.min(), mu.max(), 15)
+        for weights, target in zip(mvo.get_optimal_weights(15, mu, sigma), targets):
+            expected = solve_min_variance(sigma, lambda w: [cp.sum(w) == 1, mu @ w == target])
+            np.testing.assert_allclose(weights, expected, atol=1e-8)
+            self.assertAlmostEqual(weights @ mu, target, places=12)
+
+    def test_analytic(self):
+        # uncorrelated assets, no bound binds and the analytic portfolios are optimal
+        variances = np.array([0.04, 0.09, 0.0625])
+        mu = np.array([0.08, 0.12, 0.1])
+        sigma = np.diag(variances)
+        np.testing.assert_allclose(mvo.get_gmv_portfolio(sigma), (1 / variances) / (1 / variances).sum())
+        tangency = (mu - 0.02) / variances
+        np.testing.assert_allclose(mvo.maximize_sharpe_ratio(0.02, mu, sigma), tangency / tangency.sum())
+        weights = mvo.get_optimal_weights(3, mu, sigma)[1]
+        expected = solve_min_variance(sigma, lambda w: [cp.sum(w) == 1, mu @ w == 0.1])
+        np.testing.assert_allclose(weights, expected, atol=1e-8)
+
+
+class StatsTests(SimpleTestCase):
+    def get_summary(self, returns_series):
+        # column by column, with the functions of annualize and risk
+        return pd.DataFrame({
+            "Annualized Returns": returns_series.aggregate(annualize.get_annualized_returns, periods_per_year=255),
+            "Annualized Volatility": returns_series.aggregate(annualize.get_annualized_volatility,
+                                                              periods_per_year=255),
+            "Skewness": returns_series.aggregate(stats.get_skewness),
+            "Kurtosis": returns_series.aggregate(stats.get_kurtosis),
+            "Cornish Fischer VaR (5%)": returns_series.aggregate(risk.get_cf_var),
+            "Historic CVaR (5%)": returns_series.aggregate(risk.get_conditional_historic_var),
+            "Sharpe Ratio": returns_series.aggregate(risk.get_sharpe_ratio, risk_free_rate=0.03, periods_per_year=255),
+            "Maximum Drawdown": returns_series.aggregate(lambda column: risk.get_drawdown(column).Drawdown.min()),
+        })
+
+    def test_summary(self):
+        prices = pd.read_csv('./apps/data/stocks.csv', index_col=0, parse_dates=True)
+        returns = prices.pct_change().iloc[1:]
+        # tickers listed after the first date have leading missing returns, add gaps inside the histories too
+        with_gaps = returns.mask(np.random.default_rng(0).random(returns.shape) < 0.05)
+        for returns_series in (returns, with_gaps):
+            with np.errstate(invalid='ignore'):
+                expected = self.get_summary(returns_series)
+            pd.testing.assert_frame_equal(stats.get_portfolio_stat_summary(returns_series), expected,
+                                          check_exact=False, rtol=1e-12)
+
+
+class MonteCarloVarTests(SimpleTestCase):
+    def test_labels_are_aligned(self):
+        prices = pd.read_csv('./apps/data/stocks.csv', index_col=0, parse_dates=True)
+        returns = prices[['AAPL', 'BRK', 'KO', 'MSFT', 'XOM']].pct_change().dropna()
+        expected_returns, covariance_matrix = returns.mean(), returns.cov()
+        weights = pd.DataFrame([[0.4, 0.3, 0.2, 0.1, 0.], [0.1, 0.1, 0.1, 0.7, 0.]], columns=returns.columns)
+        expected = risk.get_monte_carlo_var(expected_returns.to_numpy(), covariance_matrix.to_numpy(), weights,
+                                            horizons=(1, 10), number_of_scenarios=20000, seed=1)
+        # the same assets in other orders, and weights without the zero ones
+        order = ['XOM', 'KO', 'AAPL', 'MSFT', 'BRK']
+        var = risk.get_monte_carlo_var(expected_returns[order], covariance_matrix, weights[order[1:]],
+                                       horizons=(1, 10), number_of_scenarios=20000, seed=1)
+        pd.testing.assert_frame_equal(var, expected, check_exact=False, rtol=1e-12)
+        with self.assertRaises(ValueError):
+            risk.get_monte_carlo_var(expected_returns.drop('KO'), covariance_matrix, weights, seed=1)
+
+
+class BacktestTests(SimpleTestCase):
+    def setUp(self):
+        self.prices = pd.read_csv('./apps/data/stocks.csv', index_col=0, parse_dates=True)
+
+    def test_windows(self):
+        # the slid window sums give the estimates computed from every window, BRK has constant prices for a year
+        returns = self.prices.pct_change().iloc[1:]
+        estimates = []
+
+        def record(expected_returns, covariance_matrix):
+            estimates.append((expected_returns, covariance_matrix))
+            return np.zeros(len(expected_returns))
+
+        result = backtest.run_backtest(self.prices, record, max_workers=1)
+        self.assertEqual(len(estimates), len(result.weights))
+        constant_windows = 0
+        for date, (expected_returns, covariance_matrix) in zip(result.weights.index, estimates):
+            window = returns.loc[:date].iloc[-256:-1]
+            constant_windows += (window['BRK'] == 0).all()
+            window = window.loc[:, window.notna().all() & (window != 0).any()]
+            pd.testing.assert_index_equal(expected_returns.index, window.columns)
+            pd.testing.assert_frame_equal(covariance_matrix, window.cov() * 255, check_exact=False, rtol=1e-9,
+                                          atol=1e-15)
+            # a window of 255 periods is a year
+            pd.testing.assert_series_equal(expected_returns, np.expm1(np.log1p(window).sum()), check_exact=False,
+                                           rtol=1e-9)
+        self.assertGreater(constant_windows, 0)
+
+    def test_max_workers(self):
+        tickers = ['AAPL', 'BRK', 'FB', 'JNJ', 'KO', 'MSFT', 'PYPL', 'XOM']
+        for optimizer, prices in [('gmv', self.prices), ('cla_max_sharpe', self.prices), ('hrp', self.prices[tickers])]:
+            expected = backtest.run_backtest(prices, optimizer, max_workers=1)
+            result = backtest.run_backtest(prices, optimizer, max_workers=4)
+            pd.testing.assert_frame_equal(result.weights, expected.weights, check_exact=True)
+            pd.testing.assert_series_equal(result.equity, expected.equity, check_exact=True)
+
+
+class RollingTests(SimpleTestCase):
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        self.returns = pd.DataFrame(rng.normal(0.0005, 0.02, (300, 3)), columns=['A', 'B', 'C'],
+                                    index=pd.bdate_range('2020-01-01', periods=300))
+        # a ticker listed later and gaps inside the histories
+        self.returns.iloc[:50, 1] = np.nan
+        self.returns = self.returns.mask(rng.random(self.returns.shape) < 0.05)
+
+    def test_series(self):
+        functions = (rolling.get_rolling_volatility, rolling.get_rolling_sharpe_ratio,
+                     rolling.get_rolling_maximum_drawdown)
+        for function in functions:
+            with np.errstate(all='raise'):
+                expected = function(self.returns, 60, min_periods=40)
+                result = function(self.returns['B'], 60, min_periods=40)
+            pd.testing.assert_series_equal(result, expected['B'])
+
+    def test_maximum_drawdown(self):
+        for window in (None, 20, 60):
+            drawdown = rolling.get_rolling_maximum_drawdown(self.returns, window)
+            for end in range(0, len(self.returns), 7):
+                start = 0 if window is None else max(0, end - window + 1)
+                expected = stats.get_portfolio_stat_summary(self.returns.iloc[start:end + 1])['Maximum Drawdown']
+                result = drawdown.iloc[end]
+                # windows with fewer valid returns than min_periods are missing
+                expected = expected.where(result.notna())
+                np.testing.assert_allclose(result, expected, rtol=1e-9)
+
+
+class OnlineStatsTests(SimpleTestCase):
+    def test_blocks_and_rows(self):
+        rng = np.random.default_rng(0)
+        returns = pd.DataFrame(rng.normal(0.0005, 0.02, (400, 3)), columns=['A', 'B', 'C'])
+        # a ticker listed later, the wealth index starts at its first valid return
+        returns.iloc[:100, 1] = np.nan
+        returns.iloc[:, 2] = np.nan
+        expected = stats.get_portfolio_stat_summary(returns)
+        by_block, by_row = OnlineStats(returns.columns), OnlineStats(returns.columns)
+        for start in range(0, len(returns), 37):
+            by_block.update(returns.iloc[start:start + 37])
+        for _, row in returns.iterrows():
+            by_row.update(row)
+        for accumulator in (by_block, by_row):
+            with np.errstate(all='raise'):
+                summary = accumulator.summary()
+            pd.testing.assert_frame_equal(summary, expected, check_exact=False, rtol=1e-9)
+
+    def test_significance_level(self):
+        rng = np.random.default_rng(0)
+        returns = pd.DataFrame(rng.normal(0.0005, 0.02, (400, 2)), columns=['A', 'B'])
+        expected = stats.get_portfolio_stat_summary(returns, significance_level=1)
+        self.assertIn('Cornish Fischer VaR (1%)', expected.columns)
+        self.assertIn('Historic CVaR (1%)', expected.columns)
+        accumulator = OnlineStats(returns.columns, significance_level=1)
+        accumulator.update(returns)
+        pd.testing.assert_frame_equal(accumulator.summary(), expected, check_exact=False, rtol=1e-9)
+
+
+class EODHandler(http.server.BaseHTTPRequestHandler):
+    """Stand-in for the EOD API: /api/eod/<ticker>.<exchange> answers with the scripted status codes of the
+    ticker in turn, then with the quotes of the requested range as EOD CSV"""
+
+    def do_GET(self):
+        url = urllib.parse.urlparse(self.path)
+        params = urllib.parse.parse_qs(url.query)
+        ticker = url.path.rsplit('/', 1)[-1].rsplit('.', 1)[0]
+        server = self.server
+        with server.lock:
+            server.requests.append(ticker)
+            statuses = server.statuses.get(ticker, [])
+            status = statuses.pop(0) if statuses else 200
+        if status != 200:
+            self.send_response(status)
+            self.end_headers()
+            return
+        quotes = get_quotes(params['from'][0], params['to'][0])
+        # the EOD CSV ends with a footer line
+        body = quotes.to_csv(date_format='%Y-%m-%d') + '207 rows\n'
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/csv')
+        self.end_headers()
+        self.wfile.write(body.encode())
+
+    def log_message(self, *args):
+        pass
+
+
+class FetchTests(SimpleTestCase):
+    def setUp(self):
+        self.server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), EODHandler)
+        self.server.lock = threading.Lock()
+        self.server.requests = []
+        self.server.statuses = {}
+        thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        thread.start()
+        self.addCleanup(thread.join)
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        session = requests.Session()
+        self.addCleanup(session.close)
+        self.source = functools.partial(
+            reader.fetch_eod, base_url=f'http://127.0.0.1:{self.server.server_port}/api', api_key='secret',
+            session=session,
+        )
+        patcher = mock.patch.object(reader, 'RETRY_BACKOFF', 0.)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_fetch_eod(self):
+        quotes = self.source('AAPL', 'US', '2020-01-01', '2020-01-31')
+        expected = get_quotes('2020-01-01', '2020-01-31')
+        self.assertEqual(list(quotes.columns), list(expected.columns))
+        self.assertEqual(list(quotes.index), list(expected.index))
+        np.testing.assert_array_equal(quotes['Close'], expected['Close'])
+
+    def test_fetch_many(self):
+        tickers = ['AAPL', 'MSFT', 'GOOG', 'AMZN']
+        fetched, failures = reader.fetch_many(
+            [(ticker, '2020-01-01', '2020-01-31') for ticker in tickers], source=self.source, max_workers=2,
+        )
+        self.assertEqual(failures, {})
+        self.assertEqual([ticker for ticker, _, _, _ in fetched], tickers)
+        for _, quotes, start, end in fetched:
+            self.assertEqual((start, end), ('2020-01-01', '2020-01-31'))
+            self.assertEqual(len(quotes), 23)
+        self.assertEqual(sorted(self.server.requests), sorted(tickers))
+
+    def test_retry(self):
+        self.server.statuses = {'AAPL': [503, 500], 'MSFT': [429]}
+        fetched, failures = reader.fetch_many(
+            [('AAPL', '2020-01-01', '2020-01-31'), ('MSFT', '2020-01-01', '2020-01-31')], source=self.source,
+        )
+        self.assertEqual(failures, {})
+        self.assertEqual(len(fetched), 2)
+        self.assertEqual(self.server.requests.count('AAPL'), 3)
+        self.assertEqual(self.server.requests.count('MSFT'), 2)
+
+    def test_failures(self):
+        # client errors are not retried, server errors are retried until the attempts run out
+        self.server.statuses = {'NOPE': [404], 'DOWN': [500] * 5}
+        fetched, failures = reader.fetch_many(
+            [('AAPL', '2020-01-01', '2020-01-31'), ('NOPE', '2020-01-01', '2020-01-31'),
+             ('DOWN', '2020-01-01', '2020-01-31')],
+            source=self.source, retries=3,
+        )
+        self.assertEqual([ticker for ticker, _, _, _ in fetched], ['AAPL'])
+        self.assertEqual(sorted(failures), ['DOWN', 'NOPE'])
+        self.assertIn('404', failures['NOPE'])
+        self.assertIn('500', failures['DOWN'])
+        # the request URL carries the API token, it must not leak into the messages
+        self.assertNotIn('secret', failures['NOPE'] + failures['DOWN'])
+        self.assertEqual(self.server.requests.count('NOPE'), 1)
+        self.assertEqual(self.server.requests.count('DOWN'), 3)
+
+    def test_connection_error(self):
+        self.server.shutdown()
+        self.server.server_close()
+        fetched, failures = reader.fetch_many([('AAPL', '2020-01-01', '2020-01-31')], source=self.source, retries=2)
+        self.assertEqual(fetched, [])
+        self.assertIn('ConnectionError', failures['AAPL'])
@@ -0,0 +1,4 @@
+"""Benchmarks of the statistics, risk models and optimizers on synthetic universes
+
+Run with python -m benchmarks, see docs/benchmarks.md
+"""
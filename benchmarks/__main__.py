@@ -0,0 +1,62 @@
+import argparse
+import sys
+
+from .cases import CASES, GROUPS
+from .harness import compare_results, read_results, run_benchmarks, write_results
+
+
+def get_parser():
+    parser = argparse.ArgumentParser(
+        prog='python -m benchmarks', description='Benchmarks of the statistics, risk models and optimizers on synthetic universes'
+    )
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    run = commands.add_parser('run', help='Benchmark the cases on synthetic universes and write the results as JSON')
+    run.add_argument('--assets', type=int, nargs='+', default=[10, 100, 500], help='Numbers of assets')
+    run.add_argument('--years', type=float, nargs='+', default=[1, 5], help='Years of daily prices')
+    run.add_argument('--missing-rate', type=float, default=0., help='Probability that a price is missing')
+    run.add_argument('--staggered', action='store_true', help='List the assets at different dates')
+    run.add_argument('--cases', nargs='+', choices=[case.name for case in CASES], metavar='CASE',
+                     help='Cases to run, see the list command')
+    run.add_argument('--groups', nargs='+', choices=GROUPS, help='Groups of cases to run')
+    run.add_argument('--repeat', type=int, default=3, help='Number of timed calls of every case')
+    run.add_argument('--seed', type=int, default=0, help='Seed of the synthetic prices')
+    run.add_argument('--output', default='benchmark-results.json', help='Path of the JSON results')
+
+    compare = commands.add_parser('compare', help='Compare the results of two runs')
+    compare.add_argument('baseline', help='JSON results of the reference run')
+    compare.add_argument('candidate', help='JSON results of the run to compare')
+
+    commands.add_parser('list', help='List the cases')
+    return parser
+
+
+def main(argv=None):
+    arguments = get_parser().parse_args(argv)
+    if arguments.command == 'list':
+        for case in CASES:
+            limit = f'up to {case.max_assets} assets' if case.max_assets is not None else ''
+            print(f'{case.group:<12}{case.name:<44}{limit}')
+    elif arguments.command == 'run':
+        report = run_benchmarks(
+            arguments.assets, arguments.years, arguments.cases, arguments.groups, arguments.missing_rate,
+            arguments.staggered, arguments.repeat, arguments.seed, log=print,
+        )
+        write_results(report, arguments.output)
+        print(f'Results written to {arguments.output}')
+    else:
+        rows = compare_results(read_results(arguments.baseline), read_results(arguments.candidate))
+        if not rows:
+            print('No case was run successfully in both runs', file=sys.stderr)
+            return 1
+        print(f"{'case':<44}{'assets':>7}{'years':>6}{'baseline s':>12}{'candidate s':>12}{'time':>8}{'memory':>8}")
+        for row in rows:
+            memory_ratio = f"{row['memory_ratio']:.2f}" if row['memory_ratio'] is not None else '-'
+            time_ratio = f"{row['time_ratio']:.2f}" if row['time_ratio'] is not None else '-'
+            print(f"{row['case']:<44}{row['assets']:>7}{row['years']:>6g}{row['baseline_best']:>12.4f}"
+                  f"{row['candidate_best']:>12.4f}{time_ratio:>8}{memory_ratio:>8}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,165 @@
+from collections import namedtuple
+from functools import cached_property
+
+import numpy as np
+
+from apps.utils import stats, mvo, annualize
+from apps.blacklitterman.pypfopt import (
+    BlackLittermanModel, CLA, DiscreteAllocation, EfficientFrontier, HRPOpt, risk_models,
+)
+from .synthetic import get_synthetic_market_caps, get_synthetic_prices
+
+# setup(universe) returns the arguments of run, only run is timed and memory profiled.
+# Cases are skipped for universes larger than max_assets (None: no limit).
+Case = namedtuple('Case', ['name', 'group', 'setup', 'run', 'max_assets'])
+
+PERIODS_PER_YEAR = 255
+NUMBER_OF_FRONTIER_POINTS = 20
+RISK_MODEL_METHODS = (
+    'sample_cov', 'semicovariance', 'exp_cov', 'min_cov_determinant', 'ledoit_wolf', 'ledoit_wolf_single_factor',
+    'ledoit_wolf_constant_correlation', 'oracle_approximating', 'factor_cov',
+)
+
+
+class Universe:
+    """Synthetic prices and the inputs of the benchmarked functions derived from them
+
+  Every input is computed once, on first use, and shared by the cases of the universe.
+  """
+
+    def __init__(self, number_of_assets, years, missing_rate=0., staggered=False, seed=0):
+        self.number_of_assets = number_of_assets
+        self.years = years
+        self.missing_rate = missing_rate
+        self.staggered = staggered
+        self.seed = seed
+
+    @cached_property
+    def prices(self):
+        return get_synthetic_prices(self.number_of_assets, self.years, PERIODS_PER_YEAR, self.missing_rate,
+                                    self.staggered, self.seed)
+
+    @cached_property
+    def returns(self):
+        return self.prices.pct_change().iloc[1:]
+
+    @cached_property
+    def expected_returns(self):
+        return annualize.get_annualized_returns(self.returns, PERIODS_PER_YEAR)
+
+    @cached_property
+    def covariance_matrix(self):
+        # shrunk, the sample covariance is singular when there are fewer periods than assets
+        return risk_models.CovarianceShrinkage(self.prices, frequency=PERIODS_PER_YEAR).ledoit_wolf()
+
+    @cached_property
+    def factor_model(self):
+        return risk_models.factor_cov(self.prices, frequency=PERIODS_PER_YEAR)
+
+    @cached_property
+    def market_caps(self):
+        return get_synthetic_market_caps(self.prices.columns, self.seed)
+
+    @cached_property
+    def weights(self):
+        # inverse variance weights, a cheap stand-in for the output of an optimizer
+        inverse_variance = 1 / np.diag(self.covariance_matrix.to_numpy())
+        return dict(zip(self.prices.columns, inverse_variance / inverse_variance.sum()))
+
+    @cached_property
+    def latest_prices(self):
+        return self.prices.ffill().iloc[-1]
+
+
+def _get_views(universe):
+    # absolute views on a tenth of the assets, with their confidences
+    tickers = universe.prices.columns[::10]
+    rng = np.random.default_rng(universe.seed)
+    return dict(zip(tickers, rng.normal(0.05, 0.1, len(tickers)))), rng.uniform(0.2, 0.8, len(tickers))
+
+
+def _run_black_litterman(covariance_matrix, market_caps, views, view_confidences):
+    bl = BlackLittermanModel(covariance_matrix, pi='market', market_caps=market_caps, absolute_views=views,
+                             omega='idzorek', view_confidences=view_confidences)
+    bl.bl_returns()
+    bl.bl_cov()
+    return bl.bl_weights()
+
+
+def _run_efficient_frontier(expected_returns, covariance_matrix):
+    ef = EfficientFrontier(expected_returns, covariance_matrix)
+    # efficient_return only takes positive targets
+    low, high = np.quantile(expected_returns[expected_returns > 0], [0.5, 0.95])
+    return [ef.efficient_return(float(target)) for target in np.linspace(low, high, NUMBER_OF_FRONTIER_POINTS)]
+
+
+def _run_risk_model(method, prices):
+    return risk_models.risk_matrix(prices, method=method, frequency=PERIODS_PER_YEAR)
+
+
+def _run_exponential_covariance(prices):
+    # history up to the last month, then the last month folded in day by day
+    model = risk_models.ExponentialCovariance(prices.iloc[:-21], frequency=PERIODS_PER_YEAR)
+    for day in range(-21, 0):
+        model.update(prices.iloc[[day]])
+    return model.cov_matrix()
+
+
+def _get_moments(universe):
+    return universe.expected_returns.to_numpy(), universe.covariance_matrix.to_numpy()
+
+
+def _get_cases():
+    cases = [
+        Case('get_portfolio_stat_summary', 'stats', lambda universe: (universe.returns,),
+             stats.get_portfolio_stat_summary, None),
+    ]
+    cases += [
+        Case(method, 'risk_models', lambda universe, method=method: (method, universe.prices), _run_risk_model,
+             200 if method == 'min_cov_determinant' else None)
+        for method in RISK_MODEL_METHODS
+    ]
+    cases += [
+        Case('shrunk_covariance', 'risk_models',
+             lambda universe: (risk_models.CovarianceShrinkage(universe.prices, frequency=PERIODS_PER_YEAR),),
+             lambda shrinkage: shrinkage.shrunk_covariance(), None),
+        Case('ExponentialCovariance', 'risk_models', lambda universe: (universe.prices,), _run_exponential_covariance,
+             None),
+        Case('get_frontier_terms', 'mvo', _get_moments, mvo.get_frontier_terms, None),
+        Case('get_optimal_weights', 'mvo', lambda universe: (NUMBER_OF_FRONTIER_POINTS, *_get_moments(universe)),
+             mvo.get_optimal_weights, 2000),
+        Case('get_gmv_portfolio', 'mvo', lambda universe: (_get_moments(universe)[1],), mvo.get_gmv_portfolio, 2000),
+        Case('maximize_sharpe_ratio', 'mvo', lambda universe: (0.02, *_get_moments(universe)),
+             mvo.maximize_sharpe_ratio, 2000),
+        Case('minimize_volatility', 'mvo',
+             lambda universe: (float(np.median(universe.expected_returns)), *_get_moments(universe)),
+             mvo.minimize_volatility, 500),
+        Case('EfficientFrontier.min_volatility', 'pypfopt',
+             lambda universe: (universe.expected_returns, universe.covariance_matrix),
+             lambda *args: EfficientFrontier(*args).min_volatility(), 2000),
+        Case('EfficientFrontier.max_sharpe', 'pypfopt',
+             lambda universe: (universe.expected_returns, universe.covariance_matrix),
+             lambda *args: EfficientFrontier(*args).max_sharpe(), 2000),
+        Case('EfficientFrontier.efficient_return', 'pypfopt',
+             lambda universe: (universe.expected_returns, universe.covariance_matrix), _run_efficient_frontier, 1000),
+        Case('EfficientFrontier.max_sharpe (factor_cov)', 'pypfopt',
+             lambda universe: (universe.expected_returns, universe.factor_model),
+             lambda *args: EfficientFrontier(*args).max_sharpe(), None),
+        Case('CLA.max_sharpe', 'pypfopt', lambda universe: (universe.expected_returns, universe.covariance_matrix),
+             lambda *args: CLA(*args).max_sharpe(), 500),
+        Case('HRPOpt.optimize', 'pypfopt', lambda universe: (universe.returns,),
+             lambda returns: HRPOpt(returns).optimize(), None),
+        Case('BlackLittermanModel', 'pypfopt',
+             lambda universe: (universe.covariance_matrix, universe.market_caps, *_get_views(universe)),
+             _run_black_litterman, None),
+        Case('DiscreteAllocation.greedy_portfolio', 'pypfopt',
+             lambda universe: (universe.weights, universe.latest_prices),
+             lambda *args: DiscreteAllocation(*args, total_portfolio_value=1e7).greedy_portfolio(), None),
+        Case('DiscreteAllocation.lp_portfolio', 'pypfopt', lambda universe: (universe.weights, universe.latest_prices),
+             lambda *args: DiscreteAllocation(*args, total_portfolio_value=1e7).lp_portfolio(), 500),
+    ]
+    return cases
+
+
+CASES = _get_cases()
+GROUPS = sorted({case.group for case in CASES})
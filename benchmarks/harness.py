@@ -0,0 +1,219 @@
+import datetime
+import gc
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+import warnings
+from importlib import metadata
+
+from .cases import CASES, Universe
+
+PACKAGES = ('numpy', 'pandas', 'scipy', 'cvxpy', 'scikit-learn')
+# results of runs are matched on these fields when comparing
+KEY_FIELDS = ('case', 'assets', 'years', 'missing_rate', 'staggered')
+
+
+def get_commit():
+    """Commit of the working tree and whether it has uncommitted changes, None outside of a git checkout"""
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True).stdout
+        status = subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], capture_output=True,
+                                text=True, check=True).stdout
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return {'sha': commit.strip(), 'dirty': bool(status.strip())}
+
+
+def get_environment():
+    versions = {}
+    for package in PACKAGES:
+        try:
+            versions[package] = metadata.version(package)
+        except metadata.PackageNotFoundError:
+            versions[package] = None
+    return {
+        'python': sys.version.split()[0],
+        'platform': platform.platform(),
+        'machine': platform.machine(),
+        'cpu_count': os.cpu_count(),
+        'packages': versions,
+    }
+
+
+def measure(run, args, repeat=3):
+    """Wall times of repeated calls and the peak memory allocated by one call
+
+  Parameters
+  ----------
+  run: callable
+    Function to benchmark
+  args: tuple
+    Positional arguments of run
+  repeat: int, optional, default=3
+    Number of timed calls
+
+  Returns
+  -------
+  dict
+    seconds of every call, their minimum and median, and peak_memory in bytes above what was allocated before the call
+
+  Notes
+  -----
+    Memory is traced in a separate call, tracing slows allocations down and would distort the times.
+    numpy reports its buffers to tracemalloc, so arrays are included.
+  """
+    seconds = []
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        run(*args)
+        seconds.append(time.perf_counter() - start)
+
+    gc.collect()
+    tracemalloc.start()
+    try:
+        baseline = tracemalloc.get_traced_memory()[0]
+        run(*args)
+        peak_memory = tracemalloc.get_traced_memory()[1] - baseline
+    finally:
+        tracemalloc.stop()
+    return {
+        'seconds': seconds,
+        'best': min(seconds),
+        'median': statistics.median(seconds),
+        'peak_memory': peak_memory,
+    }
+
+
+def run_benchmarks(assets, years, cases=None, groups=None, missing_rate=0., staggered=False, repeat=3, seed=0,
+                   log=None):
+    """Benchmark the cases on every synthetic universe of the grid
+
+  Parameters
+  ----------
+  assets: list of int
+    Numbers of assets of the universes
+  years: list of float
+    Lengths of the histories of the universes
+  cases: list of str, optional, default=None
+    Names of the cases to run, all cases if None
+  groups: list of str, optional, default=None
+    Groups of the cases to run (stats, risk_models, mvo, pypfopt), all groups if None
+  missing_rate: float, optional, default=0.
+    Probability that a synthetic price is missing
+  staggered: bool, optional, default=False
+    List the synthetic assets at different dates
+  repeat: int, optional, default=3
+    Number of timed calls of every case
+  seed: int, optional, default=0
+    Seed of the synthetic prices
+  log: callable, optional, default=None
+    Called with a line of progress after every case
+
+  Returns
+  -------
+  dict
+    commit, environment, parameters of the run and one result per case and universe
+  """
+    selected = [
+        case for case in CASES
+        if (cases is None or case.name in cases) and (groups is None or case.group in groups)
+    ]
+    results = []
+    for number_of_assets in assets:
+        for number_of_years in years:
+            universe = Universe(number_of_assets, number_of_years, missing_rate, staggered, seed)
+            for case in selected:
+                result = {
+                    'case': case.name,
+                    'group': case.group,
+                    'assets': number_of_assets,
+                    'years': number_of_years,
+                    'missing_rate': missing_rate,
+                    'staggered': staggered,
+                }
+                if case.max_assets is not None and number_of_assets > case.max_assets:
+                    result['status'] = 'skipped'
+                else:
+                    try:
+                        with warnings.catch_warnings():
+                            # deprecation and convergence warnings of the dependencies would bury the progress
+                            warnings.simplefilter('ignore')
+                            result.update(measure(case.run, case.setup(universe), repeat))
+                        result['status'] = 'ok'
+                    except Exception as error:  # a failing case is recorded, the others still run
+                        result.update(status='error', error=f'{type(error).__name__}: {error}')
+                results.append(result)
+                if log is not None:
+                    log(format_result(result))
+            del universe
+    return {
+        'created': datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='seconds'),
+        'commit': get_commit(),
+        'environment': get_environment(),
+        'parameters': {
+            'assets': list(assets), 'years': list(years), 'missing_rate': missing_rate, 'staggered': staggered,
+            'repeat': repeat, 'seed': seed,
+        },
+        'results': results,
+    }
+
+
+def format_result(result):
+    label = f"{result['group']:<12}{result['case']:<44}{result['assets']:>6} assets {result['years']:>5} years"
+    if result['status'] != 'ok':
+        return f"{label}  {result['status']} {result.get('error', '')}".rstrip()
+    return f"{label}  {result['best']:>10.4f} s  {result['peak_memory'] / 2**20:>10.1f} MiB"
+
+
+def write_results(report, path):
+    with open(path, 'w') as f:
+        json.dump(report, f, indent=2)
+
+
+def read_results(path):
+    with open(path, 'r') as f:
+        return json.load(f)
+
+
+def compare_results(baseline, candidate):
+    """Ratios of the best times and peak memory of the cases run in both reports
+
+  Parameters
+  ----------
+  baseline: dict
+    Report of run_benchmarks, e.g. of the parent commit
+  candidate: dict
+    Report of run_benchmarks to compare with the baseline
+
+  Returns
+  -------
+  list of dict
+    One row per case and universe, with the baseline and candidate best times and peak memory and
+    time_ratio and memory_ratio (candidate / baseline, below 1 is an improvement)
+  """
+    def key(result):
+        return tuple(result[field] for field in KEY_FIELDS)
+
+    baseline_results = {key(result): result for result in baseline['results'] if result['status'] == 'ok'}
+    rows = []
+    for result in candidate['results']:
+        previous = baseline_results.get(key(result))
+        if result['status'] != 'ok' or previous is None:
+            continue
+        rows.append({
+            **{field: result[field] for field in KEY_FIELDS},
+            'baseline_best': previous['best'],
+            'candidate_best': result['best'],
+            'time_ratio': result['best'] / previous['best'] if previous['best'] > 0 else None,
+            'baseline_peak_memory': previous['peak_memory'],
+            'candidate_peak_memory': result['peak_memory'],
+            'memory_ratio': (result['peak_memory'] / previous['peak_memory']
+                             if previous['peak_memory'] > 0 else None),
+        })
+    return rows
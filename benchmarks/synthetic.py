@@ -0,0 +1,86 @@
+import numpy as np
+import pandas as pd
+
+# assets are generated in blocks of this size, each from its own random stream,
+# so the first assets of a universe do not depend on how many assets it has
+BLOCK_SIZE = 256
+NUMBER_OF_FACTORS = 4
+
+
+def get_synthetic_prices(number_of_assets, years, periods_per_year=255, missing_rate=0., staggered=False, seed=0,
+                         start='2000-01-03'):
+    """Deterministic daily prices of a synthetic universe
+
+  Parameters
+  ----------
+  number_of_assets: int
+    Number of columns
+  years: float
+    Length of the history, the prices have years * periods_per_year + 1 business days
+  periods_per_year: int, optional, default=255
+    Number of periods in a year
+  missing_rate: float, optional, default=0.
+    Probability that a price is missing, gaps are spread at random after the listing date
+  staggered: bool, optional, default=False
+    List the assets at random dates of the first half of the history, prices are missing before
+  seed: int, optional, default=0
+    Seed of the random streams, the same arguments always give the same prices
+  start: str, optional, default='2000-01-03'
+    First date
+
+  Returns
+  -------
+  pd.DataFrame
+    Prices, one column per ticker (T0000, T0001, ...), like apps/data/stocks.csv
+
+  Notes
+  -----
+    Returns follow a factor model: a market factor and sector factors with normal returns, plus
+    Student-t specific returns with 5 degrees of freedom, so the assets are correlated and fat tailed
+    like real stocks. Prices are generated block by block into a preallocated array, the peak memory
+    is about the size of the result.
+  """
+    number_of_periods = int(round(years * periods_per_year))
+    if number_of_periods < 1:
+        raise ValueError('The history must have at least one period')
+    seed_sequence = np.random.SeedSequence(seed)
+    factor_seed, *block_seeds = seed_sequence.spawn(1 + -(-number_of_assets // BLOCK_SIZE))
+    factor_rng = np.random.default_rng(factor_seed)
+    factor_volatility = np.array([0.011] + [0.006] * (NUMBER_OF_FACTORS - 1))
+    factor_returns = factor_rng.normal(0., 1., size=(number_of_periods, NUMBER_OF_FACTORS)) * factor_volatility
+    factor_returns[:, 0] += 0.0003
+
+    prices = np.empty((number_of_periods + 1, number_of_assets))
+    for block, block_seed in enumerate(block_seeds):
+        columns = slice(block * BLOCK_SIZE, min((block + 1) * BLOCK_SIZE, number_of_assets))
+        size = columns.stop - columns.start
+        rng = np.random.default_rng(block_seed)
+        # a whole block is always drawn, so that a smaller universe gets the same first assets
+        loadings = np.column_stack([
+            rng.uniform(0.5, 1.5, BLOCK_SIZE), rng.normal(0., 0.5, (BLOCK_SIZE, NUMBER_OF_FACTORS - 1)),
+        ])[:size]
+        # unit variance Student-t shocks scaled by a specific volatility per asset
+        specific_volatility = rng.uniform(0.005, 0.025, BLOCK_SIZE)[:size]
+        drift = rng.normal(0.0001, 0.0002, BLOCK_SIZE)[:size]
+        initial_prices = rng.uniform(10., 500., BLOCK_SIZE)[:size]
+        listings = rng.integers(0, number_of_periods // 2 + 1, BLOCK_SIZE)[:size]
+        specific_returns = rng.standard_t(5, size=(number_of_periods, BLOCK_SIZE))[:, :size]
+        specific_returns *= np.sqrt(3 / 5) * specific_volatility
+        log_returns = np.log1p(np.clip(factor_returns @ loadings.T + specific_returns + drift, -0.9, None))
+        prices[0, columns] = initial_prices
+        prices[1:, columns] = initial_prices * np.exp(np.cumsum(log_returns, axis=0))
+
+        if staggered:
+            prices[:, columns][np.arange(number_of_periods + 1)[:, np.newaxis] < listings] = np.nan
+        if missing_rate > 0:
+            prices[:, columns][rng.random((number_of_periods + 1, BLOCK_SIZE))[:, :size] < missing_rate] = np.nan
+
+    dates = pd.bdate_range(start, periods=number_of_periods + 1, name='Date')
+    tickers = [f'T{i:04d}' for i in range(number_of_assets)]
+    return pd.DataFrame(prices, index=dates, columns=tickers)
+
+
+def get_synthetic_market_caps(tickers, seed=0):
+    """Log-normal market caps, in dollars, of the tickers of a synthetic universe"""
+    rng = np.random.default_rng(seed)
+    return pd.Series(np.exp(rng.normal(23., 1.5, len(tickers))), index=tickers)
@@ -110,10 +110,40 @@ LOCAL_APPS = [
     'statistic.apps.StatisticConfig',
     'markowitz.apps.MarkowitzConfig',
     'blacklitterman.apps.BlacklittermanConfig',
+    'apps.jobs.apps.JobsConfig',
+    'apps.api.apps.ApiConfig',
+    'apps.profiling.apps.ProfilingConfig',
 ]
 # https://docs.djangoproject.com/en/dev/ref/settings/#installed-apps
 INSTALLED_APPS = DJANGO_APPS + THIRD_PARTY_APPS + LOCAL_APPS
 
+# JOBS
+# ------------------------------------------------------------------------------
+# Modules registering job tasks, imported on first use of the job queue
+JOBS_TASK_MODULES = [
+    "apps.markowitz.tasks",
+    "apps.blacklitterman.tasks",
+]
+# Run jobs inside the request that submits them instead of in the worker pool
+# started with `python manage.py run_jobs`
+JOBS_EAGER = env.bool("DJANGO_JOBS_EAGER", default=False)
+JOBS_WORKERS = env.int("DJANGO_JOBS_WORKERS", default=2)
+# Seconds a worker waits before looking for new jobs when the queue is empty
+JOBS_POLL_INTERVAL = 1.0
+# Seconds after which a running job is considered lost and queued again
+JOBS_STALE_AFTER = 3600
+# Seconds a finished job and its result are kept, a page shows an older result by running the job again
+JOBS_KEEP_FINISHED = env.int("DJANGO_JOBS_KEEP_FINISHED", default=7 * 24 * 3600)
+
+# PROFILING
+# ------------------------------------------------------------------------------
+# Record the wall time, CPU time and cache hits of the stages of every request
+PROFILING_ENABLED = env.bool("DJANGO_PROFILING_ENABLED", default=False)
+# Send the recorded stages in a Server-Timing response header
+PROFILING_SERVER_TIMING = env.bool("DJANGO_PROFILING_SERVER_TIMING", default=False)
+# Also record the memory allocated by the stages, tracing allocations slows the whole process down
+PROFILING_TRACE_ALLOCATIONS = env.bool("DJANGO_PROFILING_TRACE_ALLOCATIONS", default=False)
+
 # # MIGRATIONS
 # # ------------------------------------------------------------------------------
 # # https://docs.djangoproject.com/en/dev/ref/settings/#migration-modules
@@ -139,6 +169,7 @@ INSTALLED_APPS = DJANGO_APPS + THIRD_PARTY_APPS + LOCAL_APPS
 # ------------------------------------------------------------------------------
 # https://docs.djangoproject.com/en/dev/ref/settings/#middleware
 MIDDLEWARE = [
+    "apps.profiling.middleware.ProfilingMiddleware",
     "django.middleware.security.SecurityMiddleware",
     # "whitenoise.middleware.WhiteNoiseMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
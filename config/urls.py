@@ -17,6 +17,9 @@ urlpatterns = [
     path('statistic/', include('apps.statistic.urls', namespace='statistic')),
     path('markowitz/', include('apps.markowitz.urls', namespace='markowitz')),
     path('blacklitterman/', include('apps.blacklitterman.urls', namespace='blacklitterman')),
+    path('jobs/', include('apps.jobs.urls', namespace='jobs')),
+    path('api/', include('apps.api.urls', namespace='api')),
+    path('profiling/', include('apps.profiling.urls', namespace='profiling')),
 
     ] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
 